@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+
+
+# JMSC_benchmark.py is a script for measuring the time required by the
+# computations of the jingju_singing_analysis.py module on the Jingju Music
+# Scores Collection (http://doi.org/10.5281/zenodo.1464653).
+#
+# Copyright (C) 2018 Music Technology Group, Universitat Pompeu Fabra
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import jingju_singing_analysis as jSA
+import numpy as np
+import argparse
+import time
+
+
+
+def pitchCountLoop(material, countGraceNotes=True):
+    '''
+    It computes the pitch histogram of the given material note by note,
+    accumulating the durations in a dictionary, as a reference for the
+    pitchCountArrays function.
+
+    Parameters:
+    - material -- list, as returned by collectLineMaterial
+    - countGraceNotes -- bool, if True, grace notes are also computed
+
+    It returns a list of pitch names and a numpy array of their aggregated
+    durations, sorted by midi value.
+    '''
+
+    pitchCount = {}
+    pitchMidi = {}
+
+    for score in material[1:]:
+        tables = jSA.loadNoteTables(score[0])
+        for partIndex in range(1, len(score)):
+            if len(score[partIndex]) == 0: continue
+            table = tables[partIndex-1]
+            minDur = table['minDuration']
+            for startEnd in score[partIndex]:
+                segment = jSA.segmentRows(table, startEnd[0], startEnd[1])
+                for i in segment:
+                    if table['isRest'][i]: continue
+                    noteName = str(table['name'][i])
+                    noteDur = table['quarterLength'][i]
+                    if table['isGrace'][i]:
+                        if not countGraceNotes: continue
+                        noteDur = minDur
+                    pitchCount[noteName] = pitchCount.get(noteName, 0)+noteDur
+                    pitchMidi[noteName] = table['midi'][i]
+
+    sortedPitches = sorted(pitchMidi.items(), key=lambda x: x[1])
+    names = [p[0] for p in sortedPitches]
+
+    return names, np.array([pitchCount[n] for n in names])
+
+
+
+def pitchCountArrays(material, countGraceNotes=True):
+    '''
+    It computes the pitch histogram of the given material with the array
+    functions used by pitchHistogram.
+
+    Parameters:
+    - material -- list, as returned by collectLineMaterial
+    - countGraceNotes -- bool, if True, grace notes are also computed
+
+    It returns a list of pitch names and a numpy array of their aggregated
+    durations, sorted by midi value.
+    '''
+
+    noteNames = []
+    noteMidis = []
+    noteDurations = []
+
+    for score in material[1:]:
+        tables = jSA.loadNoteTables(score[0])
+        for partIndex in range(1, len(score)):
+            if len(score[partIndex]) == 0: continue
+            table = tables[partIndex-1]
+            rows = jSA.selectRows(table, score[partIndex])
+            names, midis, durations = jSA.segmentPitches(table, rows,
+                                                         countGraceNotes)
+            noteNames.append(names)
+            noteMidis.append(midis)
+            noteDurations.append(durations)
+
+    names, midis, durations = jSA.countPitches(noteNames, noteMidis,
+                                               noteDurations)
+
+    return names, durations
+
+
+
+def timeFunction(function, arguments, repetitions):
+    '''
+    It calls the given function with the given arguments the given number of
+    times, and returns the minimum time in seconds required by one call,
+    together with the result of the last call.
+    '''
+
+    times = []
+    for i in range(repetitions):
+        time0 = time.perf_counter()
+        result = function(*arguments)
+        times.append(time.perf_counter() - time0)
+
+    return min(times), result
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Measure the time required '\
+                                     'for computing the pitch histogram of '\
+                                     'all the lines in the Jingju Music '\
+                                     'Scores Collection, comparing the '\
+                                     'computation note by note with the '\
+                                     'computation with arrays used by the '\
+                                     'jingju_singing_analysis module.')
+    parser.add_argument('linesData', help='Path to the lines_data.csv file, '\
+                        'that should be stored in the same folder as the '\
+                        'MusicXML scores of the Jingju Music Scores '\
+                        'Collection')
+    parser.add_argument('-r', '--repetitions', type=int, default=5,
+                        help='Number of times each computation is repeated. '\
+                        'The minimum time is reported')
+
+    args = parser.parse_args()
+
+    material = jSA.collectLineMaterial(args.linesData)
+
+    # Parse the scores and compute their note tables before timing
+    print('\nLoading scores...')
+    time0 = time.perf_counter()
+    for score in material[1:]:
+        jSA.loadNoteTables(score[0])
+    print('Scores loaded in {:.3f} s'.format(time.perf_counter() - time0))
+
+    for countGraceNotes in [True, False]:
+        print('\nPitch histogram (countGraceNotes=' + str(countGraceNotes) +
+              '):')
+        loopTime, loopResult = timeFunction(pitchCountLoop,
+                                            [material, countGraceNotes],
+                                            args.repetitions)
+        arraysTime, arraysResult = timeFunction(pitchCountArrays,
+                                                [material, countGraceNotes],
+                                                args.repetitions)
+        same = (loopResult[0] == arraysResult[0] and
+                np.allclose(loopResult[1], arraysResult[1]))
+        print('\tNote by note: {:.4f} s'.format(loopTime))
+        print('\tArrays:       {:.4f} s'.format(arraysTime))
+        print('\tSpeedup:      {:.1f}x'.format(loopTime/arraysTime))
+        print('\tSame results: ' + str(same))
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+
+
+# JMSC_benchmark_suite.py is a script for measuring the time and memory
+# required by the main functions of the jingju_singing_analysis.py and
+# jingju_tones_analysis.py modules on the Jingju Music Scores Collection
+# (http://doi.org/10.5281/zenodo.1464653) or on a synthetic collection, and
+# saving them in a report that can be compared across versions.
+#
+# Copyright (C) 2018 Music Technology Group, Universitat Pompeu Fabra
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'Jingju-Tones-Analysis'))
+
+import jingju_singing_analysis as jSA
+import jingju_tones_analysis as jTA
+import jingju_scores_collection as jSC
+import JMSC_synthetic
+import music21
+import numpy as np
+import argparse
+import collections
+import contextlib
+import multiprocessing
+import platform
+import tempfile
+import json
+import time
+import io
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+def entryPoints(linesData):
+    '''
+    It returns an ordered dictionary with the name of each measured function
+    as keys, and as values a function without parameters that calls it for
+    all the lines in the given lines_data.csv file.
+    '''
+
+    def cadentialNotes():
+        # cadentialNotes takes a single role type and shengqiang
+        for hd in ['laosheng', 'dan']:
+            for sq in ['erhuang', 'xipi']:
+                try:
+                    jSA.cadentialNotes(linesData, hd=[hd], sq=[sq])
+                except jSA.NoLinesFoundError:
+                    pass
+
+    return collections.OrderedDict([
+        ('lineStatistics', lambda: jSA.lineStatistics(linesData)),
+        ('pitchHistogram', lambda: jSA.pitchHistogram(linesData)),
+        ('pitchHistogramLineJudou',
+         lambda: jSA.pitchHistogramLineJudou(linesData)),
+        ('intervalHistogram', lambda: jSA.intervalHistogram(linesData)),
+        ('cadentialNotes', cadentialNotes),
+        ('melodicDensity', lambda: jSA.melodicDensity(linesData)),
+        ('syllabicContour',
+         lambda: jTA.syllabicContour(jTA.toneMaterialPerLine(linesData))),
+        ('pairwiseRelationship',
+         lambda: jTA.pairwiseRelationship(jTA.toneMaterialPerJudou(
+                                                                linesData)))])
+
+
+
+def clearMemory():
+    '''
+    It empties the line catalogues and the score store shared by both
+    modules, so that the next call starts with a cold cache.
+    '''
+
+    jSC.lineCatalogues.clear()
+    jSC.parsedScores.clear()
+
+
+
+def peakMemory():
+    '''
+    It returns the peak resident set size of the current process in MB, or
+    None if it cannot be measured in this platform.
+    '''
+
+    if resource == None:
+        return None
+
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes in macOS and in kilobytes in Linux
+    if sys.platform == 'darwin':
+        return maxRSS / 1024 / 1024
+    else:
+        return maxRSS / 1024
+
+
+
+def measureEntryPoint(name, linesData, repetitions):
+    '''
+    It measures the time required by the given entry point with a cold cache,
+    that is, with nothing in memory nor saved in the folder of the score
+    store; with a warm cache, that is, with the scores and note tables in
+    memory; and with only the copies saved in the folder of the score store.
+    It is run in a separate process, so that the peak memory is measured for
+    this entry point only.
+
+    Parameters:
+    - name -- str, key of the entry point in the dictionary returned by
+          entryPoints
+    - linesData -- str, path to the lines_data.csv file
+    - repetitions -- int, number of times the warm and saved measurements are
+          repeated. The minimum time is reported
+
+    It returns a dictionary with the keys 'cold', 'warm' and 'saved', with the
+    times in seconds, and 'peakMemory', with the peak resident set size in MB.
+    '''
+
+    function = entryPoints(linesData)[name]
+    jSA.batchMode = True
+
+    with tempfile.TemporaryDirectory() as folder:
+        jSA.scoreStore['folder'] = folder
+        clearMemory()
+
+        result = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            time0 = time.perf_counter()
+            function()
+            result['cold'] = time.perf_counter() - time0
+
+            times = []
+            for i in range(repetitions):
+                time0 = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - time0)
+            result['warm'] = min(times)
+
+            times = []
+            for i in range(repetitions):
+                clearMemory()
+                time0 = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - time0)
+            result['saved'] = min(times)
+
+    result['peakMemory'] = peakMemory()
+
+    return result
+
+
+
+def measureParsing(linesData):
+    '''
+    It measures the time required for parsing each score listed in the given
+    lines_data.csv file with music21 and with the readVoiceParts function.
+
+    It returns a dictionary with the score names as keys, and as values a
+    dictionary with the times in seconds, with the keys 'music21' and 'fast'.
+    '''
+
+    catalogue = jSA.loadLineCatalogue(linesData)
+    folder = os.path.dirname(os.path.abspath(linesData))
+
+    parsing = collections.OrderedDict()
+    for scoreName in catalogue['scores']:
+        scorePath = os.path.join(folder, scoreName)
+
+        time0 = time.perf_counter()
+        loadedScore = music21.converter.parse(scorePath)
+        [jSA.noteTable(p) for p in jSA.findVoiceParts(loadedScore)]
+        time1 = time.perf_counter()
+        [jSA.noteTable(p) for p in jSA.readVoiceParts(scorePath)]
+        time2 = time.perf_counter()
+
+        parsing[scoreName] = {'music21': time1 - time0, 'fast': time2 - time1}
+
+    return parsing
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Measure the time and peak '\
+                                     'memory required by the main functions'\
+                                     ' of the jingju_singing_analysis and '\
+                                     'jingju_tones_analysis modules with '\
+                                     'cold and warm caches, and the time '\
+                                     'required for parsing each score, and '\
+                                     'save them in a JSON report.')
+    parser.add_argument('linesData', nargs='?', help='Path to the '\
+                        'lines_data.csv file, that should be stored in the '\
+                        'same folder as the MusicXML scores. If not given, '\
+                        'a synthetic collection is generated')
+    parser.add_argument('-n', '--scores', type=int, default=20,
+                        help='Number of scores of the synthetic collection. '\
+                        'By default, 20')
+    parser.add_argument('-e', '--entry-points', nargs='*',
+                        choices=list(entryPoints(None).keys()),
+                        help='Functions to measure. By default, all of them')
+    parser.add_argument('-r', '--repetitions', type=int, default=3,
+                        help='Number of times each warm measurement is '\
+                        'repeated. The minimum time is reported')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help='Path to the JSON report. By default, '\
+                        'benchmark.json in the current directory')
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpusFolder:
+        if args.linesData == None:
+            # The same seed is used, so that reports can be compared
+            linesData = JMSC_synthetic.generateCorpus(corpusFolder,
+                                                      args.scores, seed=0)
+        else:
+            linesData = args.linesData
+
+        catalogue = jSA.loadLineCatalogue(linesData)
+        report = {'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                  'python': platform.python_version(),
+                  'music21': music21.VERSION_STR,
+                  'numpy': np.__version__,
+                  'platform': platform.platform(),
+                  'corpus': {'linesData': args.linesData,
+                             'synthetic': args.linesData == None,
+                             'scores': len(catalogue['scores']),
+                             'lines': len(catalogue['score'])},
+                  'entryPoints': collections.OrderedDict()}
+
+        if args.entry_points == None:
+            toMeasure = list(entryPoints(None).keys())
+        else:
+            toMeasure = args.entry_points
+
+        for name in toMeasure:
+            print('Measuring ' + name + '...')
+            # A new process for each entry point, so that the peak memory
+            # of each of them is measured separately
+            with multiprocessing.Pool(1) as pool:
+                result = pool.apply(measureEntryPoint,
+                                    (name, linesData, args.repetitions))
+            report['entryPoints'][name] = result
+            print('\tcold {:.3f} s, warm {:.3f} s, saved {:.3f} s'.format(
+                  result['cold'], result['warm'], result['saved']))
+
+        print('Measuring the parsing of each score...')
+        report['parsing'] = measureParsing(linesData)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print('\nReport saved in "' + args.output + '"')
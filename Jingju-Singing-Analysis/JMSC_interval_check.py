@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+
+
+# JMSC_interval_check.py is a script for checking that the intervals found in
+# the Jingju Music Scores Collection (http://doi.org/10.5281/zenodo.1464653)
+# are named by the jingju_singing_analysis.py module in the same way as by
+# music21.
+#
+# Copyright (C) 2018 Music Technology Group, Universitat Pompeu Fabra
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import jingju_singing_analysis as jSA
+from music21 import interval, pitch
+import argparse
+import sys
+
+
+
+def collectIntervals(linesData):
+    '''
+    It finds all the intervals counted by the intervalHistogram function in
+    the lines listed in the lines_data.csv file, with and without grace notes.
+
+    It returns a set of tuples with the names of the two pitches of each
+    interval, and the number of diatonic steps and of semitones between them
+    computed from the note tables, as done by the intervalHistogram function.
+    '''
+
+    material = jSA.collectLineMaterial(linesData)
+
+    intervals = set()
+
+    print('\nCollecting intervals...')
+    for score in material[1:]:
+        tables = jSA.loadNoteTables(score[0])
+        for partIndex in range(1, len(score)):
+            if len(score[partIndex]) == 0: continue
+            table = tables[partIndex-1]
+            steps = jSA.diatonicSteps(table)
+            for ignoreGraceNotes in [False, True]:
+                for startEnd in score[partIndex]:
+                    segment = jSA.segmentRows(table, startEnd[0], startEnd[1])
+                    firsts, seconds = jSA.segmentIntervalPairs(
+                                          table, segment,
+                                          ignoreGraceNotes=ignoreGraceNotes)
+                    for n1, n2 in zip(firsts, seconds):
+                        intervals.add((str(table['name'][n1]),
+                                       str(table['name'][n2]),
+                                       int(steps[n2] - steps[n1]),
+                                       int(table['midi'][n2] -
+                                           table['midi'][n1])))
+
+    return intervals
+
+
+
+def compareInterval(name1, name2, generic, semitones):
+    '''
+    It compares the name, directed name and semitones of the interval formed
+    by the two given pitches as computed by music21 and by the
+    classifyInterval, intervalName and nameSemitones functions, and returns a
+    list of strings describing their differences, which is empty if they are
+    the same.
+    '''
+
+    intvl = interval.Interval(pitch.Pitch(name1), pitch.Pitch(name2))
+    expected = (intvl.name, intvl.directedName, intvl.semitones)
+
+    differences = []
+
+    classified = jSA.classifyInterval(jSA.pitchSpelling(name1),
+                                      jSA.pitchSpelling(name2))
+    if classified != expected:
+        differences.append('classifyInterval returns ' + str(classified))
+
+    named = jSA.intervalName(generic, semitones)
+    if named[:2] != expected[:2]:
+        differences.append('intervalName returns ' + str(named[:2]))
+
+    for name in expected[:2]:
+        if jSA.nameSemitones(name) != interval.Interval(name).semitones:
+            differences.append('nameSemitones returns ' +
+                               str(jSA.nameSemitones(name)) + ' for ' + name)
+
+    return differences
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Check that all the '\
+                                     'intervals found in the Jingju Music '\
+                                     'Scores Collection are named by the '\
+                                     'jingju_singing_analysis module in the '\
+                                     'same way as by music21.')
+    parser.add_argument('linesData', help='Path to the lines_data.csv file, '\
+                        'that should be stored in the same folder as the '\
+                        'MusicXML scores of the Jingju Music Scores '\
+                        'Collection')
+
+    args = parser.parse_args()
+
+    intervals = collectIntervals(args.linesData)
+
+    different = 0
+
+    print('\nComparing interval names...')
+    for name1, name2, generic, semitones in sorted(intervals):
+        differences = compareInterval(name1, name2, generic, semitones)
+        if len(differences) > 0:
+            different += 1
+            print('\t' + name1 + ' to ' + name2 + ' differs: ' +
+                  '; '.join(differences))
+
+    print('\nIntervals: ' + str(len(intervals)))
+    print('\tSame names as music21: ' + str(different == 0))
+
+    if different > 0:
+        sys.exit(1)
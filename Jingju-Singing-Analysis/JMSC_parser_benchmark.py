@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+
+
+# JMSC_parser_benchmark.py is a script for checking that the fast MusicXML
+# parser of the jingju_singing_analysis.py module returns the same note tables
+# as music21 for every score of the Jingju Music Scores Collection
+# (http://doi.org/10.5281/zenodo.1464653), and for measuring the time required
+# by each parser.
+#
+# Copyright (C) 2018 Music Technology Group, Universitat Pompeu Fabra
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import jingju_singing_analysis as jSA
+from music21 import converter
+import numpy as np
+import argparse
+import time
+import sys
+
+
+
+def music21Tables(scorePath):
+    '''
+    It parses the given MusicXML score with music21 and returns the note
+    tables of its vocal parts, without using the score store.
+    '''
+
+    loadedScore = converter.parse(scorePath)
+
+    return [jSA.noteTable(p) for p in jSA.findVoiceParts(loadedScore)]
+
+
+
+def fastTables(scorePath):
+    '''
+    It reads the given MusicXML score with the readVoiceParts function and
+    returns the note tables of its vocal parts, without using the score store.
+    '''
+
+    return [jSA.noteTable(p) for p in jSA.readVoiceParts(scorePath)]
+
+
+
+def compareTables(tables1, tables2):
+    '''
+    It compares two lists of note tables, as returned by the noteTable
+    function, and returns a list of strings describing their differences,
+    which is empty if they are the same.
+    '''
+
+    differences = []
+
+    if len(tables1) != len(tables2):
+        differences.append(str(len(tables1)) + ' vocal parts instead of ' +
+                           str(len(tables2)))
+        return differences
+
+    for i in range(len(tables1)):
+        for c in jSA.noteTableColumns + ['lyrics']:
+            if not np.array_equal(tables1[i][c], tables2[i][c]):
+                differences.append('part ' + str(i+1) + ', ' + c)
+        if tables1[i]['minDuration'] != tables2[i]['minDuration']:
+            differences.append('part ' + str(i+1) + ', minDuration')
+
+    return differences
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Check that the fast '\
+                                     'MusicXML parser of the '\
+                                     'jingju_singing_analysis module returns'\
+                                     ' the same note tables as music21 for '\
+                                     'all the scores in the Jingju Music '\
+                                     'Scores Collection, and compare the time'\
+                                     ' required by both parsers.')
+    parser.add_argument('linesData', help='Path to the lines_data.csv file, '\
+                        'that should be stored in the same folder as the '\
+                        'MusicXML scores of the Jingju Music Scores '\
+                        'Collection')
+
+    args = parser.parse_args()
+
+    material = jSA.collectLineMaterial(args.linesData)
+
+    music21Time = 0
+    fastTime = 0
+    different = 0
+
+    print('\nParsing scores...')
+    for score in material[1:]:
+        scoreName = score[0].split('/')[-1]
+
+        time0 = time.perf_counter()
+        tables1 = music21Tables(score[0])
+        time1 = time.perf_counter()
+        tables2 = fastTables(score[0])
+        time2 = time.perf_counter()
+
+        music21Time += time1 - time0
+        fastTime += time2 - time1
+
+        differences = compareTables(tables2, tables1)
+        if len(differences) > 0:
+            different += 1
+            print('\t' + scoreName + ' differs: ' + '; '.join(differences))
+
+    print('\nScores: ' + str(len(material) - 1))
+    print('\tmusic21: {:.3f} s'.format(music21Time))
+    print('\tFast:    {:.3f} s'.format(fastTime))
+    if fastTime > 0:
+        print('\tSpeedup: {:.1f}x'.format(music21Time/fastTime))
+    print('\tSame tables: ' + str(different == 0))
+
+    if different > 0:
+        sys.exit(1)
@@ -27,7 +27,10 @@
 
 import os
 import jingju_singing_analysis as jSA
+import jingju_scores_collection as jSC
+import multiprocessing
 import argparse
+import cProfile
 import time
 
 # General variables
@@ -260,6 +263,125 @@ mdd = [['mdd-ls-eh-mb.png', ls, eh, mb, ju],
        ['mdd-da-xp-kb-s.png', da, xp, kb, s],
        ['mdd-da-xp-kb-x.png', da, xp, kb, x]]
 
+# Pool of worker processes for computing the figures, if more than one job
+# is requested
+pool = None
+
+# Counts of every line of the collection, computed once and shared by all the
+# figures
+line_stats = None
+
+# Combinations of role type, shengqiang, banshi and line type of the lines
+# that changed since the previous run, if only the affected figures are
+# computed again
+changed_combinations = None
+
+# True in the worker processes of the pool
+in_worker = False
+
+# Define parallel computation functions
+def init_worker(stats, profiling, render_plots, defer_renders):
+    # Each worker process keeps its own store of parsed scores. If the plots
+    # are rendered by the render workers of the main process, their render
+    # specs are queued and returned with the results. Invalid inputs raise
+    # errors instead of waiting for the user
+    global line_stats, in_worker
+    jSA.batchMode = True
+    jSA.parsedScores.clear()
+    jSC.profiling = profiling
+    jSA.renderPlots = render_plots
+    if defer_renders:
+        jSA.renderQueue = []
+    line_stats = stats
+    in_worker = True
+
+
+
+def profile_figure(figure_function, linesData, folder, spec):
+    # It computes the figure of the given spec, recording its time as a
+    # profiled stage. In a worker process, it also returns the stages profiled
+    # while computing it, so that they are added to the profile of the main
+    # process, and the render specs of its plots, if they are deferred
+    if not in_worker:
+        with jSA.profileStage('figure ' + spec[0]):
+            return figure_function(linesData, folder, spec)
+    jSA.stageProfile.clear()
+    with jSA.profileStage('figure ' + spec[0]):
+        result = figure_function(linesData, folder, spec)
+    specs = []
+    if jSA.renderQueue != None:
+        specs = list(jSA.renderQueue)
+        del jSA.renderQueue[:]
+    return result, dict(jSA.stageProfile), specs
+
+
+
+def compute_figures(figure_function, linesData, folder, specs,
+                    results_file):
+    # It computes the figure for each spec with the given function, in the
+    # pool of worker processes if there is one, and returns the list of their
+    # results in the same order as the specs. In incremental mode, the results
+    # of the figures not affected by the changes are taken from the results
+    # file of the previous run
+    previous = {}
+    if changed_combinations != None:
+        previous = previous_results(folder + '/' + results_file, specs)
+    to_compute = [spec for spec in specs if spec[0] not in previous or
+                  is_affected(spec) or
+                  (jSA.renderPlots and
+                   not os.path.isfile(folder + '/' + spec[0]))]
+    for spec in specs:
+        if spec not in to_compute:
+            print('\nFigure "' + spec[0] + '" is not affected by the changes')
+    arguments = [(figure_function, linesData, folder, spec)
+                 for spec in to_compute]
+    if pool == None:
+        results = [profile_figure(*a) for a in arguments]
+    else:
+        results = []
+        for result, profile, render_specs in pool.starmap(profile_figure,
+                                                          arguments,
+                                                          chunksize=1):
+            jSA.mergeProfile(profile)
+            for render_spec in render_specs:
+                jSA.submitRender(render_spec)
+            results.append(result)
+    computed = dict(zip([spec[0] for spec in to_compute], results))
+    return [computed.get(spec[0], previous.get(spec[0])) for spec in specs]
+
+
+
+def previous_results(results_file, specs):
+    # It reads the results file of a previous run and returns a dictionary
+    # with the lines of the results of each figure, starting with its name
+    previous = {}
+    if not os.path.isfile(results_file):
+        return previous
+    names = [spec[0] for spec in specs]
+    name = None
+    with open(results_file, 'r') as f:
+        for line in (f.read() + '\n').splitlines(True):
+            if line[:-1] in names:
+                name = line[:-1]
+                previous[name] = ''
+            if name != None:
+                previous[name] += line
+    return previous
+
+
+
+def is_affected(spec):
+    # It checks if any of the changed lines belongs to the role types,
+    # shengqiang, banshi and line types of the given spec. The specs of the
+    # cadential notes include all line types
+    for c in changed_combinations:
+        if c[0] in spec[1] and c[1] in spec[2] and c[2] in spec[3]:
+            if len(spec) == 4 or c[3] in spec[4]:
+                return True
+    return False
+
+
+
 # Define plotting functions
 def plot_ph(linesData, root_folder):
     print('\n\n##############################################################'\
@@ -281,22 +403,32 @@ def plot_ph(linesData, root_folder):
         print('\nPitch histogram figures will be saved in the existing folder'\
               ' ' + folder + '.')
 
-    for phi in ph:
-        print('\nComputing figure "' + phi[0] + '"')
-        fn = folder + '/' + phi[0]
-        to_print += phi[0] + '\n'
-        ph_results = jSA.pitchHistogram(linesData, hd=phi[1], sq=phi[2],
-                                        bs=phi[3], ju=phi[4], filename=fn)
-        for line in ph_results:
-            to_print += line[0] + ',' + str(line[1]) + '\n'
-        print('\n____________________________________________________________'\
-          '___________________')
+    to_print += ''.join(compute_figures(ph_figure, linesData, folder, ph,
+                                        'ph_results.csv'))
 
     with open(folder + '/ph_results.csv', 'w') as f:
         f.write(to_print[:-1])
 
 
 
+def ph_figure(linesData, folder, phi):
+    to_print = ''
+
+    print('\nComputing figure "' + phi[0] + '"')
+    fn = folder + '/' + phi[0]
+    to_print += phi[0] + '\n'
+    ph_results = jSA.pitchHistogram(linesData, hd=phi[1], sq=phi[2],
+                                    bs=phi[3], ju=phi[4], filename=fn,
+                                    lineStats=line_stats)
+    for line in ph_results:
+        to_print += line[0] + ',' + str(line[1]) + '\n'
+    print('\n____________________________________________________________'\
+      '___________________')
+
+    return to_print
+
+
+
 def plot_phlj(linesData, root_folder):
     print('\n\n##############################################################'\
           '#################')
@@ -317,26 +449,36 @@ def plot_phlj(linesData, root_folder):
         print('\nPitch histogram figures will be saved in the existing folder'\
               ' ' + folder + '.')
 
-    for phlji in phlj:
-        print('\nComputing figure "' + phlji[0] + '"')
-        fn = folder + '/' + phlji[0]
-        to_print += phlji[0] + '\n'
-        phlj_results = jSA.pitchHistogramLineJudou(linesData, hd=phlji[1],
-                                                   sq=phlji[2], bs=phlji[3],
-                                                   ju=phlji[4], filename=fn)
-        for row in range(len(phlj_results[0])):
-            to_print += phlj_results[0][row][0] + ',' +\
-                        str(phlj_results[0][row][1]) + ',' +\
-                        str(phlj_results[1][row][1]) + ',' +\
-                        str(phlj_results[2][row][1]) + '\n'
-        print('\n____________________________________________________________'\
-          '___________________')
+    to_print += ''.join(compute_figures(phlj_figure, linesData, folder, phlj,
+                                        'phlj_results.csv'))
 
     with open(folder + '/phlj_results.csv', 'w') as f:
         f.write(to_print[:-1])
 
 
 
+def phlj_figure(linesData, folder, phlji):
+    to_print = ''
+
+    print('\nComputing figure "' + phlji[0] + '"')
+    fn = folder + '/' + phlji[0]
+    to_print += phlji[0] + '\n'
+    phlj_results = jSA.pitchHistogramLineJudou(linesData, hd=phlji[1],
+                                               sq=phlji[2], bs=phlji[3],
+                                               ju=phlji[4], filename=fn,
+                                               lineStats=line_stats)
+    for row in range(len(phlj_results[0])):
+        to_print += phlj_results[0][row][0] + ',' +\
+                    str(phlj_results[0][row][1]) + ',' +\
+                    str(phlj_results[1][row][1]) + ',' +\
+                    str(phlj_results[2][row][1]) + '\n'
+    print('\n____________________________________________________________'\
+      '___________________')
+
+    return to_print
+
+
+
 def plot_ihd(linesData, root_folder):
     print('\n\n##############################################################'\
           '#################')
@@ -357,23 +499,33 @@ def plot_ihd(linesData, root_folder):
         print('\nInterval histogram figures will be saved in the existing '\
               'folder ' + folder + '.')
 
-    for ihdi in ihd:
-        print('\nComputing figure "' + ihdi[0] + '"')
-        fn = folder + '/' + ihdi[0]
-        to_print += ihdi[0] + '\n'
-        ihd_results = jSA.intervalHistogram(linesData, hd=ihdi[1], sq=ihdi[2],
-                                            bs=ihdi[3], ju=ihdi[4],
-                                            filename=fn, directedInterval=True)
-        for line in ihd_results:
-            to_print += line[0] + ',' + str(line[1]) + '\n'
-        print('\n____________________________________________________________'\
-          '___________________')
+    to_print += ''.join(compute_figures(ihd_figure, linesData, folder, ihd,
+                                        'ihd_results.csv'))
 
     with open(folder + '/ihd_results.csv', 'w') as f:
         f.write(to_print[:-1])
 
 
 
+def ihd_figure(linesData, folder, ihdi):
+    to_print = ''
+
+    print('\nComputing figure "' + ihdi[0] + '"')
+    fn = folder + '/' + ihdi[0]
+    to_print += ihdi[0] + '\n'
+    ihd_results = jSA.intervalHistogram(linesData, hd=ihdi[1], sq=ihdi[2],
+                                        bs=ihdi[3], ju=ihdi[4],
+                                        filename=fn, directedInterval=True,
+                                        lineStats=line_stats)
+    for line in ihd_results:
+        to_print += line[0] + ',' + str(line[1]) + '\n'
+    print('\n____________________________________________________________'\
+      '___________________')
+
+    return to_print
+
+
+
 def plot_ihn(linesData, root_folder):
     print('\n\n##############################################################'\
           '#################')
@@ -394,24 +546,34 @@ def plot_ihn(linesData, root_folder):
         print('\nInterval histogram figures will be saved in the existing '\
               'folder ' + folder + '.')
 
-    for ihni in ihn:
-        print('\nComputing figure "' + ihni[0] + '"')
-        fn = folder + '/' + ihni[0]
-        to_print += ihni[0] + '\n'
-        ihn_results = jSA.intervalHistogram(linesData, hd=ihni[1], sq=ihni[2],
-                                            bs=ihni[3], ju=ihni[4],
-                                            filename=fn,
-                                            directedInterval=False)
-        for line in ihn_results:
-            to_print += line[0] + ',' + str(line[1]) + '\n'
-        print('\n____________________________________________________________'\
-          '___________________')
+    to_print += ''.join(compute_figures(ihn_figure, linesData, folder, ihn,
+                                        'ihn_results.csv'))
 
     with open(folder + '/ihn_results.csv', 'w') as f:
         f.write(to_print[:-1])
 
 
 
+def ihn_figure(linesData, folder, ihni):
+    to_print = ''
+
+    print('\nComputing figure "' + ihni[0] + '"')
+    fn = folder + '/' + ihni[0]
+    to_print += ihni[0] + '\n'
+    ihn_results = jSA.intervalHistogram(linesData, hd=ihni[1], sq=ihni[2],
+                                        bs=ihni[3], ju=ihni[4],
+                                        filename=fn,
+                                        directedInterval=False,
+                                        lineStats=line_stats)
+    for line in ihn_results:
+        to_print += line[0] + ',' + str(line[1]) + '\n'
+    print('\n____________________________________________________________'\
+      '___________________')
+
+    return to_print
+
+
+
 def plot_cn(linesData, root_folder):
     print('\n\n##############################################################'\
           '#################')
@@ -432,48 +594,58 @@ def plot_cn(linesData, root_folder):
         print('\nCadential notes figures will be saved in the existing folder'\
               ' ' + folder + '.')
 
-    for cni in cn:
-        print('\nComputing figure "' + cni[0] + '"')
-        fn = folder + '/' + cni[0]
-        to_print += cni[0] + '\n'
-        cn_results = jSA.cadentialNotes(linesData, hd=cni[1], sq=cni[2],
-                                        bs=cni[3], filename=fn)
-        if len(cn_results) == 2:
-            to_print += ',Op. line,,,Cl. line,,\n,S1,S2,S3,S1,S2,S3\n'
-            ol = cn_results['Op. line']
-            cl = cn_results['Cl. line']
-            for row in range(len(ol['S1'])):
-                to_print += ol['S1'][row][0] + ',' +\
-                            str(ol['S1'][row][1]) + ',' +\
-                            str(ol['S2'][row][1]) + ',' +\
-                            str(ol['S3'][row][1]) + ',' +\
-                            str(cl['S1'][row][1]) + ',' +\
-                            str(cl['S2'][row][1]) + ',' +\
-                            str(cl['S3'][row][1]) + '\n'
-        elif len(cn_results) == 3:
-            to_print += ',Op. l. 1,,,Op. l. 2,,,Cl. line,,\n,S1,S2,S3,S1,S2,S3,S1,S2,S3\n'
-            ol1 = cn_results['Op. l. 1']
-            ol2 = cn_results['Op. l. 2']
-            cl = cn_results['Cl. l.']
-            for row in range(len(ol1['S1'])):
-                to_print += ol1['S1'][row][0] + ',' +\
-                str(ol1['S1'][row][1]) + ',' +\
-                str(ol1['S2'][row][1]) + ',' +\
-                str(ol1['S3'][row][1]) + ',' +\
-                str(ol2['S1'][row][1]) + ',' +\
-                str(ol2['S2'][row][1]) + ',' +\
-                str(ol2['S3'][row][1]) + ',' +\
-                str(cl['S1'][row][1]) + ',' +\
-                str(cl['S2'][row][1]) + ',' +\
-                str(cl['S3'][row][1]) + '\n'
-        print('\n____________________________________________________________'\
-          '___________________')
+    to_print += ''.join(compute_figures(cn_figure, linesData, folder, cn,
+                                        'cn_results.csv'))
 
     with open(folder + '/cn_results.csv', 'w') as f:
         f.write(to_print[:-1])
 
 
 
+def cn_figure(linesData, folder, cni):
+    to_print = ''
+
+    print('\nComputing figure "' + cni[0] + '"')
+    fn = folder + '/' + cni[0]
+    to_print += cni[0] + '\n'
+    cn_results = jSA.cadentialNotes(linesData, hd=cni[1], sq=cni[2],
+                                    bs=cni[3], filename=fn,
+                                    lineStats=line_stats)
+    if len(cn_results) == 2:
+        to_print += ',Op. line,,,Cl. line,,\n,S1,S2,S3,S1,S2,S3\n'
+        ol = cn_results['Op. line']
+        cl = cn_results['Cl. line']
+        for row in range(len(ol['S1'])):
+            to_print += ol['S1'][row][0] + ',' +\
+                        str(ol['S1'][row][1]) + ',' +\
+                        str(ol['S2'][row][1]) + ',' +\
+                        str(ol['S3'][row][1]) + ',' +\
+                        str(cl['S1'][row][1]) + ',' +\
+                        str(cl['S2'][row][1]) + ',' +\
+                        str(cl['S3'][row][1]) + '\n'
+    elif len(cn_results) == 3:
+        to_print += ',Op. l. 1,,,Op. l. 2,,,Cl. line,,\n,S1,S2,S3,S1,S2,S3,S1,S2,S3\n'
+        ol1 = cn_results['Op. l. 1']
+        ol2 = cn_results['Op. l. 2']
+        cl = cn_results['Cl. l.']
+        for row in range(len(ol1['S1'])):
+            to_print += ol1['S1'][row][0] + ',' +\
+            str(ol1['S1'][row][1]) + ',' +\
+            str(ol1['S2'][row][1]) + ',' +\
+            str(ol1['S3'][row][1]) + ',' +\
+            str(ol2['S1'][row][1]) + ',' +\
+            str(ol2['S2'][row][1]) + ',' +\
+            str(ol2['S3'][row][1]) + ',' +\
+            str(cl['S1'][row][1]) + ',' +\
+            str(cl['S2'][row][1]) + ',' +\
+            str(cl['S3'][row][1]) + '\n'
+    print('\n____________________________________________________________'\
+      '___________________')
+
+    return to_print
+
+
+
 def plot_mdn(linesData, root_folder):
     print('\n\n##############################################################'\
           '#################')
@@ -482,8 +654,6 @@ def plot_mdn(linesData, root_folder):
     print('##################################################################'\
           '#############')
 
-    keys = ['median', 'Q1', 'Q3', 'lower fence', 'upper fence']
-
     to_print = ''
 
     mdn_folder = 'melodic_density_notes'
@@ -496,38 +666,50 @@ def plot_mdn(linesData, root_folder):
         print('\nMelodic density figures will be saved in the existing folder'\
               ' ' + folder + '.')
 
-    for mdni in mdn:
-        print('\nComputing figure "' + mdni[0] + '"')
-        fn = folder + '/' + mdni[0]
-        to_print += mdni[0] + '\n'
-        mdn_results = jSA.melodicDensity(linesData, hd=mdni[1], sq=mdni[2],
-                                         bs=mdni[3], ju=mdni[4], filename=fn,
-                                         notesOrDuration='notes')
-
-        to_print += 'index,score,median,Q1,Q3,lower fence,upper fence,'\
-                    'outliers\n'
-        for i in range(1, len(mdn_results)):
-            x = mdn_results[str(i)]
-            to_print += str(i) + ',' + x['score'].split('/')[-1] + ','
-            for k in keys:
-                to_print += str(x[k]) + ','
-            for o in x['outliers']:
-                to_print += str(o) + ';'
-            to_print = to_print[:-1] + '\n'
-
-        to_print += 'Avg' + ',,'
-        avg = mdn_results['Avg']
+    to_print += ''.join(compute_figures(mdn_figure, linesData, folder, mdn,
+                                        'mdn_results.csv'))
+
+    with open(folder + '/mdn_results.csv', 'w') as f:
+        f.write(to_print[:-1])
+
+
+
+def mdn_figure(linesData, folder, mdni):
+    keys = ['median', 'Q1', 'Q3', 'lower fence', 'upper fence']
+
+    to_print = ''
+
+    print('\nComputing figure "' + mdni[0] + '"')
+    fn = folder + '/' + mdni[0]
+    to_print += mdni[0] + '\n'
+    mdn_results = jSA.melodicDensity(linesData, hd=mdni[1], sq=mdni[2],
+                                     bs=mdni[3], ju=mdni[4], filename=fn,
+                                     notesOrDuration='notes',
+                                     lineStats=line_stats)
+
+    to_print += 'index,score,median,Q1,Q3,lower fence,upper fence,'\
+                'outliers\n'
+    for i in range(1, len(mdn_results)):
+        x = mdn_results[str(i)]
+        to_print += str(i) + ',' + x['score'].split('/')[-1] + ','
         for k in keys:
-            to_print += str(avg[k]) + ','
-        for o in avg['outliers']:
+            to_print += str(x[k]) + ','
+        for o in x['outliers']:
             to_print += str(o) + ';'
         to_print = to_print[:-1] + '\n'
 
-        print('\n____________________________________________________________'\
-          '___________________')
+    to_print += 'Avg' + ',,'
+    avg = mdn_results['Avg']
+    for k in keys:
+        to_print += str(avg[k]) + ','
+    for o in avg['outliers']:
+        to_print += str(o) + ';'
+    to_print = to_print[:-1] + '\n'
 
-    with open(folder + '/mdn_results.csv', 'w') as f:
-        f.write(to_print[:-1])
+    print('\n____________________________________________________________'\
+      '___________________')
+
+    return to_print
 
 
 
@@ -539,8 +721,6 @@ def plot_mdd(linesData, root_folder):
     print('##################################################################'\
           '#############')
 
-    keys = ['median', 'Q1', 'Q3', 'lower fence', 'upper fence']
-
     to_print = ''
 
     mdd_folder = 'melodic_density_duration'
@@ -553,38 +733,50 @@ def plot_mdd(linesData, root_folder):
         print('\nMelodic density figures will be saved in the existing folder'\
               ' ' + folder + '.')
 
-    for mddi in mdd:
-        print('\nComputing figure "' + mddi[0] + '"')
-        fn = folder + '/' + mddi[0]
-        to_print += mddi[0] + '\n'
-        mdd_results = jSA.melodicDensity(linesData, hd=mddi[1], sq=mddi[2],
-                                         bs=mddi[3], ju=mddi[4], filename=fn,
-                                         notesOrDuration='duration')
-
-        to_print += 'index,score,median,Q1,Q3,lower fence,upper fence,'\
-                    'outliers\n'
-        for i in range(1, len(mdd_results)):
-            x = mdd_results[str(i)]
-            to_print += str(i) + ',' + x['score'].split('/')[-1] + ','
-            for k in keys:
-                to_print += str(x[k]) + ','
-            for o in x['outliers']:
-                to_print += str(o) + ';'
-            to_print = to_print[:-1] + '\n'
-
-        to_print += 'Avg' + ',,'
-        avg = mdd_results['Avg']
+    to_print += ''.join(compute_figures(mdd_figure, linesData, folder, mdd,
+                                        'mdd_results.csv'))
+
+    with open(folder + '/mdd_results.csv', 'w') as f:
+        f.write(to_print[:-1])
+
+
+
+def mdd_figure(linesData, folder, mddi):
+    keys = ['median', 'Q1', 'Q3', 'lower fence', 'upper fence']
+
+    to_print = ''
+
+    print('\nComputing figure "' + mddi[0] + '"')
+    fn = folder + '/' + mddi[0]
+    to_print += mddi[0] + '\n'
+    mdd_results = jSA.melodicDensity(linesData, hd=mddi[1], sq=mddi[2],
+                                     bs=mddi[3], ju=mddi[4], filename=fn,
+                                     notesOrDuration='duration',
+                                     lineStats=line_stats)
+
+    to_print += 'index,score,median,Q1,Q3,lower fence,upper fence,'\
+                'outliers\n'
+    for i in range(1, len(mdd_results)):
+        x = mdd_results[str(i)]
+        to_print += str(i) + ',' + x['score'].split('/')[-1] + ','
         for k in keys:
-            to_print += str(avg[k]) + ','
-        for o in avg['outliers']:
+            to_print += str(x[k]) + ','
+        for o in x['outliers']:
             to_print += str(o) + ';'
         to_print = to_print[:-1] + '\n'
 
-        print('\n____________________________________________________________'\
-          '___________________')
+    to_print += 'Avg' + ',,'
+    avg = mdd_results['Avg']
+    for k in keys:
+        to_print += str(avg[k]) + ','
+    for o in avg['outliers']:
+        to_print += str(o) + ';'
+    to_print = to_print[:-1] + '\n'
 
-    with open(folder + '/mdd_results.csv', 'w') as f:
-        f.write(to_print[:-1])
+    print('\n____________________________________________________________'\
+      '___________________')
+
+    return to_print
 
 
 
@@ -623,9 +815,93 @@ if __name__ == '__main__':
                                              '"plots" folder containing all '\
                                              'the returned files will be '\
                                              'saved')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes for computing the figures '\
+                             'in parallel. By default, figures are computed '\
+                             'one after the other in a single process')
+    parser.add_argument('-r', '--render-jobs', type=int, default=1,
+                        help='Number of background processes for drawing '\
+                             'and saving the plots while the next figures '\
+                             'are computed. If 0, each plot is saved as soon'\
+                             ' as its figure is computed. By default, 1')
+    parser.add_argument('--no-render', action='store_true',
+                        help='Save only the csv files with the results, '\
+                             'without drawing the plots')
+    parser.add_argument('-s', '--statistics',
+                        help='Path to a .npz file with the line statistics '\
+                             'saved by "JMSC_statistics.py build", so that '\
+                             'the MusicXML scores are not processed. By '\
+                             'default, the line statistics are computed '\
+                             'from the scores')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Update the line statistics file given with -s '\
+                             'processing only the scores that changed since '\
+                             'it was saved, and compute again only the '\
+                             'figures and results affected by the changes. '\
+                             'If the file does not exist, it is created')
+    parser.add_argument('--fast-parser', action='store_true',
+                        help='Read the notes of the MusicXML scores directly'\
+                             ' from the files instead of parsing them with '\
+                             'music21, which is faster and gives the same '\
+                             'results')
+    parser.add_argument('--profile',
+                        help='Path to a file where the number of calls and '\
+                             'the time of each stage of the computation '\
+                             '(loading the csv file, parsing the scores, '\
+                             'finding the vocal parts, extracting segments, '\
+                             'counting, plotting and computing each figure) '\
+                             'are saved, as JSON if its extension is .json, '\
+                             'or as csv otherwise')
+    parser.add_argument('--cprofile',
+                        help='Path to a file where the statistics of the '\
+                             'Python profiler (cProfile) for the main '\
+                             'process are saved, which can be read with the '\
+                             'pstats module')
 
     args = parser.parse_args()
 
+    if args.fast_parser:
+        jSA.scoreStore['parser'] = 'fast'
+
+    if args.profile != None:
+        jSC.profiling = True
+
+    if args.cprofile != None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Compute the counts of every line once, so that each figure only needs
+    # to sum the counts of its lines
+    if args.incremental:
+        if args.statistics == None:
+            parser.error('the -i/--incremental option requires the '\
+                         '-s/--statistics option')
+        if os.path.isfile(args.statistics):
+            previous_stats = jSA.loadLineStatistics(args.statistics)
+            line_stats = jSA.lineStatistics(args.linesData, previous_stats)
+            changed_combinations = jSA.changedCombinations(line_stats,
+                                                           previous_stats)
+        else:
+            line_stats = jSA.lineStatistics(args.linesData)
+        jSA.saveLineStatistics(line_stats, args.statistics)
+    elif args.statistics == None:
+        line_stats = jSA.lineStatistics(args.linesData)
+    else:
+        line_stats = jSA.loadLineStatistics(args.statistics)
+
+    if args.no_render:
+        jSA.renderPlots = False
+
+    defer_renders = jSA.renderPlots and args.render_jobs > 0
+
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, initializer=init_worker,
+                                    initargs=(line_stats, jSC.profiling,
+                                              jSA.renderPlots, defer_renders))
+
+    if defer_renders:
+        jSA.startRenderWorkers(args.render_jobs)
+
     # Create a folder for storing the plots
     if args.path == None:
         p = '.'
@@ -673,11 +949,32 @@ if __name__ == '__main__':
     if 'mdd' in to_plot:
         plot_mdd(args.linesData, root_folder)
 
+    if pool != None:
+        pool.close()
+        pool.join()
+
+    if defer_renders:
+        print('\nWaiting for the remaining plots to be saved...')
+        jSA.finishRendering()
+
+    if args.cprofile != None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+        print('\nProfiler statistics saved in "' + args.cprofile + '"')
+
+    if args.profile != None:
+        jSA.saveProfile(args.profile)
+        print('\nProfile of the computation stages saved in "' +
+              args.profile + '"')
+
     # Confirmation message
     print('\n================================================================'\
           '===============')
     print('--- FINISHED! ---')
-    print('All the figures plotted and saved correctly.')
+    if jSA.renderPlots:
+        print('All the figures plotted and saved correctly.')
+    else:
+        print('All the results saved correctly.')
     print('(Required time: ' + time.strftime('%H:%M\'%S")',
                                              time.gmtime(time.time()-time0)))
     print('=================================================================='\
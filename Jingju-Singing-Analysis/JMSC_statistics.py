@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+
+
+# JMSC_statistics.py is a script for computing the statistics of every line of
+# the Jingju Music Scores Collection (http://doi.org/10.5281/zenodo.1464653)
+# and saving them in a file, so that the functions of the
+# jingju_singing_analysis.py module can use them without processing the
+# MusicXML scores.
+#
+# Copyright (C) 2018 Music Technology Group, Universitat Pompeu Fabra
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import jingju_singing_analysis as jSA
+import argparse
+import time
+import os
+
+
+
+def build(linesData, filename, incremental=False):
+    '''
+    It computes the statistics of every line listed in the lines_data.csv
+    file and saves them in the given .npz file.
+
+    Parameters:
+    - linesData -- str, path to the lines_data.csv file
+    - filename -- str, path to the .npz file
+    - incremental -- bool, if True and the .npz file exists, only the scores
+          that changed since it was saved are processed
+    '''
+
+    time0 = time.perf_counter()
+
+    if incremental and os.path.isfile(filename):
+        previousStats = jSA.loadLineStatistics(filename)
+        lineStats = jSA.lineStatistics(linesData, previousStats)
+        changes = jSA.changedCombinations(lineStats, previousStats)
+        print('\n' + str(len(changes)) + ' combinations of role type, '\
+              'shengqiang, banshi and line type affected by the changes')
+    else:
+        lineStats = jSA.lineStatistics(linesData)
+    jSA.saveLineStatistics(lineStats, filename)
+
+    print('\n' + str(len(lineStats['score'])) + ' lines saved in "' +
+          filename + '" in {:.1f} s'.format(time.perf_counter() - time0))
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Compute the pitch '\
+                                     'durations, intervals, cadential notes, '\
+                                     'melodic density and ambitus of every '\
+                                     'line of the Jingju Music Scores '\
+                                     'Collection, and save them in a file '\
+                                     'that can be used instead of the '\
+                                     'MusicXML scores.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    buildParser = subparsers.add_parser('build', help='Compute the line '\
+                                        'statistics and save them in a .npz'\
+                                        ' file')
+    buildParser.add_argument('linesData', help='Path to the lines_data.csv '\
+                             'file, that should be stored in the same folder'\
+                             ' as the MusicXML scores of the Jingju Music '\
+                             'Scores Collection')
+    buildParser.add_argument('-o', '--output',
+                             default='line_statistics.npz',
+                             help='Path to the .npz file where the line '\
+                             'statistics are saved. By default, '\
+                             'line_statistics.npz in the current directory')
+    buildParser.add_argument('-i', '--incremental', action='store_true',
+                             help='If the output file exists, process only '\
+                             'the scores whose MusicXML file or lines in '\
+                             'lines_data.csv changed since it was saved')
+    buildParser.add_argument('--fast-parser', action='store_true',
+                             help='Read the notes of the MusicXML scores '\
+                             'directly from the files instead of parsing '\
+                             'them with music21, which is faster and gives '\
+                             'the same results')
+
+    args = parser.parse_args()
+
+    if args.fast_parser:
+        jSA.scoreStore['parser'] = 'fast'
+
+    if args.command == 'build':
+        build(args.linesData, args.output, args.incremental)
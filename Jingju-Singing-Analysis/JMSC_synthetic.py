@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+
+
+
+# JMSC_synthetic.py is a script for generating synthetic collections of
+# MusicXML scores and their lines_data.csv file, with the same structure as
+# the Jingju Music Scores Collection (http://doi.org/10.5281/zenodo.1464653),
+# for measuring the time and memory required by the analysis code.
+#
+# Copyright (C) 2018 Music Technology Group, Universitat Pompeu Fabra
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import fractions
+import random
+import os
+
+
+
+# Banshi and line types of each role type and shengqiang. Opening and closing
+# lines alternate, so the last line type is always the closing one
+categories = {('laosheng', 'erhuang'): (['manban', 'sanyan', 'zhongsanyan',
+                                         'yuanban'], ['s1', 's2', 'x']),
+              ('laosheng', 'xipi'): (['manban', 'yuanban', 'erliu',
+                                      'liushui', 'kuaiban'], ['s', 'x']),
+              ('dan', 'erhuang'): (['manban', 'kuaisanyan', 'yuanban'],
+                                   ['s1', 's2', 'x']),
+              ('dan', 'xipi'): (['manban', 'yuanban', 'erliu', 'liushui',
+                                 'kuaiban'], ['s', 'x'])}
+
+# Pitches used for the notes of each role type, all of them among the
+# cadential notes that cadentialNotes can plot
+rolePitches = {'laosheng': ['B3', 'C#4', 'E4', 'F#4', 'G#4', 'A4', 'B4',
+                            'C#5', 'E5'],
+               'dan': ['E4', 'F#4', 'G#4', 'A4', 'B4', 'C#5', 'D#5', 'E5',
+                       'F#5']}
+
+# Characters for the lyrics
+characters = '我本是卧龙岗散淡的人凭阴阳如反掌保定乾坤先帝爷下南阳御驾三请'\
+             '料定了汉家业鼎足三分官封到武乡侯执掌帅印东西征南北剿保定'
+
+# Durations of the notes, and their MusicXML types and dots
+noteTypes = {fractions.Fraction(1, 4): ('16th', 0),
+             fractions.Fraction(1, 2): ('eighth', 0),
+             fractions.Fraction(3, 4): ('eighth', 1),
+             fractions.Fraction(1): ('quarter', 0),
+             fractions.Fraction(3, 2): ('quarter', 1),
+             fractions.Fraction(2): ('half', 0)}
+
+# Duration of the notes of a triplet of eighth notes
+tripletDuration = fractions.Fraction(1, 3)
+
+# Length of the measures in quarter notes, and MusicXML divisions per quarter
+# note
+measureLength = fractions.Fraction(2)
+divisions = 12
+
+# Number of scores of the JMSC, for generating collections of a given scale
+jmscScores = 92
+
+# Probabilities of the elements of the generated scores:
+# - graceNote -- of a grace note before the first note of a syllable
+# - padding -- of a padding syllable in brackets, without tone
+# - neutralTone -- of tone 5 in the last syllable of a line section
+# - triplet -- of a triplet of eighth notes instead of a note
+# - shortRest -- of a short rest after a syllable
+# - banshiChange -- of a change of banshi at the beginning of a line
+# - duet -- of a second vocal part, with the other role type
+# - accompaniment -- of an accompaniment part without lyrics
+probabilities = {'graceNote': 0.2, 'padding': 0.08, 'neutralTone': 0.1,
+                 'triplet': 0.05, 'shortRest': 0.05, 'banshiChange': 0.15,
+                 'duet': 0.1, 'accompaniment': 0.3}
+
+
+
+def generateCorpus(folder, scores, seed=None):
+    '''
+    It generates the given number of synthetic MusicXML scores and their
+    lines_data.csv file in the given folder. Each score is written as soon as
+    it is generated, so that the memory used does not depend on the number of
+    scores.
+
+    Parameters:
+    - folder -- str, path to the folder where the files are saved. It is
+          created if it does not exist
+    - scores -- int, number of scores
+    - seed -- int, seed for the random generator, so that the same corpus can
+          be generated again. If None, a different corpus is generated each
+          time
+
+    It returns the path to the lines_data.csv file.
+    '''
+
+    generator = random.Random(seed)
+    combinations = sorted(categories.keys())
+
+    os.makedirs(folder, exist_ok=True)
+    linesData = os.path.join(folder, 'lines_data.csv')
+
+    with open(linesData, 'w', encoding='utf-8') as f:
+        for i in range(scores):
+            hd, sq = combinations[i % len(combinations)]
+            scoreName = hd[:2] + sq[:2] + '-Synthetic' + str(i+1) + '.xml'
+            parts, rows = generateScore(generator, hd, sq)
+            with open(os.path.join(folder, scoreName), 'w',
+                      encoding='utf-8') as xmlFile:
+                xmlFile.write(musicXML(parts))
+            for p in range(len(rows)):
+                if p == 0:
+                    f.write(scoreName + ',Part 1' + ',' * 16 + '\n')
+                else:
+                    f.write(',Part ' + str(p+1) + ',' * 16 + '\n')
+                for row in rows[p]:
+                    f.write(','.join(row) + '\n')
+
+    return linesData
+
+
+
+def generateScore(generator, hd, sq):
+    '''
+    It generates the parts of a synthetic score and the rows of the lines of
+    its vocal parts in the lines_data.csv file. Some scores have a second
+    vocal part, with the other role type, and some an accompaniment part
+    without lyrics, which is not a vocal part.
+
+    Parameters:
+    - generator -- random.Random object
+    - hd -- str, role type of the first vocal part
+    - sq -- str, shengqiang of the score
+
+    It returns a list with the notes of each part, as returned by
+    generateLines, and a list with the rows of the lines of each vocal part,
+    each row being a list with the 18 fields of the lines_data.csv file as
+    strings.
+    '''
+
+    roleTypes = [hd]
+    if generator.random() < probabilities['duet']:
+        roleTypes.append([r for r in rolePitches if r != hd][0])
+
+    parts = []
+    rows = []
+    for role in roleTypes:
+        notes, lines = generateLines(generator, role, sq,
+                                     generator.randint(4, 16))
+        parts.append(notes)
+        rows.append([])
+        for line in lines:
+            judouLyrics = [j['lyrics'] for j in line['judou']]
+            row = ['', role, sq, line['bs'], line['ju'],
+                   ''.join(judouLyrics),
+                   formatOffset(line['judou'][0]['start']),
+                   formatOffset(line['judou'][-1]['end']),
+                   ''.join([j['tones'] for j in line['judou']])]
+            for j in line['judou']:
+                row += [j['lyrics'], formatOffset(j['start']),
+                        formatOffset(j['end'])]
+            rows[-1].append(row)
+
+    if generator.random() < probabilities['accompaniment']:
+        parts.append(generateAccompaniment(generator, hd, parts))
+
+    # All the parts end with the same complete measure
+    lengths = [sum([n['quarterLength'] for n in p]) for p in parts]
+    scoreLength = -(-max(lengths) // measureLength) * measureLength
+    for p in range(len(parts)):
+        addNote(parts[p], lengths[p], None, scoreLength - lengths[p])
+
+    return parts, rows
+
+
+
+def generateLines(generator, hd, sq, linesNumber):
+    '''
+    It generates the notes of a vocal part with the given number of lines,
+    each of them with three line sections (judou). Opening and closing lines
+    alternate, and the banshi changes from time to time.
+
+    Parameters:
+    - generator -- random.Random object
+    - hd -- str, role type of the part
+    - sq -- str, shengqiang of the part
+    - linesNumber -- int, number of lines
+
+    It returns two lists:
+    - the notes and rests of the part, each of them a dictionary with the
+          keys 'pitch' (str, None for rests), 'quarterLength'
+          (fractions.Fraction, 0 for grace notes), 'isGrace' (bool) and
+          'lyric' (str or None)
+    - a dictionary per line, with the keys 'bs', 'ju' and 'judou', the last
+          one being a list with a dictionary per line section, with the keys
+          'lyrics', 'tones', 'start' and 'end'
+    '''
+
+    banshi, lineTypes = categories[(hd, sq)]
+    bs = generator.choice(banshi)
+    pitches = rolePitches[hd]
+
+    notes = []
+    lines = []
+    position = fractions.Fraction(0)
+
+    for l in range(linesNumber):
+        if l > 0 and generator.random() < probabilities['banshiChange']:
+            bs = generator.choice(banshi)
+        if l % 2 == 1:
+            ju = lineTypes[-1]
+        else:
+            ju = generator.choice(lineTypes[:-1])
+        judou = []
+        for j in range(3):
+            lyrics = ''
+            tones = ''
+            start = None
+            syllables = generator.randint(2, 4)
+            for s in range(syllables):
+                character = generator.choice(characters)
+                if s > 0 and generator.random() < probabilities['padding']:
+                    lyric = '（' + character + '）'
+                else:
+                    lyric = character
+                    if (s == syllables - 1 and
+                        generator.random() < probabilities['neutralTone']):
+                        tones += '5'
+                    else:
+                        tones += generator.choice('1234')
+                lyrics += lyric
+                if generator.random() < probabilities['graceNote']:
+                    notes.append({'pitch': generator.choice(pitches),
+                                  'quarterLength': fractions.Fraction(0),
+                                  'isGrace': True, 'lyric': None})
+                for n in range(generator.randint(1, 3)):
+                    if start == None:
+                        start = position
+                    end = position
+                    if (n > 0 and position % 1 == 0 and
+                        measureLength - position % measureLength >= 1 and
+                        generator.random() < probabilities['triplet']):
+                        for t in range(3):
+                            end = position
+                            position = addNote(notes, position,
+                                               generator.choice(pitches),
+                                               tripletDuration)
+                    else:
+                        position = addNote(notes, position,
+                                           generator.choice(pitches),
+                                           generator.choice(list(noteTypes)),
+                                           lyric if n == 0 else None)
+                if (s < syllables - 1 and
+                    generator.random() < probabilities['shortRest']):
+                    position = addNote(notes, position, None,
+                                       fractions.Fraction(1, 4))
+            judou.append({'lyrics': lyrics, 'tones': tones, 'start': start,
+                          'end': end})
+            position = addNote(notes, position, None, fractions.Fraction(1, 2))
+        lines.append({'bs': bs, 'ju': ju, 'judou': judou})
+        position = addNote(notes, position, None, measureLength)
+
+    return notes, lines
+
+
+
+def generateAccompaniment(generator, hd, parts):
+    '''
+    It generates an accompaniment part without lyrics, with a note per beat
+    for the length of the longest of the given parts.
+
+    Parameters:
+    - generator -- random.Random object
+    - hd -- str, role type of the score, whose pitches are used
+    - parts -- list of the notes of each part, as returned by generateLines
+
+    It returns the notes of the part, as returned by generateLines.
+    '''
+
+    length = max([sum([n['quarterLength'] for n in p]) for p in parts])
+
+    notes = []
+    position = fractions.Fraction(0)
+    for beat in range(int(length)):
+        position = addNote(notes, position, generator.choice(rolePitches[hd]),
+                           fractions.Fraction(1))
+
+    return notes
+
+
+
+def addNote(notes, position, pitch, quarterLength, lyric=None):
+    '''
+    It appends a note, or rests for the given duration, to the given list of
+    notes. The note is shortened, or the rests split, so that they do not
+    cross the end of the measure.
+
+    Parameters:
+    - notes -- list of notes, as returned by generateLines
+    - position -- fractions.Fraction, offset of the end of the list of notes
+    - pitch -- str, pitch name, or None for rests
+    - quarterLength -- fractions.Fraction, duration of the note, or total
+          duration of the rests
+    - lyric -- str, lyric of the note, or None
+
+    It returns the offset of the end of the list of notes after appending the
+    note or rests.
+    '''
+
+    while quarterLength > 0:
+        remaining = measureLength - position % measureLength
+        if quarterLength == tripletDuration:
+            duration = tripletDuration
+        else:
+            duration = max([d for d in noteTypes
+                            if d <= min(remaining, quarterLength)])
+        if pitch != None:
+            quarterLength = duration
+        notes.append({'pitch': pitch, 'quarterLength': duration,
+                      'isGrace': False, 'lyric': lyric})
+        position += duration
+        quarterLength -= duration
+
+    return position
+
+
+
+def musicXML(parts):
+    '''
+    It returns a string with a MusicXML score with the given parts, each of
+    them a list of notes and rests as returned by generateLines, in measures
+    of the length given in measureLength.
+    '''
+
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>',
+           '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.0 '
+           'Partwise//EN" "http://www.musicxml.org/dtds/partwise.dtd">',
+           '<score-partwise version="3.0">', '<part-list>']
+    for p in range(len(parts)):
+        xml.append('<score-part id="P' + str(p+1) + '"><part-name>Part ' +
+                   str(p+1) + '</part-name></score-part>')
+    xml.append('</part-list>')
+
+    for p in range(len(parts)):
+        xml.append('<part id="P' + str(p+1) + '">')
+        measure = 0
+        position = fractions.Fraction(0)
+        for n in parts[p]:
+            if position == measure * measureLength:
+                if measure > 0:
+                    xml.append('</measure>')
+                measure += 1
+                xml.append('<measure number="' + str(measure) + '">')
+                if measure == 1:
+                    xml.append('<attributes><divisions>' + str(divisions) +
+                               '</divisions><time><beats>' +
+                               str(measureLength) + '</beats><beat-type>4'
+                               '</beat-type></time></attributes>')
+            xml.append(noteXML(n))
+            position += n['quarterLength']
+        xml.append('</measure>')
+        xml.append('</part>')
+
+    xml.append('</score-partwise>')
+
+    return '\n'.join(xml) + '\n'
+
+
+
+def noteXML(n):
+    '''
+    It returns a string with the MusicXML note element of the given note or
+    rest, as returned by generateLines.
+    '''
+
+    xml = '<note>'
+    if n['isGrace']:
+        xml += '<grace slash="yes"/>'
+    if n['pitch'] == None:
+        xml += '<rest/>'
+    else:
+        step = n['pitch'][0]
+        alter = n['pitch'].count('#') - n['pitch'].count('-')
+        octave = n['pitch'][-1]
+        xml += '<pitch><step>' + step + '</step>'
+        if alter != 0:
+            xml += '<alter>' + str(alter) + '</alter>'
+        xml += '<octave>' + octave + '</octave></pitch>'
+    if n['isGrace']:
+        xml += '<type>eighth</type>'
+    elif n['quarterLength'] == tripletDuration:
+        xml += ('<duration>' + str(int(tripletDuration * divisions)) +
+                '</duration><type>eighth</type><time-modification>'
+                '<actual-notes>3</actual-notes><normal-notes>2'
+                '</normal-notes></time-modification>')
+    else:
+        noteType, dots = noteTypes[n['quarterLength']]
+        xml += ('<duration>' + str(int(n['quarterLength'] * divisions)) +
+                '</duration><type>' + noteType + '</type>' + '<dot/>' * dots)
+    if n['lyric'] != None:
+        xml += ('<lyric number="1"><syllabic>single</syllabic><text>' +
+                n['lyric'] + '</text></lyric>')
+    xml += '</note>'
+
+    return xml
+
+
+
+def formatOffset(offset):
+    '''
+    It returns a string with the given offset as written in the
+    lines_data.csv file: a float for binary fractions, and a fraction
+    otherwise.
+    '''
+
+    if offset.denominator & (offset.denominator - 1) == 0:
+        return str(float(offset))
+    else:
+        return str(offset.numerator) + '/' + str(offset.denominator)
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic '\
+                                     'collection of MusicXML scores and its '\
+                                     'lines_data.csv file, with the same '\
+                                     'structure as the Jingju Music Scores '\
+                                     'Collection.')
+    parser.add_argument('folder', help='Path to the folder where the scores '\
+                        'and the lines_data.csv file are saved')
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('-n', '--scores', type=int, default=100,
+                      help='Number of scores. By default, 100')
+    size.add_argument('-s', '--scale', type=float,
+                      help='Size of the collection as a multiple of the '\
+                      'size of the JMSC, for instance 10 for a collection '\
+                      'ten times larger')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the random generator, so that the '\
+                        'same collection can be generated again')
+
+    args = parser.parse_args()
+
+    if args.scale != None:
+        scores = max(1, int(round(args.scale * jmscScores)))
+    else:
+        scores = args.scores
+
+    linesData = generateCorpus(args.folder, scores, args.seed)
+    print(str(scores) + ' scores and "' + linesData + '" generated')
@@ -0,0 +1,647 @@
+# -*- coding: utf-8 -*-
+
+
+
+# Jingju Scores Collection gathers the tools shared by Jingju Singing Analysis
+# and Jingju Tones Analysis for reading the lines_data.csv file of the Jingju
+# Music Scores Collection (http://doi.org/10.5281/zenodo.1464653) and for
+# profiling the stages of their computations.
+#
+# Copyright (C) 2018 Music Technology Group, Universitat Pompeu Fabra
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+from music21 import *
+import numpy as np
+import os
+import hashlib
+import itertools
+import collections
+import functools
+import contextlib
+import fractions
+import time
+import json
+
+
+
+###############################################################################
+## FUNCTIONS FOR PROFILING                                                   ##
+###############################################################################
+
+# If True, the number of calls and the time spent in each stage of the
+# computation (loading the lines_data.csv file, parsing the scores, finding
+# the vocal parts, extracting segments, counting, plotting...) are recorded in
+# stageProfile
+profiling = False
+
+# Number of calls and total time in seconds of each profiled stage, in the
+# order in which the stages were first run
+stageProfile = collections.OrderedDict()
+
+
+
+@contextlib.contextmanager
+def profileStage(stage):
+    '''
+    Context manager that records a call to the given stage and the time spent
+    in its block in stageProfile, if profiling is True. Stages can be nested,
+    and the time of a stage includes the time of the stages run within it.
+
+    Parameter:
+    - stage -- str, name of the stage
+
+    For example:
+    >>> with profileStage('converter.parse'):
+    ...     loadedScore = converter.parse(scorePath)
+    '''
+
+    if not profiling:
+        yield
+        return
+
+    time0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = stageProfile.setdefault(stage, [0, 0.0])
+        record[0] += 1
+        record[1] += time.perf_counter() - time0
+
+
+
+def profiled(stage):
+    '''
+    Decorator that records each call to the decorated function as a call to
+    the given stage, as the profileStage context manager does. If profiling is
+    False, the function is called directly.
+
+    Parameter:
+    - stage -- str, name of the stage
+    '''
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiling:
+                return function(*args, **kwargs)
+            with profileStage(stage):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+
+def mergeProfile(profile):
+    '''
+    It adds the calls and times of the given profile, for instance one
+    recorded in another process, to stageProfile.
+
+    Parameter:
+    - profile -- dict, with the same format as stageProfile
+    '''
+
+    for stage in profile:
+        record = stageProfile.setdefault(stage, [0, 0.0])
+        record[0] += profile[stage][0]
+        record[1] += profile[stage][1]
+
+
+
+def saveProfile(filename):
+    '''
+    It saves the number of calls and the time of each stage recorded in
+    stageProfile in the given file, as a JSON object if its extension is
+    .json, or otherwise as a csv file with the columns stage, calls and
+    seconds.
+
+    Parameter:
+    - filename -- str, path to the file
+    '''
+
+    if filename.endswith('.json'):
+        profile = collections.OrderedDict()
+        for stage in stageProfile:
+            profile[stage] = {'calls': stageProfile[stage][0],
+                              'seconds': stageProfile[stage][1]}
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=2)
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write('stage,calls,seconds\n')
+            for stage in stageProfile:
+                f.write(stage + ',' + str(stageProfile[stage][0]) + ',' +
+                        str(stageProfile[stage][1]) + '\n')
+
+
+###############################################################################
+## FUNCTIONS FOR GATHERING MATERIAL                                          ##
+###############################################################################
+
+# Line catalogues already loaded, per path to the lines_data.csv file
+lineCatalogues = {}
+
+
+
+@profiled('loadLineCatalogue')
+def loadLineCatalogue(linesData):
+    '''
+    Given the path to the lines_data.csv file, it reads the file and stores the
+    information of each line in columns, so that lines can be retrieved for any
+    combination of role types, shengqiang, banshi and line types without
+    reading the file again. Each file is read only once per session, unless it
+    is modified.
+
+    Parameter:
+    - linesData -- str, path to the lines_data.csv file
+
+    It returns a dictionary with the following keys:
+    - 'scores' -- [str], file names of the scores, in the order of the file
+    - 'parts' -- [int], number of vocal parts of each score
+    - 'score' -- numpy array of ints, index in 'scores' of the score of each
+          line
+    - 'part' -- numpy array of ints, index of the vocal part of each line,
+          starting from 0
+    - 'hd', 'sq', 'bs', 'ju' -- numpy arrays of ints, codes of the role type,
+          shengqiang, banshi and line type of each line
+    - 'categories' -- dict, with 'hd', 'sq', 'bs' and 'ju' as keys, and as
+          values a list with the instances of each element, so that the code
+          of an instance is its index in the list
+    - 'groups' -- dict, with a tuple of a role type, shengqiang, banshi and
+          line type as keys, and a numpy array of ints with the indexes of the
+          lines of that combination as values
+    - 'lyrics' -- numpy array of str, the lyrics of each line
+    - 'tones' -- numpy array of str, the tones of each line
+    - 'start', 'end' -- numpy arrays of floats or fractions.Fraction, the
+          starting and ending offsets of each line
+    - 'judouLyrics' -- numpy array of str, with a row per line and a column per
+          line section, the lyrics of each line section
+    - 'judouStart', 'judouEnd' -- numpy arrays of floats or
+          fractions.Fraction, with a row per line and a column per line
+          section, the starting and ending offsets of each line section, None
+          if the line has not that section
+    - 'fingerprint' -- str, SHA-1 hash of the content of the file
+    - 'groupFingerprints' -- [str], SHA-1 hash of the rows of each score in the
+          file, from the row with its name to its last line, so that changes
+          in the lines of a score can be detected
+    '''
+
+    fileInfo = os.stat(linesData)
+    key = os.path.abspath(linesData)
+    version = (fileInfo.st_mtime_ns, fileInfo.st_size)
+
+    if key in lineCatalogues and lineCatalogues[key][0] == version:
+        return lineCatalogues[key][1]
+
+    with open(linesData, 'r', encoding='utf-8') as f:
+        data = f.readlines()
+
+    with open(linesData, 'rb') as f:
+        fingerprint = hashlib.sha1(f.read()).hexdigest()
+
+    scores = []
+    parts = []
+    columns = {'score': [], 'part': [], 'hd': [], 'sq': [], 'bs': [],
+               'ju': [], 'lyrics': [], 'tones': [], 'start': [], 'end': [],
+               'judouLyrics': [], 'judouStart': [], 'judouEnd': []}
+    categories = {'hd': [], 'sq': [], 'bs': [], 'ju': []}
+    groupHashes = []
+
+    for line in data:
+        strInfo = line.strip().split(',')
+        strInfo += [''] * (18 - len(strInfo))
+        score = strInfo[0]
+        if score != '':
+            groupHashes.append(hashlib.sha1())
+        if len(groupHashes) > 0:
+            groupHashes[-1].update(line.strip().encode('utf-8') + b'\n')
+        if score != '':
+            scores.append(score)
+            parts.append(1)
+            if 'Part 1' in line: continue
+
+        if (score == '') and ('Part' in line):
+            parts[-1] += 1
+            continue
+
+        columns['score'].append(len(scores)-1)
+        columns['part'].append(parts[-1]-1)
+
+        # Code the instances of each element
+        for element, value in zip(['hd', 'sq', 'bs', 'ju'], strInfo[1:5]):
+            if value not in categories[element]:
+                categories[element].append(value)
+            columns[element].append(categories[element].index(value))
+
+        columns['lyrics'].append(strInfo[5])
+        columns['start'].append(floatOrFraction(strInfo[6]))
+        columns['end'].append(floatOrFraction(strInfo[7]))
+        columns['tones'].append(strInfo[8])
+        columns['judouLyrics'].append([strInfo[9], strInfo[12], strInfo[15]])
+        columns['judouStart'].append([floatOrFraction(strInfo[10]),
+                                      floatOrFraction(strInfo[13]),
+                                      floatOrFraction(strInfo[16])])
+        columns['judouEnd'].append([floatOrFraction(strInfo[11]),
+                                    floatOrFraction(strInfo[14]),
+                                    floatOrFraction(strInfo[17])])
+
+    catalogue = {'scores': scores, 'parts': parts, 'categories': categories,
+                 'fingerprint': fingerprint,
+                 'groupFingerprints': [h.hexdigest() for h in groupHashes]}
+
+    for c in ['score', 'part', 'hd', 'sq', 'bs', 'ju']:
+        catalogue[c] = np.array(columns[c], dtype=int)
+    for c in ['lyrics', 'tones']:
+        catalogue[c] = np.array(columns[c], dtype=object)
+    for c in ['start', 'end']:
+        catalogue[c] = np.empty(len(columns[c]), dtype=object)
+        catalogue[c][:] = columns[c]
+    for c in ['judouLyrics', 'judouStart', 'judouEnd']:
+        catalogue[c] = np.empty((len(columns[c]), 3), dtype=object)
+        if len(columns[c]) > 0:
+            catalogue[c][:] = columns[c]
+
+    # Index the lines by their combination of role type, shengqiang, banshi
+    # and line type
+    groups = {}
+    for r in range(len(catalogue['score'])):
+        combination = tuple([categories[e][catalogue[e][r]]
+                             for e in ['hd', 'sq', 'bs', 'ju']])
+        groups.setdefault(combination, []).append(r)
+    catalogue['groups'] = {c: np.array(groups[c], dtype=int) for c in groups}
+
+    lineCatalogues[key] = (version, catalogue)
+
+    return catalogue
+
+
+
+def selectLines(catalogue, hd, sq, bs, ju):
+    '''
+    It returns the indexes of the lines of a line catalogue that meet the input
+    criteria, in the order of the lines_data.csv file. The lines are taken
+    from the groups of the catalogue for each combination of the input
+    instances, so that only the retrieved lines are visited.
+
+    Parameters:
+    - catalogue -- dict, as returned by the loadLineCatalogue function
+    - hd -- [str], list of role types
+    - sq -- [str], list of shengqiang
+    - bs -- [str], list of banshi
+    - ju -- [str], list of line types
+
+    It returns a numpy array of ints.
+    '''
+
+    groups = catalogue['groups']
+
+    found = [groups[c] for c in itertools.product(hd, sq, bs, ju)
+             if c in groups]
+
+    if len(found) == 0:
+        return np.array([], dtype=int)
+
+    return np.sort(np.concatenate(found))
+
+
+
+def searchInformation(catalogue, rows):
+    '''
+    It returns the instances of each element of the jingju musical system
+    found in the given lines of a line catalogue, in the order in which they
+    first appear.
+
+    Parameters:
+    - catalogue -- dict, as returned by the loadLineCatalogue function
+    - rows -- numpy array of ints, indexes of the lines, as returned by the
+          selectLines function
+
+    It returns a dictionary with the keys 'hd' for role type, 'sq' for
+    shengqiang, 'bs' for banshi, and 'ju' for line type. Values are lists of
+    strings.
+    '''
+
+    searchInfo = {}
+
+    for element in ['hd', 'sq', 'bs', 'ju']:
+        codes, firstIndex = np.unique(catalogue[element][rows],
+                                      return_index=True)
+        instances = catalogue['categories'][element]
+        searchInfo[element] = [instances[codes[i]]
+                               for i in np.argsort(firstIndex)]
+
+    return searchInfo
+
+
+
+def scoresFolder(linesData):
+    '''
+    It returns the path of the folder shared by the given lines_data.csv file
+    and the MusicXML scores, ending with '/', or an empty string if the path
+    to the file has no folder.
+    '''
+
+    path = linesData[:linesData.rfind('/')+1]
+    if len(path) == 0:
+        path = linesData[:linesData.rfind('\\')+1]
+        path = path.replace('\\', '/')
+
+    return path
+
+
+
+def scoreLists(catalogue, path):
+    '''
+    It returns a list for each score of a line catalogue, containing the path
+    to the score, and an empty list for each of its vocal parts.
+
+    Parameters:
+    - catalogue -- dict, as returned by the loadLineCatalogue function
+    - path -- str, path to the folder of the MusicXML scores
+
+    It returns a list of lists.
+    '''
+
+    return [[path+catalogue['scores'][i]] +
+            [[] for j in range(catalogue['parts'][i])]
+            for i in range(len(catalogue['scores']))]
+
+
+
+###############################################################################
+## FUNCTIONS FOR LOADING SCORES                                              ##
+###############################################################################
+
+# Settings for the store of parsed scores used by the loadScore function, and
+# by the loadNoteTables function of jingju_singing_analysis.py and the
+# loadVoiceParts function of jingju_tones_analysis.py:
+# - memoryBudget -- int, approximate memory in MB for keeping parsed scores and
+#       note tables in memory. The memory used by a parsed score is estimated
+#       as scoreMemoryFactor times the size of its MusicXML file. When the
+#       budget is exceeded, the least recently used scores are dropped
+# - folder -- str, path to the folder where a serialized copy of the vocal
+#       parts and the note tables of each parsed score are saved, so that
+#       following runs do not need to parse the MusicXML files again. If None,
+#       nothing is saved
+# - parser -- str, 'music21' for computing the note tables from the scores
+#       parsed with music21, or 'fast' for reading them directly from the
+#       MusicXML files with the readVoiceParts function, which is faster and
+#       gives the same tables. It is only used by loadNoteTables
+scoreStore = {'memoryBudget': 1024,
+              'folder': os.path.join(os.path.expanduser('~'),
+                                     '.jingju_scores_analysis'),
+              'parser': 'music21'}
+
+scoreMemoryFactor = 20
+
+# Entries of the score store, from the least to the most recently used
+parsedScores = collections.OrderedDict()
+
+
+
+def scoreStoreEntry(scorePath):
+    '''
+    It returns the entry of the score store for the given score, creating it
+    if needed. Scores are identified by their path, modification time and
+    size, so that a modified score gets a new entry. The copies saved for
+    each score are kept in a subfolder of the folder given in scoreStore, so
+    that those of its previous versions are found and removed without listing
+    the whole folder when a new copy is saved (see removeOldVersions).
+
+    Parameter:
+    - scorePath -- str, path to the MusicXML file
+
+    It returns a tuple with the following elements:
+    - a dictionary with the keys 'score', 'parts', 'tables', 'voiceParts',
+          'memory' and 'lines'. The first four are None until loaded by the
+          loadScore function, and the loadNoteTables and loadVoiceParts
+          functions of the analysis modules. 'lines' is a dictionary where
+          the results computed for single lines of the score, such as their
+          cadential notes (see lineCadences in jingju_singing_analysis.py),
+          are kept while the entry is in memory
+    - a string with the path, without extension, of the files saved for this
+          score in the folder given in scoreStore, or None if no folder is
+          given
+    '''
+
+    fileInfo = os.stat(scorePath)
+    absPath = os.path.abspath(scorePath)
+    key = (absPath, fileInfo.st_mtime_ns, fileInfo.st_size)
+
+    filePrefix = None
+    if scoreStore['folder'] != None:
+        pathHash = hashlib.sha1(absPath.encode('utf-8')).hexdigest()
+        fileName = str(fileInfo.st_mtime_ns) + '-' + str(fileInfo.st_size)
+        filePrefix = os.path.join(scoreStore['folder'], pathHash, fileName)
+
+    if key in parsedScores:
+        parsedScores.move_to_end(key)
+        return parsedScores[key], filePrefix
+
+    parsedScores[key] = {'score': None, 'parts': None, 'tables': None,
+                         'voiceParts': None, 'memory': 0,
+                         'fileSize': fileInfo.st_size, 'lines': {}}
+
+    return parsedScores[key], filePrefix
+
+
+
+def removeOldVersions(filePrefix):
+    '''
+    It removes the files saved for the previous versions of a score, once a
+    file of its current version has been saved. They are the files in the
+    same subfolder of the folder given in scoreStore that do not start with
+    the given path.
+
+    Parameter:
+    - filePrefix -- str, path without extension of the files of the current
+          version of the score, as returned by scoreStoreEntry
+    '''
+
+    folder, fileName = os.path.split(filePrefix)
+    for oldFile in os.listdir(folder):
+        if not oldFile.startswith(fileName + '.'):
+            try:
+                os.remove(os.path.join(folder, oldFile))
+            except OSError:
+                pass
+
+
+
+def trimScoreStore():
+    '''
+    It drops the least recently used entries of the score store until the
+    memory they use is within the budget given in scoreStore. The most
+    recently used entry is always kept.
+    '''
+
+    budget = scoreStore['memoryBudget'] * 1024 * 1024
+    usedMemory = sum([e['memory'] for e in parsedScores.values()])
+    while usedMemory > budget and len(parsedScores) > 1:
+        droppedEntry = parsedScores.popitem(last=False)[1]
+        usedMemory -= droppedEntry['memory']
+
+
+
+def loadScore(scorePath):
+    '''
+    Given the path to a MusicXML score, it returns the parsed score and its
+    vocal parts. Each score is parsed only once: parsed scores are kept in
+    memory within the budget given in scoreStore, and a serialized copy of
+    their vocal parts is saved in the folder given in scoreStore, so that a
+    following run loads it instead of parsing the MusicXML file. Scores are
+    identified by their path, modification time and size, so that a modified
+    score is parsed again.
+
+    Only the vocal parts are kept in the returned score, so it should be used
+    for analysis, not for showing the score. The returned objects are shared
+    by all the calls to this function, so they should not be modified;
+    functions that need to show or change a score, for instance for coloring
+    notes, should parse it again, as findScoreByPitch in
+    jingju_singing_analysis.py does.
+
+    Parameter:
+    - scorePath -- str, path to the MusicXML file
+
+    It returns a tuple with the music21.stream.Score object and the list of
+    its vocal parts, as returned by the findVoiceParts function.
+
+    For example:
+    >>> loadedScore, parts = loadScore('daxp-ChunQiuTing-SuoLinNang.xml')
+    >>> parts
+    [<music21.stream.Part Piano>]
+    '''
+
+    entry, filePrefix = scoreStoreEntry(scorePath)
+
+    if entry['score'] != None:
+        return entry['score'], entry['parts']
+
+    # Look for a serialized copy of the score saved in a previous run
+    loadedScore = None
+    if filePrefix != None and os.path.isfile(filePrefix + '.p'):
+        try:
+            with profileStage('converter.thaw'):
+                loadedScore = converter.thaw(filePrefix + '.p',
+                                             zipType='zlib')
+        except Exception:
+            loadedScore = None
+
+    if loadedScore == None:
+        with profileStage('converter.parse'):
+            loadedScore = converter.parse(scorePath)
+        # Keep only the vocal parts
+        parts = findVoiceParts(loadedScore)
+        voiceIds = [id(p) for p in parts]
+        for p in list(loadedScore.parts):
+            if id(p) not in voiceIds:
+                loadedScore.remove(p)
+        if filePrefix != None:
+            # Write to a temporary file first, so that other processes never
+            # read an incomplete file
+            tempFile = filePrefix + '.p.' + str(os.getpid())
+            try:
+                os.makedirs(os.path.dirname(filePrefix), exist_ok=True)
+                converter.freeze(loadedScore, fmt='pickle', fp=tempFile,
+                                 zipType='zlib')
+                os.replace(tempFile, filePrefix + '.p')
+                removeOldVersions(filePrefix)
+            except OSError:
+                pass
+    else:
+        parts = findVoiceParts(loadedScore)
+
+    entry['score'] = loadedScore
+    entry['parts'] = parts
+    entry['memory'] += entry['fileSize'] * scoreMemoryFactor
+
+    trimScoreStore()
+
+    return entry['score'], entry['parts']
+
+
+
+###############################################################################
+## AUXILIARY FUNCTIONS                                                       ##
+###############################################################################
+
+def floatOrFraction(strValue):
+    '''
+    It takes a string with a numerical value and analyses if it is a float or
+    a fractions.Fraction object.
+
+    Parameter:
+    - strValue -- str, a numercial value
+
+    It returns a flot or a fractions.Fraction object. If the input is an empty
+    string, it returns None
+
+    For example:
+    >>> floatOrFraction('1277/6')
+    Fraction(1277, 6)
+    >>> floatOrFraction('164')
+    164.0
+    >>> floatOrFraction('')
+    >>>
+    '''
+    if '/' in strValue:
+        numerator = int(strValue.split('/')[0])
+        denominator = int(strValue.split('/')[1])
+        value = fractions.Fraction(numerator, denominator)
+    elif len(strValue) == 0:
+        value = None
+    else:
+        value = float(strValue)
+
+    return value
+
+
+
+@profiled('findVoiceParts')
+def findVoiceParts(score):
+    '''
+    It takes a score and searches which of the parts is the one containing
+    lyrics, and therefore, the one containing singing voice.
+
+    Parameter:
+    - score -- a music21.strem.Score object
+
+    It returns a list with all the parts that contain lyrics
+
+    For example:
+    >>> import music21
+    >>> s = music21.converter.parse('sdxp-WoHeNi-SiLangTanMu.xml')
+    >>> findVoiceParts(s)
+    [<music21.stream.Part Piano>, <music21.stream.Part Piano>]
+    '''
+
+    voiceParts = []
+
+    for p in score.parts:
+        # Flatten the part only once
+        notes = p.flat.notes.stream()
+        if len(notes) == 0: continue
+        i = 0
+        n = notes[i]
+        while n.quarterLength == 0:
+            i += 1
+            n = notes[i]
+        if n.hasLyrics():
+                if p.hasElementOfClass('Instrument'):
+                    p.remove(p.getInstrument())
+                voiceParts.append(p)
+    return voiceParts
@@ -25,9 +25,47 @@
 
 import numpy as np
 import sys
+import os
+import hashlib
+import itertools
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure, SubplotParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from music21 import *
 import fractions
+import contextlib
+import concurrent.futures
+from xml.etree import ElementTree
+import jingju_scores_collection as jSC
+from jingju_scores_collection import (profileStage, profiled, stageProfile,
+                                      mergeProfile, saveProfile,
+                                      loadLineCatalogue, selectLines,
+                                      searchInformation, scoresFolder,
+                                      scoreLists, scoreStore, parsedScores,
+                                      scoreStoreEntry, removeOldVersions,
+                                      trimScoreStore, loadScore,
+                                      findVoiceParts)
+
+
+
+# If True, invalid inputs and queries that retrieve no line raise the
+# exceptions below instead of asking the user for a new input or quitting the
+# program, so that the functions can be safely run in unattended processes
+batchMode = False
+
+
+
+class InvalidInputError(ValueError):
+    '''
+    Raised in batch mode when an invalid value is given for a parameter.
+    '''
+
+
+
+class NoLinesFoundError(LookupError):
+    '''
+    Raised in batch mode when no line is retrieved for the given criteria.
+    '''
 
 
 
@@ -107,56 +145,23 @@ def collectLineMaterial(linesData,
 
     print('\nRetrieving lines that meet the given criteria...')
 
-    # Get the path of the folder shared by the linesData file and the xml
-    # scores
-    path = linesData[:linesData.rfind('/')+1]
-    if len(path) == 0:
-        path = linesData[:linesData.rfind('\\')+1]
-        path = path.replace('\\', '/')
-
-    with open(linesData, 'r', encoding='utf-8') as f:
-        data = f.readlines()
+    path = scoresFolder(linesData)
 
-    material = []
+    catalogue = loadLineCatalogue(linesData)
+    rows = selectLines(catalogue, hd, sq, bs, ju)
 
-    found_lines = 0
+    found_lines = len(rows)
 
     # Search information
-    searchInfo = {'hd':[], 'sq':[], 'bs':[], 'ju':[]}
-    material.append(searchInfo)
+    material = [searchInformation(catalogue, rows)]
 
     # Segments collection
-    for line in data:
-        strInfo = line.strip().split(',')
-        score = strInfo[0]
-        if score != '':
-            material.append([path+score,[]])
-            if 'Part 1' in line: continue
-
-        if (score == '') and ('Part' in line):
-            material[-1].append([])
-            continue
-
-        hd0 = strInfo[1]
-        sq0 = strInfo[2]
-        bs0 = strInfo[3]
-        ju0 = strInfo[4]
-
-        # Get the starting and ending points of the line as floats or fractions
-        start = floatOrFraction(strInfo[6])
-        end = floatOrFraction(strInfo[7])
-
-        if (hd0 in hd) and (sq0 in sq) and (bs0 in bs) and (ju0 in ju):
-            material[-1][-1].append([start, end])
-            found_lines += 1
-            if hd0 not in material[0]['hd']:
-                material[0]['hd'].append(hd0)
-            if sq0 not in material[0]['sq']:
-                material[0]['sq'].append(sq0)
-            if bs0 not in material[0]['bs']:
-                material[0]['bs'].append(bs0)
-            if ju0 not in material[0]['ju']:
-                material[0]['ju'].append(ju0)
+    scores = scoreLists(catalogue, path)
+    for r in rows:
+        score = scores[catalogue['score'][r]]
+        score[catalogue['part'][r]+1].append([catalogue['start'][r],
+                                              catalogue['end'][r]])
+    material += scores
 
     printingFound(material[0], hangdang, shengqiang, banshi, judou,
                   found_lines)
@@ -255,76 +260,28 @@ def collectLineJudouMaterial(linesData,
 
     print('\nRetrieving sections for lines that meet the given criteria...')
 
-    # Get the path of the folder shared by the linesData file and the xml
-    # scores
-    path = linesData[:linesData.rfind('/')+1]
-    if len(path) == 0:
-        path = linesData[:linesData.rfind('\\')+1]
-        path = path.replace('\\', '/')
+    path = scoresFolder(linesData)
 
-    with open(linesData, 'r', encoding='utf-8') as f:
-        data = f.readlines()
+    catalogue = loadLineCatalogue(linesData)
+    rows = selectLines(catalogue, hd, sq, bs, ju)
 
-    material = []
-
-    found_lines = 0
+    found_lines = len(rows)
 
     # Search information
-    searchInfo = {'hd':[], 'sq':[], 'bs':[], 'ju':[]}
-    material.append(searchInfo)
+    material = [searchInformation(catalogue, rows)]
 
     # Segments collection
-    for line in data:
-        strInfo = line.strip().split(',')
-        score = strInfo[0]
-        if score != '':
-            material.append([path+score,[]])
-            if 'Part 1' in line: continue
-
-        if (score == '') and ('Part' in line):
-            material[-1].append([])
-            continue
-
-        hd0 = strInfo[1]
-        sq0 = strInfo[2]
-        bs0 = strInfo[3]
-        ju0 = strInfo[4]
-
-        if (hd0 in hd) and (sq0 in sq) and (bs0 in bs) and (ju0 in ju):
-            material[-1][-1].append([])
-            found_lines += 1
-            if hd0 not in material[0]['hd']:
-                material[0]['hd'].append(hd0)
-            if sq0 not in material[0]['sq']:
-                material[0]['sq'].append(sq0)
-            if bs0 not in material[0]['bs']:
-                material[0]['bs'].append(bs0)
-            if ju0 not in material[0]['ju']:
-                material[0]['ju'].append(ju0)
-
-            if strInfo[10] != '':
-                ju1_start = floatOrFraction(strInfo[10])
-                ju1_end = floatOrFraction(strInfo[11])
-                ju1 = [ju1_start, ju1_end]
-            else:
-                ju1 = []
-            material[-1][-1][-1].append(ju1)
-
-            if strInfo[13] != '':
-                ju2_start = floatOrFraction(strInfo[13])
-                ju2_end = floatOrFraction(strInfo[14])
-                ju2 = [ju2_start, ju2_end]
+    scores = scoreLists(catalogue, path)
+    for r in rows:
+        line = []
+        for jd in range(3):
+            if catalogue['judouStart'][r, jd] != None:
+                line.append([catalogue['judouStart'][r, jd],
+                             catalogue['judouEnd'][r, jd]])
             else:
-                ju2 = []
-            material[-1][-1][-1].append(ju2)
-
-            if strInfo[16] != '':
-                ju3_start = floatOrFraction(strInfo[16])
-                ju3_end = floatOrFraction(strInfo[17])
-                ju3 = [ju3_start, ju3_end]
-            else:
-                ju3 = []
-            material[-1][-1][-1].append(ju3)
+                line.append([])
+        scores[catalogue['score'][r]][catalogue['part'][r]+1].append(line)
+    material += scores
 
     printingFound(material[0], hangdang, shengqiang, banshi, judou,
                   found_lines)
@@ -347,6 +304,1151 @@ def collectLineJudouMaterial(linesData,
 
 
 
+###############################################################################
+## FUNCTIONS FOR LOADING SCORES                                              ##
+###############################################################################
+
+# Columns of the note tables returned by the noteTable function
+noteTableColumns = ['offset', 'quarterLength', 'midi', 'name', 'isRest',
+                    'isGrace', 'lyric', 'openParenthesis', 'closeParenthesis']
+
+
+
+@profiled('noteTable')
+def noteTable(part):
+    '''
+    It takes a vocal part and extracts the information about its notes and
+    rests used by the analysis functions into numpy arrays, so that each part
+    is walked only once and the analysis functions can work with array
+    operations instead of music21 objects.
+
+    Parameter:
+    - part -- a music21.stream.Part object, as returned by findVoiceParts, or
+          a generator of the notes of a vocal part, as yielded by
+          readVoiceParts
+
+    It returns a dictionary with the following keys, whose values are numpy
+    arrays with one element per note or rest of the part, in the same order as
+    in part.flat.notesAndRests:
+    - 'offset' -- float, offset of the note or rest
+    - 'quarterLength' -- float, quarterLength duration
+    - 'midi' -- int, midi value of the note, -1 for rests
+    - 'name' -- str, pitch name as given by nameWithOctave, '' for rests
+    - 'isRest' -- bool, True for rests
+    - 'isGrace' -- bool, True for grace notes, that is, notes whose
+          quarterLength is 0
+    - 'lyric' -- int, index of the lyric of the note in the 'lyrics' list, -1
+          if the note has no lyrics
+    - 'openParenthesis' -- bool, True if the lyric contains '（'
+    - 'closeParenthesis' -- bool, True if the lyric contains '）'
+    and the following two additional keys:
+    - 'lyrics' -- numpy array of str, the lyrics of the part
+    - 'minDuration' -- float, the minimum quarterLength of the notes in the
+          part that are not grace notes, but never higher than 0.25. It is the
+          duration given to grace notes when they are counted
+    '''
+
+    if isinstance(part, stream.Stream):
+        notes = (noteEvent(n) for n in part.flat.notesAndRests.stream())
+    else:
+        notes = part
+
+    columns = {c: [] for c in noteTableColumns}
+    lyrics = []
+    minDuration = 0.25
+
+    for n in notes:
+        noteDur = n['quarterLength']
+        columns['offset'].append(n['offset'])
+        columns['quarterLength'].append(noteDur)
+        columns['isRest'].append(n['isRest'])
+        columns['isGrace'].append(n['isGrace'])
+        columns['midi'].append(n['midi'])
+        columns['name'].append(n['name'])
+        lyricIndex = -1
+        lyric = ''
+        if not n['isRest']:
+            if noteDur != 0 and noteDur < minDuration:
+                minDuration = noteDur
+            if n['lyric'] != None:
+                lyric = n['lyric']
+                lyricIndex = len(lyrics)
+                lyrics.append(lyric)
+        columns['lyric'].append(lyricIndex)
+        columns['openParenthesis'].append('（' in lyric)
+        columns['closeParenthesis'].append('）' in lyric)
+
+    table = {'offset': np.array(columns['offset'], dtype=float),
+             'quarterLength': np.array(columns['quarterLength'], dtype=float),
+             'midi': np.array(columns['midi'], dtype=int),
+             'name': np.array(columns['name'], dtype=str),
+             'isRest': np.array(columns['isRest'], dtype=bool),
+             'isGrace': np.array(columns['isGrace'], dtype=bool),
+             'lyric': np.array(columns['lyric'], dtype=int),
+             'openParenthesis': np.array(columns['openParenthesis'],
+                                         dtype=bool),
+             'closeParenthesis': np.array(columns['closeParenthesis'],
+                                          dtype=bool),
+             'lyrics': np.array(lyrics, dtype=str),
+             'minDuration': minDuration}
+
+    return table
+
+
+
+def noteEvent(n):
+    '''
+    It takes a music21 note or rest and returns a dictionary with the
+    information used by the noteTable function, with the same keys as the
+    dictionaries yielded by readVoiceParts.
+
+    Parameter:
+    - n -- a music21.note.Note or music21.note.Rest object
+    '''
+
+    noteDur = float(n.quarterLength)
+    event = {'offset': float(n.offset), 'quarterLength': noteDur,
+             'midi': -1, 'name': '', 'isRest': n.isRest,
+             'isGrace': noteDur == 0 and not n.isRest, 'lyric': None}
+    if not n.isRest:
+        event['midi'] = n.pitch.midi
+        event['name'] = n.nameWithOctave
+        if n.hasLyrics():
+            event['lyric'] = n.lyric
+            if event['lyric'] == None:
+                event['lyric'] = ''
+
+    return event
+
+
+
+def loadNoteTables(scorePath):
+    '''
+    Given the path to a MusicXML score, it returns the note tables of its
+    vocal parts, as computed by the noteTable function. As for the loadScore
+    function, the tables are kept in memory and saved in the folder given in
+    scoreStore, so that each score is processed only once, and following runs
+    can load the tables without parsing the MusicXML file. If the parser
+    given in scoreStore is 'fast', the tables are read from the MusicXML file
+    with the readVoiceParts function, without parsing it with music21.
+
+    Parameter:
+    - scorePath -- str, path to the MusicXML file
+
+    It returns a list with a note table for each vocal part of the score, in
+    the same order as the parts returned by findVoiceParts.
+    '''
+
+    entry, filePrefix = scoreStoreEntry(scorePath)
+
+    if entry['tables'] != None:
+        return entry['tables']
+
+    tables = None
+
+    # Look for the tables saved in a previous run
+    if filePrefix != None and os.path.isfile(filePrefix + '.npz'):
+        try:
+            tables = []
+            with np.load(filePrefix + '.npz') as savedTables:
+                for i in range(int(savedTables['parts'])):
+                    table = {}
+                    for c in noteTableColumns + ['lyrics']:
+                        table[c] = savedTables['part' + str(i) + '-' + c]
+                    table['minDuration'] = float(savedTables['part' + str(i) +
+                                                             '-minDuration'])
+                    tables.append(table)
+        except Exception:
+            tables = None
+
+    if tables == None:
+        if scoreStore['parser'] == 'fast':
+            parts = readVoiceParts(scorePath)
+        else:
+            parts = loadScore(scorePath)[1]
+        tables = [noteTable(p) for p in parts]
+        if filePrefix != None:
+            toSave = {'parts': len(tables)}
+            for i in range(len(tables)):
+                for c in tables[i]:
+                    toSave['part' + str(i) + '-' + c] = tables[i][c]
+            tempFile = filePrefix + '.npz.' + str(os.getpid())
+            try:
+                os.makedirs(os.path.dirname(filePrefix), exist_ok=True)
+                with open(tempFile, 'wb') as f:
+                    np.savez(f, **toSave)
+                os.replace(tempFile, filePrefix + '.npz')
+                removeOldVersions(filePrefix)
+            except OSError:
+                pass
+
+    entry['tables'] = tables
+    for table in tables:
+        for c in noteTableColumns:
+            entry['memory'] += table[c].nbytes
+
+    trimScoreStore()
+
+    return tables
+
+
+
+# Semitones of each note step above C, for the readVoiceParts function
+stepSemitones = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# Colors and hatches of the notes in the plots of the cadentialNotes function
+pitchColors = {'G#3':['#F4D03F','x'], 'B3':['#76D7C4','x'],
+               'C#4':['#2E86C1','x'], 'C##4':['#5B2C6F','x'],
+               'D#4':['#BB8FCE','x'], 'E4':['#E74C3C',''],
+               'F#4':['#F39C12',''], 'G#4':['#F4D03F',''],
+               'A4':['#2ECC71',''], 'A#4':['#117864',''],
+               'B4':['#76D7C4',''], 'C#5':['#2E86C1',''],
+               'D#5':['#BB8FCE',''], 'E5':['#E74C3C','O'],
+               'F#5':['#F39C12','O']}
+
+# Midi value, color and hatch of the pitch names already looked up by the
+# pitchInfo function, shared by all the functions of this process
+pitchTable = {}
+
+
+
+def readVoiceParts(scorePath):
+    '''
+    Given the path to an uncompressed MusicXML score, it reads the file
+    incrementally and yields a generator for each vocal part, that is, for
+    each part whose first note that is not a grace note has lyrics, as for the
+    findVoiceParts function. Each part generator yields a dictionary for each
+    note and rest of the part, in the order of the file. The XML elements are
+    discarded once each measure is read, so the memory used does not grow with
+    the size of the score, and the music21 objects are never created.
+
+    As for itertools.groupby, the parts are read from the same file, so each
+    part generator should be consumed before asking for the next part;
+    otherwise its remaining notes are skipped.
+
+    Parameter:
+    - scorePath -- str, path to the MusicXML file
+
+    The dictionary yielded for each note or rest has the following keys:
+    - 'offset' -- float, offset of the note or rest from the beginning of the
+          score
+    - 'quarterLength' -- float, quarterLength duration, 0 for grace notes
+    - 'midi' -- int, midi value of the note, -1 for rests
+    - 'name' -- str, pitch name as given by nameWithOctave, '' for rests
+    - 'isRest' -- bool, True for rests
+    - 'isGrace' -- bool, True for grace notes
+    - 'lyric' -- str, text of the first lyric of the note, None if the note
+          has no lyrics
+
+    For example:
+    >>> for part in readVoiceParts('daxp-ChunQiuTing-SuoLinNang.xml'):
+    ...     lyrics = [n['lyric'] for n in part if n['lyric'] != None]
+    '''
+
+    xmlEvents = ElementTree.iterparse(scorePath, events=('start', 'end'))
+
+    for event, element in xmlEvents:
+        if event != 'start' or element.tag != 'part': continue
+        partNotes = readPartNotes(xmlEvents, element)
+        # Read the notes until the first one that is not a grace note, to know
+        # if the part has lyrics
+        firstNotes = []
+        for n in partNotes:
+            firstNotes.append(n)
+            if not n['isRest'] and not n['isGrace']: break
+        if (len(firstNotes) > 0 and not firstNotes[-1]['isRest'] and
+            not firstNotes[-1]['isGrace'] and firstNotes[-1]['lyric'] != None):
+            yield itertools.chain(firstNotes, partNotes)
+        # Skip the notes that were not consumed
+        for n in partNotes: pass
+
+
+
+def readPartNotes(xmlEvents, partElement):
+    '''
+    It continues reading the events of an ElementTree.iterparse iterator from
+    the start of a part element until its end, and yields a dictionary for each
+    note and rest of the part, as described in the readVoiceParts function.
+    Each measure element is removed from the part once it is read. Only the
+    first note of a chord is yielded.
+
+    Parameters:
+    - xmlEvents -- iterator, as returned by ElementTree.iterparse with 'start'
+          and 'end' events, just after the start of the part element
+    - partElement -- ElementTree.Element, the part element
+    '''
+
+    divisions = 1
+    measureOffset = fractions.Fraction(0)
+    position = fractions.Fraction(0)
+    measureLength = fractions.Fraction(0)
+
+    for event, element in xmlEvents:
+        if event == 'start':
+            if element.tag == 'measure':
+                position = fractions.Fraction(0)
+                measureLength = fractions.Fraction(0)
+            continue
+        if element.tag == 'part':
+            element.clear()
+            return
+        elif element.tag == 'measure':
+            measureOffset += measureLength
+            partElement.remove(element)
+        elif element.tag == 'attributes':
+            if element.find('divisions') != None:
+                divisions = int(element.findtext('divisions'))
+        elif element.tag in ['backup', 'forward']:
+            duration = fractions.Fraction(element.findtext('duration'))
+            if element.tag == 'backup':
+                position -= duration / divisions
+            else:
+                position += duration / divisions
+                measureLength = max(measureLength, position)
+        elif element.tag == 'note':
+            if element.find('chord') != None: continue
+            isRest = element.find('rest') != None
+            if element.find('grace') != None:
+                noteDur = fractions.Fraction(0)
+            else:
+                noteDur = (fractions.Fraction(element.findtext('duration')) /
+                           divisions)
+            midi = -1
+            name = ''
+            if not isRest:
+                step = element.findtext('pitch/step')
+                alter = element.findtext('pitch/alter')
+                alter = 0 if alter == None else int(round(float(alter)))
+                octave = int(element.findtext('pitch/octave'))
+                midi = (octave + 1) * 12 + stepSemitones[step] + alter
+                name = step + ('#' * alter if alter > 0 else '-' * -alter)
+                name += str(octave)
+            lyric = None
+            if element.find('lyric') != None:
+                lyric = element.find('lyric').findtext('text')
+                if lyric != None:
+                    lyric = lyric.strip()
+            yield {'offset': float(measureOffset + position),
+                   'quarterLength': float(noteDur), 'midi': midi,
+                   'name': name, 'isRest': isRest,
+                   'isGrace': noteDur == 0 and not isRest, 'lyric': lyric}
+            position += noteDur
+            measureLength = max(measureLength, position)
+
+
+
+@profiled('segments')
+def segmentRows(table, start, end):
+    '''
+    It returns the indexes of the rows of a note table for the notes and rests
+    whose offset is between the given start and end offsets, both included, in
+    the same way as the getElementsByOffset method of music21 streams. Since
+    the rows of a note table are sorted by offset, the segment is a contiguous
+    range of rows, found with a binary search.
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - start -- float or fractions.Fraction, starting offset of the segment
+    - end -- float or fractions.Fraction, ending offset of the segment
+
+    It returns a numpy array of ints.
+    '''
+
+    first, last = segmentRange(table, start, end)
+
+    return np.arange(first, last)
+
+
+
+@profiled('segments')
+def segmentRange(table, start, end):
+    '''
+    It returns the first row and the row after the last one of a note table
+    for the segment between the given start and end offsets, both included.
+    The rows of the segment can then be taken as a slice of the columns of the
+    note table.
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - start -- float or fractions.Fraction, starting offset of the segment
+    - end -- float or fractions.Fraction, ending offset of the segment
+
+    It returns a tuple with two ints.
+
+    For example:
+    >>> first, last = segmentRange(table, 0, 16)
+    >>> table['midi'][first:last]
+    '''
+
+    offsets = table['offset']
+    first = int(np.searchsorted(offsets, float(start), side='left'))
+    last = int(np.searchsorted(offsets, float(end), side='right'))
+
+    return first, last
+
+
+
+@profiled('segments')
+def selectRows(table, segments):
+    '''
+    It returns the indexes of the rows of a note table for all the notes and
+    rests included in the given segments, as computed by the segmentRows
+    function, in the order of the segments.
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - segments -- [[float or fractions.Fraction]], list of segments, each of
+          them given as a list with its starting and ending offsets
+
+    It returns a numpy array of ints.
+    '''
+
+    if len(segments) == 0:
+        return np.array([], dtype=int)
+
+    return np.concatenate([segmentRows(table, s[0], s[1]) for s in segments])
+
+
+
+###############################################################################
+## FUNCTIONS FOR LINE STATISTICS                                             ##
+###############################################################################
+
+# Variants of the melodic density stored in the line statistics
+densityVariants = ['notes', 'duration', 'notesNoGrace', 'durationNoGrace']
+
+
+
+@profiled('lineStatistics')
+def lineStatistics(linesData, previousStats=None):
+    '''
+    Given the path to the lines_data.csv file, that should be stored in the
+    same folder as the MusicXML scores of the Jingju Music Scores Collection,
+    it computes in one pass over the collection the raw counts of every line
+    needed by the main functions: pitch durations for the whole line and for
+    each of its judou, intervals, cadential notes and melodic density. The
+    results of the main functions for any combination of lines are then
+    obtained by summing the counts of the retrieved lines, passing the
+    returned dictionary to their lineStats parameter. The statistics can be
+    saved with the saveLineStatistics function and loaded again with the
+    loadLineStatistics function, so that the MusicXML scores are not needed.
+
+    Counts are computed with the default parameters of the main functions,
+    with and without grace notes. The intervals are counted for a
+    silence2ignore of 0.25 and without ignoring grace notes.
+
+    If the statistics of a previous version of the collection are given, the
+    counts of the scores whose MusicXML file and lines in lines_data.csv have
+    not changed are taken from them, and only the rest of the scores are
+    processed.
+
+    Parameters:
+    - linesData -- str, path to the lines_data.csv file
+    - previousStats -- dict, line statistics computed before, as returned by
+          this function or by loadLineStatistics. If None, all the scores are
+          processed
+
+    It returns a dictionary with the following key/value pairs, where R is the
+    number of lines in lines_data.csv:
+    - 'fingerprint': str -- fingerprint of the lines_data.csv file, as
+          returned by loadLineCatalogue
+    - 'scores': numpy array of str -- file names of the scores
+    - 'scoreFingerprints': numpy array of str -- SHA-1 hash of the MusicXML
+          file of each score
+    - 'groupFingerprints': numpy array of str -- fingerprint of the lines of
+          each score in lines_data.csv, as returned by loadLineCatalogue
+    - 'score', 'part', 'hd', 'sq', 'bs', 'ju': numpy arrays of ints -- the
+          same columns as in the line catalogue returned by loadLineCatalogue
+    - 'categories-hd', 'categories-sq', 'categories-bs', 'categories-ju':
+          numpy arrays of str -- the instances of each element, so that the
+          code of an instance is its index in the array
+    - 'noteCount': numpy array of ints -- number of notes of each line,
+          including grace notes
+    - 'judouNoteCount': numpy array of ints of shape (R, 3) -- number of notes
+          of each judou of the line
+    - 'ambitus': numpy array of ints of shape (R, 2) -- midi values of the
+          lowest and highest notes of each line, the first ones if repeated,
+          -1 if the line has no notes
+    - 'ambitusNames': numpy array of str of shape (R, 2) -- names of those
+          notes
+    - 'pitches': numpy array of str -- pitch names found in the collection
+    - 'pitchMidis': numpy array of ints -- midi values of those pitches
+    - 'pitchDurations', 'pitchDurationsNoGrace': numpy arrays of floats of
+          shape (R, pitches) -- aggregated duration of each pitch per line,
+          with and without grace notes
+    - 'pitchOrder', 'pitchOrderNoGrace': numpy arrays of ints of shape (R,
+          pitches) -- position of the first note of each pitch in the line,
+          -1 if the pitch is absent
+    - 'judouPitchDurations', 'judouPitchDurationsNoGrace', 'judouPitchOrder',
+          'judouPitchOrderNoGrace': the same as the previous four, with shape
+          (R, 3, pitches), for each judou of the line
+    - 'intervals': numpy array of str -- directed names of the intervals found
+          in the collection
+    - 'intervalNames': numpy array of str -- non directed names of those
+          intervals
+    - 'intervalCounts', 'intervalOrder': numpy arrays of ints of shape (R,
+          intervals) -- number of times each interval appears in the line, and
+          position of its first appearance, -1 if absent
+    - 'cadences', 'cadencesNoGrace': numpy arrays of str of shape (R, 3) --
+          cadential note of each judou of the line, '' if the judou is absent
+    - 'graceNotesOmitted': numpy array of ints of shape (R, 3) -- number of
+          grace notes ignored after the cadential note of each judou
+    - for each variant in densityVariants, 'densityValues-' + variant and
+          'densityLeading-' + variant: numpy arrays with the melodic density of
+          the syllables of all the lines, and the values of the notes before
+          the first syllable of each line, as returned by syllableValues from
+          the syllable tables computed by syllableTable; and
+          'densityIndex-' + variant and 'densityLeadingIndex-' + variant:
+          numpy arrays of ints of length R+1, such that the values of line r
+          go from index[r] to index[r+1]
+    '''
+
+    catalogue = loadLineCatalogue(linesData)
+
+    path = scoresFolder(linesData)
+
+    lineCount = len(catalogue['score'])
+
+    pitches = {}
+    pitchMidis = {}
+    intervalColumns = {}
+    undirectedNames = {}
+
+    # Counts of each line, to be gathered in arrays once the vocabulary of
+    # pitches and intervals is known
+    pitchCounts = {'': [], 'NoGrace': []}
+    judouCounts = {'': [], 'NoGrace': []}
+    intervalCounts = []
+    cadences = {'': np.full((lineCount, 3), '', dtype=object),
+                'NoGrace': np.full((lineCount, 3), '', dtype=object)}
+    graceNotesOmitted = np.zeros((lineCount, 3), dtype=int)
+    density = {v: [[], [], [0], [0]] for v in densityVariants}
+    noteCount = np.zeros(lineCount, dtype=int)
+    judouNoteCount = np.zeros((lineCount, 3), dtype=int)
+    ambitus = np.full((lineCount, 2), -1, dtype=int)
+    ambitusNames = np.full((lineCount, 2), '', dtype=object)
+
+    scoreFingerprints = np.array([fileFingerprint(path + s)
+                                  for s in catalogue['scores']], dtype=str)
+    groupFingerprints = np.array(catalogue['groupFingerprints'], dtype=str)
+
+    # Scores whose lines can be taken from the previous statistics, and the
+    # first line of each of them in those statistics
+    unchanged = unchangedScores(catalogue['scores'], scoreFingerprints,
+                                groupFingerprints, previousStats)
+    previousRows = {}
+    for s in unchanged:
+        previousRows[s] = np.nonzero(previousStats['score'] ==
+                                     unchanged[s])[0][0]
+
+    print('\nComputing line statistics...\nProcessing scores:')
+
+    for r in range(lineCount):
+        scoreIndex = catalogue['score'][r]
+        if r == 0 or catalogue['score'][r-1] != scoreIndex:
+            firstRow = r
+            if scoreIndex not in unchanged:
+                print('\tParsing ' + catalogue['scores'][scoreIndex])
+                tables = loadNoteTables(path + catalogue['scores'][scoreIndex])
+                successors = [successorIndex(t) for t in tables]
+                steps = [diatonicSteps(t) for t in tables]
+
+        if scoreIndex in unchanged:
+            # Take the counts of the line from the previous statistics
+            ro = previousRows[scoreIndex] + r - firstRow
+            for grace in ['', 'NoGrace']:
+                pitchCounts[grace].append(reuseCounts(
+                    previousStats['pitchDurations' + grace][ro],
+                    previousStats['pitchOrder' + grace][ro],
+                    previousStats['pitches'], pitches))
+                judouCounts[grace].append([reuseCounts(
+                    previousStats['judouPitchDurations' + grace][ro, jd],
+                    previousStats['judouPitchOrder' + grace][ro, jd],
+                    previousStats['pitches'], pitches) for jd in range(3)])
+                cadences[grace][r] = previousStats['cadences' + grace][ro]
+            intervalCounts.append(reuseCounts(
+                previousStats['intervalCounts'][ro],
+                previousStats['intervalOrder'][ro],
+                previousStats['intervals'], intervalColumns))
+            graceNotesOmitted[r] = previousStats['graceNotesOmitted'][ro]
+            noteCount[r] = previousStats['noteCount'][ro]
+            judouNoteCount[r] = previousStats['judouNoteCount'][ro]
+            ambitus[r] = previousStats['ambitus'][ro]
+            ambitusNames[r] = previousStats['ambitusNames'][ro]
+            for variant in densityVariants:
+                values = previousStats['densityValues-' + variant]
+                index = previousStats['densityIndex-' + variant]
+                density[variant][0] += values[index[ro]:index[ro+1]].tolist()
+                values = previousStats['densityLeading-' + variant]
+                index = previousStats['densityLeadingIndex-' + variant]
+                density[variant][1] += values[index[ro]:index[ro+1]].tolist()
+                density[variant][2].append(len(density[variant][0]))
+                density[variant][3].append(len(density[variant][1]))
+            continue
+
+        table = tables[catalogue['part'][r]]
+        segment = segmentRows(table, catalogue['start'][r],
+                              catalogue['end'][r])
+
+        # Number of notes and ambitus of the line
+        notes = segment[~table['isRest'][segment]]
+        noteCount[r] = len(notes)
+        if len(notes) > 0:
+            low = notes[np.argmin(table['midi'][notes])]
+            high = notes[np.argmax(table['midi'][notes])]
+            ambitus[r] = [table['midi'][low], table['midi'][high]]
+            ambitusNames[r] = [str(table['name'][low]),
+                               str(table['name'][high])]
+
+        # Pitches of the line and of each judou
+        for grace, countGraceNotes in [('', True), ('NoGrace', False)]:
+            names, midis, durations = segmentPitches(table, segment,
+                                                     countGraceNotes)
+            pitchCounts[grace].append(lineCounts(names, durations, pitches))
+            for i in range(len(names)):
+                pitchMidis[pitches[str(names[i])]] = int(midis[i])
+            judouCounts[grace].append([])
+            for jd in range(3):
+                if catalogue['judouStart'][r, jd] == None:
+                    judouCounts[grace][-1].append(lineCounts([], [],
+                                                             pitches))
+                    continue
+                judouSegment = segmentRows(table,
+                                           catalogue['judouStart'][r, jd],
+                                           catalogue['judouEnd'][r, jd])
+                names, midis, durations = segmentPitches(table,
+                                                         judouSegment,
+                                                         countGraceNotes)
+                judouCounts[grace][-1].append(lineCounts(names, durations,
+                                                         pitches))
+                if countGraceNotes:
+                    judouNoteCount[r, jd] = len(names)
+                for i in range(len(names)):
+                    pitchMidis[pitches[str(names[i])]] = int(midis[i])
+
+        # Cadential notes of each judou
+        judous = [[catalogue['judouStart'][r, jd],
+                   catalogue['judouEnd'][r, jd]]
+                  if catalogue['judouStart'][r, jd] != None else []
+                  for jd in range(3)]
+        (cadences[''][r], cadences['NoGrace'][r],
+         graceNotesOmitted[r]) = judouCadences(table, judous)
+
+        # Intervals of the line
+        part = catalogue['part'][r]
+        lineIntervals = []
+        if len(segment) == 0:
+            firsts = seconds = np.array([], dtype=int)
+        else:
+            firsts, seconds = segmentIntervalPairs(table, segment,
+                                                   successors=successors[part])
+        generics = steps[part][seconds] - steps[part][firsts]
+        semitones = table['midi'][seconds] - table['midi'][firsts]
+        for i in range(len(firsts)):
+            name, directedName = intervalName(int(generics[i]),
+                                              int(semitones[i]))[:2]
+            lineIntervals.append(directedName)
+            undirectedNames[directedName] = name
+        intervalCounts.append(lineCounts(lineIntervals,
+                                         np.ones(len(lineIntervals)),
+                                         intervalColumns))
+
+        # Melodic density of the line
+        lineDensity(density, table, segment)
+
+    print('Line statistics computed.')
+
+    if previousStats != None:
+        # Pitches and intervals only found in the reused lines
+        for i in range(len(previousStats['pitches'])):
+            p = str(previousStats['pitches'][i])
+            if p in pitches:
+                pitchMidis.setdefault(pitches[p],
+                                      int(previousStats['pitchMidis'][i]))
+        for i in range(len(previousStats['intervals'])):
+            undirectedNames.setdefault(str(previousStats['intervals'][i]),
+                                       str(previousStats['intervalNames'][i]))
+
+    pitchNames = list(pitches.keys())
+    intervalNames = list(intervalColumns.keys())
+
+    lineStats = {'fingerprint': catalogue['fingerprint'],
+                 'scores': np.array(catalogue['scores'], dtype=str),
+                 'scoreFingerprints': scoreFingerprints,
+                 'groupFingerprints': groupFingerprints,
+                 'noteCount': noteCount,
+                 'judouNoteCount': judouNoteCount,
+                 'ambitus': ambitus,
+                 'ambitusNames': ambitusNames.astype(str),
+                 'pitches': np.array(pitchNames, dtype=str),
+                 'pitchMidis': np.array([pitchMidis[i]
+                                         for i in range(len(pitchNames))],
+                                        dtype=int),
+                 'intervals': np.array(intervalNames, dtype=str),
+                 'intervalNames': np.array([undirectedNames[i]
+                                            for i in intervalNames],
+                                           dtype=str),
+                 'graceNotesOmitted': graceNotesOmitted}
+
+    for grace in ['', 'NoGrace']:
+        durations, order = countsMatrix(pitchCounts[grace],
+                                        len(pitchNames), float)
+        lineStats['pitchDurations' + grace] = durations
+        lineStats['pitchOrder' + grace] = order
+        durations = np.zeros((lineCount, 3, len(pitchNames)))
+        order = np.full((lineCount, 3, len(pitchNames)), -1, dtype=int)
+        for jd in range(3):
+            durations[:, jd], order[:, jd] = countsMatrix(
+                                               [c[jd] for c in
+                                                judouCounts[grace]],
+                                               len(pitchNames), float)
+        lineStats['judouPitchDurations' + grace] = durations
+        lineStats['judouPitchOrder' + grace] = order
+        lineStats['cadences' + grace] = cadences[grace].astype(str)
+
+    for element in ['score', 'part', 'hd', 'sq', 'bs', 'ju']:
+        lineStats[element] = catalogue[element]
+    for element in ['hd', 'sq', 'bs', 'ju']:
+        instances = catalogue['categories'][element]
+        lineStats['categories-' + element] = np.array(instances, dtype=str)
+
+    counts, order = countsMatrix(intervalCounts, len(intervalNames), int)
+    lineStats['intervalCounts'] = counts
+    lineStats['intervalOrder'] = order
+
+    lineStats.update(densityArrays(density))
+
+    return lineStats
+
+
+
+def lineDensity(density, table, segment):
+    '''
+    It computes the melodic density of the syllables of a line for each
+    variant in densityVariants, and appends it to the given lists. The
+    syllables are segmented once with and once without grace notes by the
+    syllableTable function, and both the number of notes and the duration of
+    each syllable are taken from the same syllable table.
+
+    Parameters:
+    - density -- dict, for each variant in densityVariants, a list with four
+          lists: the values of the syllables and of the leading notes of the
+          previous lines, and the index of the first value of each line in
+          each of them, starting with 0
+    - table -- dict, note table of the vocal part of the line, as returned by
+          the noteTable function
+    - segment -- numpy array of ints, indexes of the rows of the line, as
+          returned by the segmentRows function
+    '''
+
+    for grace, includeGraceNotes in [('', True), ('NoGrace', False)]:
+        syllables = syllableTable(table, segment, includeGraceNotes)
+        for notesOrDuration in ['notes', 'duration']:
+            variant = notesOrDuration + grace
+            leading, values = syllableValues(table, syllables,
+                                             notesOrDuration)
+            density[variant][0] += values
+            density[variant][1] += leading
+            density[variant][2].append(len(density[variant][0]))
+            density[variant][3].append(len(density[variant][1]))
+
+
+
+def densityArrays(density):
+    '''
+    It converts the lists of melodic density filled by the lineDensity
+    function into numpy arrays, and returns them in a dictionary with the
+    'densityValues-', 'densityLeading-', 'densityIndex-' and
+    'densityLeadingIndex-' keys of the line statistics returned by the
+    lineStatistics function for each variant in densityVariants.
+    '''
+
+    arrays = {}
+
+    for variant in densityVariants:
+        if 'notes' in variant:
+            dtype = int
+        else:
+            dtype = float
+        arrays['densityValues-' + variant] = np.array(density[variant][0],
+                                                      dtype=dtype)
+        arrays['densityLeading-' + variant] = np.array(density[variant][1],
+                                                       dtype=dtype)
+        arrays['densityIndex-' + variant] = np.array(density[variant][2],
+                                                     dtype=int)
+        arrays['densityLeadingIndex-' + variant] = np.array(
+                                                      density[variant][3],
+                                                      dtype=int)
+
+    return arrays
+
+
+
+def judouCadences(table, judous):
+    '''
+    It finds the cadential note of each judou of a line, with and without
+    grace notes.
+
+    Parameters:
+    - table -- dict, note table of the vocal part of the line, as returned by
+          the noteTable function
+    - judous -- list, the starting and ending offsets of the three judou of
+          the line, in the format returned by collectLineJudouMaterial: a list
+          with two floats or fractions.Fraction per judou, or an empty list
+          if the line has not that judou
+
+    It returns three lists with a value for each of the three judou: the name
+    of the cadential note including grace notes, the name of the cadential
+    note ignoring grace notes, both '' if the judou is absent, and the number
+    of grace notes ignored after the latter.
+    '''
+
+    cadences = ['', '', '']
+    cadencesNoGrace = ['', '', '']
+    omittedNotes = [0, 0, 0]
+
+    for jd in range(3):
+        if len(judous[jd]) == 0: continue
+        segment = segmentRows(table, judous[jd][0], judous[jd][1])
+        if len(segment) == 0: continue
+        lastNote, omitted = segmentCadence(table, segment, True)
+        cadences[jd] = str(table['name'][lastNote])
+        lastNote, omitted = segmentCadence(table, segment, False)
+        cadencesNoGrace[jd] = str(table['name'][lastNote])
+        omittedNotes[jd] = omitted
+
+    return cadences, cadencesNoGrace, omittedNotes
+
+
+
+def lineCadences(scorePath, part, judous):
+    '''
+    It returns the cadential notes of each judou of a line, as computed by the
+    judouCadences function. They are kept in the entry of the score in the
+    score store, so that they are computed only once while the score is in
+    memory, for instance when the cadentialNotes function counts the same
+    lines for several line types, and they are computed again if the score
+    changes.
+
+    Parameters:
+    - scorePath -- str, path to the MusicXML file of the score
+    - part -- int, index of the vocal part of the line, starting from 0
+    - judous -- list, the starting and ending offsets of the three judou of
+          the line, in the format returned by collectLineJudouMaterial
+    '''
+
+    entry = scoreStoreEntry(scorePath)[0]
+    key = ('cadences', part, tuple([tuple(j) for j in judous]))
+
+    if key not in entry['lines']:
+        table = loadNoteTables(scorePath)[part]
+        entry['lines'][key] = judouCadences(table, judous)
+
+    return entry['lines'][key]
+
+
+
+def lineSyllables(scorePath, part, start, end, includeGraceNotes=True):
+    '''
+    It returns the syllable table of a line, as computed by the syllableTable
+    function. It is kept in the entry of the score in the score store, so
+    that the syllables of each line are segmented only once while the score
+    is in memory, for instance when the melodic density is computed both as
+    number of notes and as duration, and they are segmented again if the
+    score changes.
+
+    Parameters:
+    - scorePath -- str, path to the MusicXML file of the score
+    - part -- int, index of the vocal part of the line, starting from 0
+    - start -- float or fractions.Fraction, starting offset of the line
+    - end -- float or fractions.Fraction, ending offset of the line
+    - includeGraceNotes -- bool, if True, grace notes are counted. If False,
+          grace notes are ignored
+    '''
+
+    entry = scoreStoreEntry(scorePath)[0]
+    key = ('syllables', part, start, end, includeGraceNotes)
+
+    if key not in entry['lines']:
+        table = loadNoteTables(scorePath)[part]
+        segment = segmentRows(table, start, end)
+        entry['lines'][key] = syllableTable(table, segment, includeGraceNotes)
+
+    return entry['lines'][key]
+
+
+
+@profiled('counting')
+def lineCounts(keys, values, vocabulary):
+    '''
+    It aggregates the given values per key, as the counts of one line for the
+    lineStatistics function. Keys not found in the vocabulary are added to it.
+
+    Parameters:
+    - keys -- list or numpy array of str, pitch or interval names
+    - values -- list or numpy array of floats, value of each key
+    - vocabulary -- dict, the column index of each known key
+
+    It returns three numpy arrays with the column index of each different key,
+    its aggregated value, and the position of its first appearance.
+    '''
+
+    if len(keys) == 0:
+        return (np.array([], dtype=int), np.array([], dtype=float),
+                np.array([], dtype=int))
+
+    uniqueKeys, firstIndex, codes = np.unique(np.array(keys, dtype=str),
+                                              return_index=True,
+                                              return_inverse=True)
+    sums = np.bincount(codes.ravel(), weights=values,
+                       minlength=len(uniqueKeys))
+    columns = np.array([vocabulary.setdefault(str(k), len(vocabulary))
+                        for k in uniqueKeys], dtype=int)
+
+    return columns, sums, firstIndex
+
+
+
+def reuseCounts(values, order, names, vocabulary):
+    '''
+    It takes the counts of one line from previous line statistics, in the same
+    format as returned by the lineCounts function. Keys not found in the
+    vocabulary are added to it.
+
+    Parameters:
+    - values -- numpy array, the counts of the line in the previous statistics
+    - order -- numpy array of ints, the position of the first appearance of
+          each column in the line, -1 for the absent ones
+    - names -- numpy array of str, the key of each column in the previous
+          statistics
+    - vocabulary -- dict, the column index of each known key
+
+    It returns three numpy arrays with the column index of each key found in
+    the line, its aggregated value, and the position of its first appearance.
+    '''
+
+    found = np.nonzero(order >= 0)[0]
+    columns = np.array([vocabulary.setdefault(str(names[c]), len(vocabulary))
+                        for c in found], dtype=int)
+
+    return columns, values[found], order[found]
+
+
+
+def countsMatrix(counts, columns, dtype):
+    '''
+    It gathers the counts of each line, as returned by the lineCounts
+    function, in two matrices of one row per line and the given number of
+    columns.
+
+    It returns a numpy array of the given dtype with the aggregated values,
+    and a numpy array of ints with the position of the first appearance of
+    each column, -1 for the absent ones.
+    '''
+
+    values = np.zeros((len(counts), columns), dtype=dtype)
+    order = np.full((len(counts), columns), -1, dtype=int)
+
+    for r in range(len(counts)):
+        values[r, counts[r][0]] = counts[r][1]
+        order[r, counts[r][0]] = counts[r][2]
+
+    return values, order
+
+
+
+def fileFingerprint(filename):
+    '''
+    It returns the SHA-1 hash of the content of the given file, as a str.
+    '''
+
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+
+def unchangedScores(scores, scoreFingerprints, groupFingerprints,
+                    previousStats):
+    '''
+    It finds the scores whose MusicXML file and lines in lines_data.csv are
+    the same as in the given line statistics.
+
+    Parameters:
+    - scores -- [str], file names of the scores
+    - scoreFingerprints -- [str], SHA-1 hash of the MusicXML file of each
+          score
+    - groupFingerprints -- [str], fingerprint of the lines of each score, as
+          returned by loadLineCatalogue
+    - previousStats -- dict, line statistics as returned by the
+          lineStatistics function, or None
+
+    It returns a dictionary with the index of each unchanged score as key, and
+    its index in the previous statistics as value.
+    '''
+
+    if previousStats == None:
+        return {}
+
+    previous = {}
+    for i in range(len(previousStats['scores'])):
+        previous[(str(previousStats['scores'][i]),
+                  str(previousStats['scoreFingerprints'][i]),
+                  str(previousStats['groupFingerprints'][i]))] = i
+
+    unchanged = {}
+    for i in range(len(scores)):
+        key = (str(scores[i]), str(scoreFingerprints[i]),
+               str(groupFingerprints[i]))
+        if key in previous:
+            unchanged[i] = previous[key]
+
+    return unchanged
+
+
+
+def changedCombinations(lineStats, previousStats):
+    '''
+    It returns the combinations of role type, shengqiang, banshi and line type
+    of the lines of the scores that are new, removed or changed between the
+    previous and the current line statistics. The results of the main
+    functions for any other combination are not affected by the changes.
+
+    Parameters:
+    - lineStats -- dict, current line statistics, as returned by the
+          lineStatistics function
+    - previousStats -- dict, previous line statistics
+
+    It returns a set of tuples of four str.
+    '''
+
+    unchanged = unchangedScores(lineStats['scores'],
+                                lineStats['scoreFingerprints'],
+                                lineStats['groupFingerprints'], previousStats)
+
+    combinations = set()
+
+    for stats, kept in [(lineStats, set(unchanged.keys())),
+                        (previousStats, set(unchanged.values()))]:
+        for r in range(len(stats['score'])):
+            if stats['score'][r] in kept: continue
+            combinations.add(tuple([str(stats['categories-' + e][stats[e][r]])
+                                    for e in ['hd', 'sq', 'bs', 'ju']]))
+
+    return combinations
+
+
+
+def statisticsRows(lineStats, searchInfo, linesData=None):
+    '''
+    It returns the indexes of the lines in the given line statistics that
+    meet the instances of each element found by the collectLineMaterial or
+    the collectLineJudouMaterial functions, in the order of the lines_data.csv
+    file, which is also the order of the material returned by those functions.
+    The lines are retrieved from the line statistics themselves, so that the
+    lines_data.csv file is not needed.
+
+    Parameters:
+    - lineStats -- dict, as returned by the lineStatistics function
+    - searchInfo -- dict, first element of the material returned by the
+          collectLineMaterial or the collectLineJudouMaterial functions
+    - linesData -- str, path to the lines_data.csv file. If given, it is
+          checked that the line statistics were computed for its current
+          content
+
+    It returns a numpy array of ints.
+    '''
+
+    if linesData != None:
+        if (lineStats['fingerprint'] !=
+            loadLineCatalogue(linesData)['fingerprint']):
+            raise ValueError('The line statistics were not computed for the '\
+                             'current content of ' + linesData)
+
+    found = np.ones(len(lineStats['score']), dtype=bool)
+
+    for element in ['hd', 'sq', 'bs', 'ju']:
+        instances = lineStats['categories-' + element].tolist()
+        selected = np.zeros(len(instances), dtype=bool)
+        for i in searchInfo[element]:
+            if i in instances:
+                selected[instances.index(i)] = True
+        found &= selected[lineStats[element]]
+
+    return np.nonzero(found)[0]
+
+
+
+def saveLineStatistics(lineStats, filename):
+    '''
+    It saves the given line statistics in a NumPy .npz file, that can be
+    loaded with the loadLineStatistics function.
+
+    Parameters:
+    - lineStats -- dict, as returned by the lineStatistics function
+    - filename -- str, path to the .npz file
+    '''
+
+    tempFile = filename + '.' + str(os.getpid())
+    with open(tempFile, 'wb') as f:
+        np.savez(f, **lineStats)
+    os.replace(tempFile, filename)
+
+
+
+def loadLineStatistics(filename):
+    '''
+    It loads the line statistics saved by the saveLineStatistics function.
+
+    Parameter:
+    - filename -- str, path to the .npz file
+
+    It returns a dictionary as the one returned by the lineStatistics
+    function.
+    '''
+
+    lineStats = {}
+
+    with np.load(filename) as savedStats:
+        for k in savedStats.files:
+            lineStats[k] = savedStats[k]
+
+    lineStats['fingerprint'] = str(lineStats['fingerprint'])
+
+    return lineStats
+
+
+
+@profiled('counting')
+def sumLineStatistics(values, order, rows):
+    '''
+    It sums the counts of the given lines for each column of the line
+    statistics, keeping only the columns found in those lines.
+
+    Parameters:
+    - values -- numpy array, counts per line, as 'pitchDurations' or
+          'intervalCounts' in the dictionary returned by lineStatistics
+    - order -- numpy array of ints, the position of the first appearance of
+          each column per line, as 'pitchOrder' or 'intervalOrder'
+    - rows -- numpy array of ints, indexes of the lines to sum
+
+    It returns a numpy array of ints with the indexes of the found columns, in
+    the order in which they first appear in the given lines, and a numpy
+    array with their sums.
+    '''
+
+    values = values[rows]
+    order = order[rows]
+
+    found = order >= 0
+    columns = np.nonzero(found.any(axis=0))[0]
+    firstRow = found[:, columns].argmax(axis=0)
+    firstPosition = order[firstRow, columns]
+    columns = columns[np.lexsort((firstPosition, firstRow))]
+
+    return columns, values[:, columns].sum(axis=0)
+
+
+
 ###############################################################################
 ## MAIN FUNCTIONS                                                            ##
 ###############################################################################
@@ -367,7 +1469,8 @@ def pitchHistogram(linesData,
                    xticks_fontsize=20,
                    yticks_fontsize=18,
                    xLabel_fontsize=26,
-                   yLabel_fontsize=26):
+                   yLabel_fontsize=26,
+                   lineStats=None):
     '''
     Given the path to the lines_data.csv file, that should be stored in the
     same folder as the MusicXML scores of the Jingju Music Scores Collection,
@@ -403,6 +1506,9 @@ def pitchHistogram(linesData,
     - yticks_fontsize -- int, size of the font for the y axis' ticks
     - xLabel_fontsize -- int, size of the font for the x axis' label
     - yLabel_fontsize -- int, size of the font for the y axis' label
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, the histogram is computed from them instead of
+          processing the scores
 
     It returns an ordered list containing a list for each of the pitches
     computed in the histogram, containing a string for the pitch name and a
@@ -442,60 +1548,56 @@ def pitchHistogram(linesData,
     material = collectLineMaterial(linesData, hangdang=hd, shengqiang=sq,
                                    banshi=bs, judou=ju)
 
-    print('\nComputing pitch histogram...\nProcessing scores:')
-
-    pitchCount = {}
-
-    for score in material[1:]:
-        # Loading the score to get the parts list
-        scorePath = score[0]
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print('\tParsing ' + scoreName)
-        parts = findVoiceParts(loadedScore)
-        # Work with each part
-        for partIndex in range(1, len(score)):
-            if len(score[partIndex]) == 0: continue # Skip part if it's empty
-            # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notes.stream()
+    noteNames = []
+    noteMidis = []
+    noteDurations = []
 
-            # Set the duration of grace notes if needed
-            if countGraceNotes:
-                minDur = 0.25
-                for n in notes:
-                    noteDur = n.quarterLength
-                    if noteDur!=0 and noteDur<minDur:
-                        minDur = noteDur
+    if lineStats != None:
+        print('\nComputing pitch histogram from line statistics...')
+        if countGraceNotes:
+            grace = ''
+        else:
+            grace = 'NoGrace'
+        rows = statisticsRows(lineStats, material[0], linesData)
+        columns, durations = sumLineStatistics(
+                                 lineStats['pitchDurations' + grace],
+                                 lineStats['pitchOrder' + grace], rows)
+        noteNames.append(lineStats['pitches'][columns])
+        noteMidis.append(lineStats['pitchMidis'][columns])
+        noteDurations.append(durations)
+    else:
+        print('\nComputing pitch histogram...\nProcessing scores:')
+
+        for score in material[1:]:
+            # Loading the score to get the parts list
+            scorePath = score[0]
+            scoreName = scorePath.split('/')[-1]
+            tables = loadNoteTables(scorePath)
+            print('\tParsing ' + scoreName)
+            # Work with each part
+            for partIndex in range(1, len(score)):
+                # Skip part if it's empty
+                if len(score[partIndex]) == 0: continue
+                # Get the note table of the current part
+                table = tables[partIndex-1]
+                # Collect the notes of all the segments of the current part
+                rows = selectRows(table, score[partIndex])
+                names, midis, durations = segmentPitches(table, rows,
+                                                         countGraceNotes)
+                noteNames.append(names)
+                noteMidis.append(midis)
+                noteDurations.append(durations)
 
-            # Find segments to analyze in the current part
-            for startEnd in score[partIndex]:
-                start = startEnd[0]
-                end = startEnd[1]
-                segment = notes.getElementsByOffset(start, end)
-                # Count pitches in the current segment
-                for n in segment:
-                    noteName = n.nameWithOctave
-                    noteDur = n.quarterLength
-                    if noteDur == 0:
-                        if not countGraceNotes: continue
-                        noteDur = minDur
-                    pitchCount[noteName] = pitchCount.get(noteName, 0)+noteDur
+    # Sorting duration per pitch class frequency
+    xLabels, xPositions, yValues = countPitches(noteNames, noteMidis,
+                                                noteDurations)
 
     print('Histogram computed.')
 
-    # Sorting duration per pitch class frequency
-    pitches = pitchCount.keys()
-    toSort = {p:pitch.Pitch(p).midi for p in pitches}
-    sortedPitches = sorted(toSort.items(), key=lambda x: x[1])
-    xPositions = np.array([p[1] for p in sortedPitches])
-    xLabels = [p[0] for p in sortedPitches]
-    yValues = np.array([pitchCount[l] for l in xLabels])
-
     # Setting the parameters for plotting
     yValues, limX, yLabel, col, h = plottingParameters(material,count,yValues)
 
-    if filename != None:
+    if filename != None and renderPlots:
         # Start plotting
         print('\nPlotting...')
 
@@ -538,7 +1640,8 @@ def pitchHistogramLineJudou(linesData,
                             xticks_fontsize=15,
                             yticks_fontsize=15,
                             xLabel_fontsize=26,
-                            yLabel_fontsize=26):
+                            yLabel_fontsize=26,
+                            lineStats=None):
 
     '''
     Given the path to the lines_data.csv file, that should be stored in the
@@ -575,6 +1678,9 @@ def pitchHistogramLineJudou(linesData,
     - yticks_fontsize -- int, size of the font for the y axis' ticks
     - xLabel_fontsize -- int, size of the font for the x axis' label
     - yLabel_fontsize -- int, size of the font for the y axis' label
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, the histograms are computed from them instead
+          of processing the scores
 
     It returns a list containing an ordered list for each the three line
     sections. Each of these three lists contains a list for each of all the
@@ -640,70 +1746,70 @@ def pitchHistogramLineJudou(linesData,
     material = collectLineJudouMaterial(linesData, hangdang=hd, shengqiang=sq,
                                         banshi=bs, judou=ju)
 
-    print('\nComputing pitch histograms...\nProcessing scores:')
-
-    j1p = {}    # pitch count for judou 1
-    j2p = {}    # pitch count for judou 2
-    j3p = {}    # pitch count for judou 3
-
-    for score in material[1:]:
-        # Loading the score to get the parts list
-        scorePath = score[0]
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print('\tParsing ' + scoreName)
-        parts = findVoiceParts(loadedScore)
-        # Work with each part
-        for partIndex in range(1, len(score)):
-            if len(score[partIndex]) == 0: continue # Skip part if it's empty
-            # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notes.stream()
+    # Names, midi values and durations of the notes for each judou
+    judouNotes = [[[], [], []] for j in range(3)]
 
-            # Set the duration of grace notes if needed
-            if countGraceNotes:
-                minDur = 0.25
-                for n in notes:
-                    noteDur = n.quarterLength
-                    if noteDur!=0 and noteDur<minDur:
-                        minDur = noteDur
-
-            # Find segments to analyze in the current part
-            for line in score[partIndex]:
-                for judou in range(len(line)):
-                    if len(line[judou]) == 0: continue
-                    start = line[judou][0]
-                    end = line[judou][1]
-                    segment = notes.getElementsByOffset(start, end)
-                    # Count pitches in the current segment
-                    for n in segment:
-                        noteName = n.nameWithOctave
-                        noteDur = n.quarterLength
-                        if noteDur == 0:
-                            if not countGraceNotes: continue
-                            noteDur = minDur
-                        if judou == 0:
-                            j1p[noteName] = j1p.get(noteName, 0) + noteDur
-                        elif judou == 1:
-                            j2p[noteName] = j2p.get(noteName, 0) + noteDur
-                        elif judou == 2:
-                            j3p[noteName] = j3p.get(noteName, 0) + noteDur
-                        else:
-                            print('There is a problem with the number of '\
-                                  'judou in this line')
-                            break
+    if lineStats != None:
+        print('\nComputing pitch histograms from line statistics...')
+        if countGraceNotes:
+            grace = ''
+        else:
+            grace = 'NoGrace'
+        rows = statisticsRows(lineStats, material[0], linesData)
+        for judou in range(3):
+            columns, durations = sumLineStatistics(
+                          lineStats['judouPitchDurations' + grace][:, judou],
+                          lineStats['judouPitchOrder' + grace][:, judou], rows)
+            judouNotes[judou][0].append(lineStats['pitches'][columns])
+            judouNotes[judou][1].append(lineStats['pitchMidis'][columns])
+            judouNotes[judou][2].append(durations)
+    else:
+        print('\nComputing pitch histograms...\nProcessing scores:')
+
+        for score in material[1:]:
+            # Loading the score to get the parts list
+            scorePath = score[0]
+            scoreName = scorePath.split('/')[-1]
+            tables = loadNoteTables(scorePath)
+            print('\tParsing ' + scoreName)
+            # Work with each part
+            for partIndex in range(1, len(score)):
+                # Skip part if it's empty
+                if len(score[partIndex]) == 0: continue
+                # Get the note table of the current part
+                table = tables[partIndex-1]
+
+                # Find segments to analyze in the current part
+                for line in score[partIndex]:
+                    if len(line) > 3:
+                        print('There is a problem with the number of judou '\
+                              'in this line')
+                    for judou in range(min(len(line), 3)):
+                        if len(line[judou]) == 0: continue
+                        start = line[judou][0]
+                        end = line[judou][1]
+                        segment = segmentRows(table, start, end)
+                        # Collect the pitches in the current segment
+                        pitches = segmentPitches(table, segment,
+                                                 countGraceNotes)
+                        for k in range(3):
+                            judouNotes[judou][k].append(pitches[k])
+
+    jps = []
+    for jn in judouNotes:
+        # Pitch count for each judou
+        names, midis, durations = countPitches(jn[0], jn[1], jn[2])
+        jps.append(dict(zip(names, durations)))
 
     print('Histograms computed.')
 
-    jps = [j1p, j2p, j3p]
-
     jps_plotting = []
     pre_yLab_general = []
 
     for jp in jps:
         # Sorting duration per pitch class frequency
         pitches = jp.keys()
-        toSort = {p:pitch.Pitch(p).midi for p in pitches}
+        toSort = {p:pitchInfo(p)[0] for p in pitches}
         for pk in toSort.keys():
             if pk not in pre_yLab_general:
                 pre_yLab_general.append(pk)
@@ -722,12 +1828,12 @@ def pitchHistogramLineJudou(linesData,
                             'h': h})
 
     # Y axis labels for the three histograms
-    toSort = {p:pitch.Pitch(p).midi for p in pre_yLab_general}
+    toSort = {p:pitchInfo(p)[0] for p in pre_yLab_general}
     sortedPitches = sorted(toSort.items(), key=lambda x: x[1])
     yPos_general = np.array([p[1] for p in sortedPitches])
     yLab_general = [p[0] for p in sortedPitches]
 
-    if filename != None:
+    if filename != None and renderPlots:
         # Start plotting
         print('\nPlotting...')
 
@@ -745,40 +1851,16 @@ def pitchHistogramLineJudou(linesData,
 
         ticksX = np.round(np.arange(limX[0], limX[1], limX[1]/5), 1)
 
-        width = 0.8
-
-        plt.figure()
-
-        for i in range(len(jps_plotting)):
-            jp = jps_plotting[i]
-            plt.subplot(131+i)
-            plt.barh(jp['yPositions'], jp['xValues'], width, linewidth=0,
-                     zorder=1, color = jp['col'], hatch = jp['h'])
-            plt.axhline(y=64+width/2, color='red', zorder=0) # Tonic line
-            plt.axhline(y=76+width/2, color='red', ls='--', zorder=0) # 8ve
-            plt.axhline(y=59+width/2, color='gray', ls=':', zorder=0) # Fifth
-            plt.axhline(y=71+width/2, color='gray', ls=':', zorder=0) # Fifth
-            plt.axhline(y=83+width/2, color='gray', ls=':', zorder=0) # Fifth
-            for xValue in jp['xValues']:
-                plt.axvline(x=xValue, color='gray', ls=':', zorder=0)
-            if i == 0:
-                plt.yticks(yPos_general + width/2, yLab_general,
-                           fontsize=yticks_fontsize)
-                plt.ylabel('Pitch', fontsize=yLabel_fontsize)
-            else:
-                plt.yticks([])
-            if i == 1:
-                plt.xlabel(xLabel, fontsize=xLabel_fontsize)
-            plt.ylim(jp['limY'][0], jp['limY'][1])
-            plt.xticks(ticksX, ticksX, rotation=90, fontsize=xticks_fontsize)
-            plt.xlim(limX[0], limX[1])
-
-        plt.tight_layout()
-        if title != None:
-            plt.suptitle(title, fontsize=title_fontsize)
-            plt.subplots_adjust(top=1-title_fontsize/300)
-        plt.savefig(filename)
-        print('"' + filename + '" plotted and saved.')
+        submitRender({'plotType': 'phlj', 'filename': filename,
+                      'judous': jps_plotting, 'limX': limX,
+                      'ticksX': ticksX, 'width': 0.8,
+                      'yPositions': yPos_general, 'yLabels': yLab_general,
+                      'xLabel': xLabel, 'title': title,
+                      'title_fontsize': title_fontsize,
+                      'xticks_fontsize': xticks_fontsize,
+                      'yticks_fontsize': yticks_fontsize,
+                      'xLabel_fontsize': xLabel_fontsize,
+                      'yLabel_fontsize': yLabel_fontsize})
 
     # List to return
     results = []
@@ -792,6 +1874,8 @@ def pitchHistogramLineJudou(linesData,
         results.append(d)
 
     if not len(results[0]) == len(results[1]) == len(results[2]):
+        if batchMode:
+            raise RuntimeError('There was a problem saving the results')
         print('ERROR: There was a problem saving the results. The program '\
               'will exit')
         exit()
@@ -817,7 +1901,8 @@ def intervalHistogram(linesData,
                       xticks_fontsize=20,
                       yticks_fontsize=18,
                       xLabel_fontsize=26,
-                      yLabel_fontsize=26):
+                      yLabel_fontsize=26,
+                      lineStats=None):
 
     '''
     Given the path to the lines_data.csv file, that should be stored in the
@@ -855,6 +1940,10 @@ def intervalHistogram(linesData,
     - yticks_fontsize -- int, size of the font for the y axis' ticks
     - xLabel_fontsize -- int, size of the font for the x axis' label
     - yLabel_fontsize -- int, size of the font for the y axis' label
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, and silence2ignore and ignoreGraceNotes have
+          their default values, the histogram is computed from them instead
+          of processing the scores
 
     It returns an ordered list containing a list for each of the invervals
     computed in the histogram, containing a string for the interval name and a
@@ -898,68 +1987,80 @@ def intervalHistogram(linesData,
     material = collectLineMaterial(linesData, hangdang=hd, shengqiang=sq,
                                    banshi=bs, judou=ju)
 
-    print('\nComputing interval histogram...\nProcessing scores:')
-
     intervalCount = {}
 
-    for score in material[1:]:
-        # Loading the score to get the parts list
-        scorePath = score[0]
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print('\tParsing ' + scoreName)
-        parts = findVoiceParts(loadedScore)
-        # Work with each part
-        for partIndex in range(1, len(score)):
-            if len(score[partIndex]) == 0: continue # Skip part if it's empty
-            # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notesAndRests.stream()
-            # Find segments to analyze in the current part
-            for startEnd in score[partIndex]:
-                start = startEnd[0]
-                end = startEnd[1]
-                segment = notes.getElementsByOffset(start, end)
-                # Count intervals in the current segment
-                # Find the last note that is not a grace note
-                i = 1
-                lastn = segment[-i]
-                while lastn.quarterLength == 0:
-                    i += 1
-                    lastn = segment[-i]
-
-                for j in range(len(segment)-i):
-                    n1 = segment[j]
-                    if n1.isRest: continue
-                    if ignoreGraceNotes:
-                        if n1.quarterLength == 0: continue
-                    k = 1
-                    while True:
-                        n2 = segment[j+k]
-                        if n2.isRest:
-                            if n2.quarterLength <= silence2ignore:
-                                k += 1
-                            else:
-                                n2 = None
-                                break
-                        elif (n2.quarterLength==0)and(ignoreGraceNotes==True):
-                            j += 1
-                        else:
-                            break
-                    if n2==None: continue
-                    intvl = interval.Interval(n1, n2)
-                    if directedInterval:
-                        intvlName = intvl.directedName
-                    else:
-                        intvlName = intvl.name
-                    intervalCount[intvlName] = (intervalCount.get(intvlName, 0)
-                                                + 1)
+    if (lineStats != None and silence2ignore == 0.25 and
+        not ignoreGraceNotes):
+        print('\nComputing interval histogram from line statistics...')
+        if directedInterval:
+            statsNames = lineStats['intervals']
+        else:
+            statsNames = lineStats['intervalNames']
+        rows = statisticsRows(lineStats, material[0], linesData)
+        columns, counts = sumLineStatistics(lineStats['intervalCounts'],
+                                            lineStats['intervalOrder'], rows)
+        for c in range(len(columns)):
+            intvlName = str(statsNames[columns[c]])
+            intervalCount[intvlName] = (intervalCount.get(intvlName, 0) +
+                                        int(counts[c]))
+    else:
+        print('\nComputing interval histogram...\nProcessing scores:')
+
+        # Diatonic steps and semitones of every interval
+        generics = [np.array([], dtype=int)]
+        semitones = [np.array([], dtype=int)]
+
+        for score in material[1:]:
+            # Loading the score to get the parts list
+            scorePath = score[0]
+            scoreName = scorePath.split('/')[-1]
+            tables = loadNoteTables(scorePath)
+            print('\tParsing ' + scoreName)
+            # Work with each part
+            for partIndex in range(1, len(score)):
+                # Skip part if it's empty
+                if len(score[partIndex]) == 0: continue
+                # Get the note table of the current part
+                table = tables[partIndex-1]
+                successors = successorIndex(table, silence2ignore,
+                                            ignoreGraceNotes)
+                steps = diatonicSteps(table)
+                # Find segments to analyze in the current part
+                for startEnd in score[partIndex]:
+                    start = startEnd[0]
+                    end = startEnd[1]
+                    segment = segmentRows(table, start, end)
+                    # Intervals in the current segment
+                    firsts, seconds = segmentIntervalPairs(table, segment,
+                                                           silence2ignore,
+                                                           ignoreGraceNotes,
+                                                           successors)
+                    generics.append(steps[seconds] - steps[firsts])
+                    semitones.append(table['midi'][seconds] -
+                                     table['midi'][firsts])
+
+        # Count each interval, in the order in which they first appear. Each
+        # pair of diatonic steps and semitones is encoded in a single int,
+        # since semitones are always between -128 and 127
+        keys, firstIndex, counts = np.unique(
+                                       np.concatenate(generics) * 256 +
+                                       np.concatenate(semitones) + 128,
+                                       return_index=True, return_counts=True)
+        for k in np.argsort(firstIndex):
+            intvl = intervalName(int(keys[k] // 256),
+                                 int(keys[k] % 256 - 128))
+            if directedInterval:
+                intvlName = intvl[1]
+            else:
+                intvlName = intvl[0]
+            intervalCount[intvlName] = (intervalCount.get(intvlName, 0) +
+                                        int(counts[k]))
 
     print('Histogram computed.')
 
     # Sorting intervals per size
     intvlNames = intervalCount.keys()
-    toSort = {i:interval.Interval(i).semitones for i in intvlNames}
+    toSort = {i:nameSemitones(i) for i in intvlNames}
     sortedIntvl = sorted(toSort.items(), key=lambda x: x[1])
     xPositions = np.array([i[1] for i in sortedIntvl])
     # Check if there repeated positions
@@ -973,7 +2074,7 @@ def intervalHistogram(linesData,
     ## Setting the parameters for plotting
     yValues, limX, yLabel, col, h = plottingParameters(material,count,yValues)
 
-    if filename != None:
+    if filename != None and renderPlots:
         # Start plotting
         print('\nPlotting...')
 
@@ -1017,7 +2118,8 @@ def cadentialNotes(linesData,
                    xticks_fontsize=20,
                    yticks_fontsize=18,
                    legend_fontsize=20,
-                   adjust_right_margin=0.77):
+                   adjust_right_margin=0.77,
+                   lineStats=None):
     '''
     Given the path to the lines_data.csv file, that should be stored in the
     same folder as the MusicXML scores of the Jingju Music Scores Collection,
@@ -1045,6 +2147,9 @@ def cadentialNotes(linesData,
     - legend_fontsize -- int, size of the font for the labels in the legend
     - adjust_right_margin -- float, distance to the right margin of each line
           type's box, in percentage normalize to one.
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, the cadential notes are counted from them
+          instead of processing the scores
 
     It returns a dictionary with the following structure:
     - keys: str, line type, including 'Op. line' for opening line and 'Cl.
@@ -1131,12 +2236,6 @@ def cadentialNotes(linesData,
     xLabels = ['S1', 'S2', 'S3']
     pos = np.arange(len(xLabels))
 
-    colors = {'G#3':['#F4D03F','x'],'B3':['#76D7C4','x'],'C#4':['#2E86C1','x'],
-              'C##4':['#5B2C6F','x'],'D#4':['#BB8FCE','x'],'E4':['#E74C3C',''],
-              'F#4':['#F39C12',''], 'G#4':['#F4D03F',''], 'A4':['#2ECC71',''],
-              'A#4':['#117864',''], 'B4':['#76D7C4',''], 'C#5':['#2E86C1',''],
-              'D#5':['#BB8FCE',''],'E5':['#E74C3C','O'],'F#5':['#F39C12','O']}
-
     legendCode = {}
 
     pre_result = {}
@@ -1154,8 +2253,14 @@ def cadentialNotes(linesData,
         nice_names = ['opening lines (type 1)', 'opening lines (type 2)',
                       'closing lines']
 
-    y = True
-    plt.figure()
+    spec = {'plotType': 'cn', 'filename': filename, 'judous': [],
+            'xLabels': xLabels, 'width': width,
+            'title_fontsize': title_fontsize,
+            'xticks_fontsize': xticks_fontsize,
+            'yticks_fontsize': yticks_fontsize,
+            'legend_fontsize': legend_fontsize,
+            'adjust_right_margin': adjust_right_margin}
+
     for i in range(len(judous)):
         print('\nCounting cadential notes for ' + nice_names[i] + '...')
         lt = titles[i] # lt: line type
@@ -1164,7 +2269,8 @@ def cadentialNotes(linesData,
         sortedNoteNames, sortedValues = findCadentialNotes(linesData, hd, sq,
                                                            bs, [judous[i]],
                                                            includeGraceNotes=\
-                                                           includeGraceNotes)
+                                                           includeGraceNotes,
+                                                           lineStats=lineStats)
         print('Notes for ' + nice_names[i] + ' counted.')
 
         for j in range(len(xLabels)):
@@ -1175,41 +2281,22 @@ def cadentialNotes(linesData,
                 nn = sortedNoteNames[k] # note name
                 pre_result[lt][sec][nn] = sortedValues[k][j]
 
-        bot = np.array([0, 0, 0])
-        plotNumber = '1' + str(len(judous)) + str(i+1)
-        plt.subplot(int(plotNumber))
-        for l in range(len(sortedValues)):
-            val = sortedValues[l]
-            colHatch = colors[sortedNoteNames[l]]
-            p = plt.bar(pos, val, width, color=colHatch[0],
-                        hatch = colHatch[1], bottom=bot, align='center')
-            bot = bot + val
-            # Prepare the legend
-            noteName = sortedNoteNames[l]
-            mid = pitch.Pitch(noteName).midi
-            legendCode[mid] = [p[0], noteName]
-        if not y:
-            plt.yticks(np.array([]), ())
-        y = False
-        plt.ylim(0, 100)
-        plt.title(lt, fontsize=title_fontsize)
-        plt.yticks(fontsize=yticks_fontsize)
-        plt.xticks(pos, xLabels, fontsize=xticks_fontsize)
-
-    legendColors = []
-    legendNotes = []
-    for k in sorted(legendCode.keys(), reverse=True):
-        lcode = legendCode[k]
-        legendColors.append(lcode[0])
-        legendNotes.append(lcode[1])
-    plt.legend(legendColors, legendNotes, bbox_to_anchor=(1, 1), loc=2,
-               fontsize=legend_fontsize)
-    plt.tight_layout(rect=(0, 0, adjust_right_margin, 1))
-
-    if filename != None:
-        print('\nPlotting...')
-        plt.savefig(filename)
-        print('"' + filename + '" plotted and saved.')
+        spec['judous'].append({'title': lt, 'noteNames': sortedNoteNames,
+                               'values': sortedValues})
+
+        # Prepare the legend
+        for noteName in sortedNoteNames:
+            mid = pitchInfo(noteName)[0]
+            legendCode[mid] = noteName
+
+    legendNotes = [legendCode[k] for k in sorted(legendCode.keys(),
+                                                 reverse=True)]
+    spec['legendNotes'] = legendNotes
+
+    if renderPlots:
+        if filename != None:
+            print('\nPlotting...')
+        submitRender(spec)
 
     # Final results:
     for line in pre_result:
@@ -1236,7 +2323,8 @@ def melodicDensity(linesData,
                    yticks_fontsize=18,
                    xticks_fontsize=20,
                    xlabel_fontsize=26,
-                   ylabel_fontsize=26):
+                   ylabel_fontsize=26,
+                   lineStats=None):
     '''
     Given the path to the lines_data.csv file, that should be stored in the
     same folder as the MusicXML scores of the Jingju Music Scores Collection,
@@ -1263,6 +2351,11 @@ def melodicDensity(linesData,
     - yticks_fontsize -- int, size of the font for the y axis' ticks
     - xLabel_fontsize -- int, size of the font for the x axis' label
     - yLabel_fontsize -- int, size of the font for the y axis' label
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, the melodic density is computed from them
+          instead of processing the scores. Otherwise, the syllables of each
+          line are kept in the score store (see lineSyllables), so that they
+          are segmented only once per session
 
     It returns data for each of the scores from which a line is retrieved, as
     well as for the average of all scores. These data are returned in a
@@ -1326,6 +2419,10 @@ def melodicDensity(linesData,
                                    banshi=bs, judou=ju)
 
     while notesOrDuration not in ['notes', 'Notes', 'duration', 'Duration']:
+        if batchMode:
+            raise InvalidInputError('"' + str(notesOrDuration) + '" is not a '\
+                                    'valid value for notesOrDuration. Valid '\
+                                    'values are "notes" and "duration"')
         message = '\nERROR: The value given for the notesOrDuration parameter'\
                   ' is invalid. Please enter either "notes" or "duration" (to'\
                   ' quit the program, please type "stop"): '
@@ -1335,143 +2432,463 @@ def melodicDensity(linesData,
         else:
             notesOrDuration = ans
 
-    syllables = []
     totalCount = []
     accumulatedCount = []
     scores = []
     results = {}
 
-    print('\nComputing melodic density...\nProcessing scores:')
-
-    for score in material[1:]:
-        # Loading the score to get the parts list
-        scorePath = score[0]
-        scores.append(scorePath)
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print('\tParsing ' + scoreName)
-        localCount = []
-        parts = findVoiceParts(loadedScore)
-        # Work with each part
-        for partIndex in range(1, len(score)):
-            if len(score[partIndex]) == 0: continue # Skip part if it's empty
-            # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notesAndRests.stream()
-            # Find segments to analyze in the current part
-            for startEnd in score[partIndex]:
-                start = startEnd[0]
-                end = startEnd[1]
-                segment = notes.getElementsByOffset(start, end)
-                openParenthesis = False
-                graceNote = False
-                for i in range(len(segment)):
-                    n = segment[i]
-                    if notesOrDuration == 'notes':
-                        value = 1
-                    else:
-                        value = n.quarterLength
-                    if n.isRest: continue
-                    if n.quarterLength==0:
-                        if not includeGraceNotes: continue
-                        j = 1
-                        while (i+j<len(segment) and
-                               segment[i+j].quarterLength==0):
-                            j += 1
-                        if i+j == len(segment): continue
-                        n2 = segment[i+j]
-                        if n2.hasLyrics():
-                            if (('（' in n2.lyric) or ('）' in n2.lyric) or
-                                openParenthesis):
-                                localCount[-1] += value
-                                accumulatedCount[-1] += value
-                            else:
-                                if graceNote:
-                                    localCount[-1] += value
-                                    accumulatedCount[-1] += value
-                                else:
-                                    localCount.append(value)
-                                    accumulatedCount.append(value)
-                                    syllables.append(n2.lyric)
-                                    graceNote = True
-                        else:
-                            localCount[-1] += value
-                            accumulatedCount[-1] += value
-                    else:
-                        if n.hasLyrics():
-                            # Check if the lyric is a padding syllable
-                            if ('（' in n.lyric) and ('）' in n.lyric):
-                                localCount[-1] += value
-                                accumulatedCount[-1] += value
-                            elif ('（' in n.lyric) and ('）' not in n.lyric):
-                                localCount[-1] += value
-                                accumulatedCount[-1] += value
-                                openParenthesis = True
-                            elif ('（' not in n.lyric) and ('）' in n.lyric):
-                                localCount[-1] += value
-                                accumulatedCount[-1] += value
-                                openParenthesis = False
-                            else:
-                                if openParenthesis:
-                                    localCount[-1] += value
-                                    accumulatedCount[-1] += value
-                                elif graceNote:
-                                    localCount[-1] += value
-                                    accumulatedCount[-1] += value
-                                    graceNote = False
-                                else:
-                                    localCount.append(value)
-                                    accumulatedCount.append(value)
-                                    syllables.append(n.lyric)
-                        else:
-                            localCount[-1] += value
-                            accumulatedCount[-1] += value
-        totalCount.append(localCount)
+    if lineStats != None:
+        print('\nComputing melodic density from line statistics...')
+        if notesOrDuration == 'notes':
+            variant = 'notes'
+        else:
+            variant = 'duration'
+        if not includeGraceNotes:
+            variant += 'NoGrace'
+        values = lineStats['densityValues-' + variant]
+        index = lineStats['densityIndex-' + variant]
+        leadingValues = lineStats['densityLeading-' + variant]
+        leadingIndex = lineStats['densityLeadingIndex-' + variant]
+        rows = statisticsRows(lineStats, material[0], linesData)
+        # The lines of each score, in the same order as the material
+        scoreRows = itertools.groupby(rows, lambda r: lineStats['score'][r])
+        for score, (scoreIndex, lines) in zip(material[1:], scoreRows):
+            scores.append(score[0])
+            localCount = []
+            for r in lines:
+                leading = leadingValues[leadingIndex[r]:leadingIndex[r+1]]
+                for value in leading.tolist():
+                    localCount[-1] += value
+                    accumulatedCount[-1] += value
+                localCount += values[index[r]:index[r+1]].tolist()
+                accumulatedCount += values[index[r]:index[r+1]].tolist()
+            totalCount.append(localCount)
+    else:
+        print('\nComputing melodic density...\nProcessing scores:')
+
+        for score in material[1:]:
+            scorePath = score[0]
+            scores.append(scorePath)
+            scoreName = scorePath.split('/')[-1]
+            print('\tParsing ' + scoreName)
+            tables = loadNoteTables(scorePath)
+            localCount = []
+            # Work with each part
+            for partIndex in range(1, len(score)):
+                # Find segments to analyze in the current part. The syllables
+                # of each line are segmented once, and kept in the score store
+                for startEnd in score[partIndex]:
+                    syllables = lineSyllables(scorePath, partIndex-1,
+                                              startEnd[0], startEnd[1],
+                                              includeGraceNotes)
+                    leading, values = syllableValues(tables[partIndex-1],
+                                                     syllables,
+                                                     notesOrDuration)
+                    # Notes before the first syllable of the segment belong to
+                    # the last syllable of the previous segment
+                    for value in leading:
+                        localCount[-1] += value
+                        accumulatedCount[-1] += value
+                    localCount += values
+                    accumulatedCount += values
+            totalCount.append(localCount)
     print('Melodic density computed.')
 
-    totalCount.append(accumulatedCount)
-    scores.append('average')
+    totalCount.append(accumulatedCount)
+    scores.append('average')
+
+    xLabels = [str(i) for i in range(1, len(totalCount))]
+    xLabels.append('Avg')
+
+    for i in range(len(xLabels)):
+        results[xLabels[i]] = {}
+        results[xLabels[i]]['score'] = scores[i]
+
+    # Collect all statistical information in the results dictionary
+    stats = boxplotStats(totalCount)
+    for i in range(len(stats)):
+        bp = results[xLabels[i]] # bp: boxplot
+        bp['median'] = stats[i]['med']
+        bp['Q1'] = stats[i]['q1']
+        bp['Q3'] = stats[i]['q3']
+        bp['lower fence'] = stats[i]['whislo']
+        bp['upper fence'] = stats[i]['whishi']
+        bp['outliers'] = stats[i]['fliers'].tolist()
+
+    if filename != None and renderPlots:
+        print('\nPlotting...')
+        plotMelodicDensity(results, filename=filename,
+                           notesOrDuration=notesOrDuration,
+                           yticks_fontsize=yticks_fontsize,
+                           xticks_fontsize=xticks_fontsize,
+                           xlabel_fontsize=xlabel_fontsize,
+                           ylabel_fontsize=ylabel_fontsize)
+
+    return results
+
+
+
+def plotMelodicDensity(results,
+                       filename=None,
+                       notesOrDuration='notes',
+                       yticks_fontsize=18,
+                       xticks_fontsize=20,
+                       xlabel_fontsize=26,
+                       ylabel_fontsize=26):
+    '''
+    Given the results returned by the melodicDensity function, it draws their
+    boxplots. The melodicDensity function computes the statistics of the
+    boxplots without drawing them, and calls this function only if a filename
+    is given, so that the plot can also be drawn afterwards, as a separate
+    step.
+
+    Parameters:
+    - results -- dict, the results returned by the melodicDensity function
+    - filename -- str, path for saving the plot as an image file. If None
+          given, the plot is drawn in a pyplot figure
+    - notesOrDuration -- str, the value given to the melodicDensity function,
+          'notes' or 'duration', for the label and limits of the y axis
+    - xticks_fontsize -- int, size of the font for the x axis' ticks
+    - yticks_fontsize -- int, size of the font for the y axis' ticks
+    - xLabel_fontsize -- int, size of the font for the x axis' label
+    - yLabel_fontsize -- int, size of the font for the y axis' label
+
+    For example:
+    >>> results = melodicDensity(ln, hd=['dan'], sq=['xipi'], bs=['erliu'])
+    >>> plotMelodicDensity(results)
+    >>> plt.show()
+    '''
+
+    xLabels = list(results.keys())
+    stats = []
+    for xLabel in xLabels:
+        bp = results[xLabel] # bp: boxplot
+        stats.append({'med': bp['median'], 'q1': bp['Q1'], 'q3': bp['Q3'],
+                      'whislo': bp['lower fence'],
+                      'whishi': bp['upper fence'],
+                      'fliers': np.array(bp['outliers'])})
+
+    submitRender({'plotType': 'md', 'filename': filename,
+                  'stats': stats, 'xLabels': xLabels,
+                  'notesOrDuration': notesOrDuration,
+                  'xticks_fontsize': xticks_fontsize,
+                  'yticks_fontsize': yticks_fontsize,
+                  'xlabel_fontsize': xlabel_fontsize,
+                  'ylabel_fontsize': ylabel_fontsize})
+
+
+
+###############################################################################
+## FUNCTIONS FOR RENDERING                                                   ##
+###############################################################################
+
+# Figure reused for all the plots of each type (histogram, phlj, cn and md)
+# that are saved in a file. They are drawn with the object-oriented API on the
+# non-GUI Agg canvas, so that they are not kept by pyplot and they can be
+# rendered in worker processes
+figureTemplates = {}
+
+# The analysis functions do not draw their plots, but return a render spec, a
+# dictionary with the plot type, the filename and the data and styling needed
+# for drawing it, that is passed to submitRender. If renderPlots is False, no
+# plot is drawn, and only the results are returned
+renderPlots = True
+
+# If a list, the render specs are appended to it instead of being rendered as
+# soon as the results are computed, so that they can be rendered later, for
+# instance by another process
+renderQueue = None
+
+# Pool of worker processes that render the submitted specs in the background
+# while the results are computed (see startRenderWorkers), and the pending
+# renders submitted to it
+renderWorkers = None
+pendingRenders = []
+
+
+
+@contextlib.contextmanager
+def renderFigure(plotType, filename):
+    '''
+    Context manager that yields the matplotlib figure where a plot of the
+    given type is drawn. If a filename is given, the figure of figureTemplates
+    for that plot type is used (and created if needed), and on exit the plot
+    is saved in that file and the figure is cleared for the next plot, also if
+    an error is raised while drawing it. If filename is None, a new pyplot
+    figure is returned, so that it can be shown, as in interactive sessions.
+
+    Parameters:
+    - plotType -- str, key of the figure in figureTemplates
+    - filename -- str, path to the file to save the plot, or None
+    '''
+
+    if filename == None:
+        yield plt.figure()
+        return
+
+    if plotType not in figureTemplates:
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        figureTemplates[plotType] = figure
+    figure = figureTemplates[plotType]
+
+    try:
+        yield figure
+        with profileStage('plotting'):
+            figure.savefig(filename)
+    finally:
+        figure.clear()
+        # The margins changed by subplots_adjust or tight_layout are not
+        # reset by clear
+        figure.subplotpars = SubplotParams()
+
+
+
+def submitRender(spec):
+    '''
+    It renders the plot of the given render spec, or defers it. If render
+    workers were started with startRenderWorkers, the spec is sent to them, so
+    that the computation continues while the plot is drawn and saved. If
+    renderQueue is a list, the spec is appended to it. Otherwise, or if the
+    spec has no filename, the plot is rendered at once.
+
+    Parameter:
+    - spec -- dict, render spec, with at least the keys 'plotType' and
+          'filename', and the parameters of the draw function of its plot type
+          in renderFunctions
+    '''
+
+    if spec['filename'] == None:
+        render(spec)
+    elif renderWorkers != None:
+        pendingRenders.append(renderWorkers.submit(renderProfiled, spec))
+    elif renderQueue != None:
+        renderQueue.append(spec)
+    else:
+        render(spec)
+
+
+
+def render(spec):
+    '''
+    It draws the plot of the given render spec with the draw function of its
+    plot type, and saves it in its filename. If the filename is None, the plot
+    is drawn in a pyplot figure.
+    '''
+
+    with renderFigure(spec['plotType'], spec['filename']) as figure:
+        renderFunctions[spec['plotType']](figure, spec)
+
+    if spec['filename'] != None:
+        print('"' + spec['filename'] + '" plotted and saved.')
+
+
+
+def renderProfiled(spec):
+    '''
+    It renders the plot of the given render spec in a render worker, and it
+    returns the stages profiled while rendering it, so that they are added to
+    the profile of the main process.
+    '''
+
+    stageProfile.clear()
+    render(spec)
+
+    return dict(stageProfile)
+
+
+
+def initRenderWorker(profilingFlag):
+    # The workers keep their own figure templates, and record the plotting
+    # stage if profiling is enabled in the main process
+    jSC.profiling = profilingFlag
+
+
+
+def startRenderWorkers(workers=1):
+    '''
+    It starts the given number of worker processes for rendering in the
+    background the render specs given to submitRender, including those
+    already waiting in renderQueue.
+    '''
 
-    xLabels = [str(i) for i in range(1, len(totalCount))]
-    xLabels.append('Avg')
+    global renderWorkers
 
-    for i in range(len(xLabels)):
-        results[xLabels[i]] = {}
-        results[xLabels[i]]['score'] = scores[i]
+    renderWorkers = concurrent.futures.ProcessPoolExecutor(
+                        workers, initializer=initRenderWorker,
+                        initargs=(jSC.profiling,))
 
-    plt.figure()
-    data = plt.boxplot(totalCount)
+    if renderQueue != None:
+        for spec in renderQueue:
+            submitRender(spec)
+        del renderQueue[:]
 
-    # Collect all statistical information in the results dictionary
-    limits = []
-    for i in range(len(data['medians'])):
-        limits.append(np.mean(data['medians'][i].get_xdata()))
-        bp = results[xLabels[i]] # bp: boxplot
-        bp['median'] = data['medians'][i].get_ydata()[0]
-        bp['Q1'] = data['boxes'][i].get_ydata()[1]
-        bp['Q3'] = data['boxes'][i].get_ydata()[2]
-        bp['lower fence'] = data['caps'][i*2].get_ydata()[1]
-        bp['upper fence'] = data['caps'][i*2+1].get_ydata()[1]
-        bp['outliers'] = data['fliers'][i].get_ydata().tolist()
-
-    plt.xticks(range(1, len(totalCount)+1), xLabels, fontsize=xticks_fontsize)
-    plt.yticks(fontsize=yticks_fontsize)
-    plt.axvline(x=len(totalCount)-0.5, ls='--', color='red')
-    if notesOrDuration == 'duration':
-        plt.ylim(0, 27)
-        plt.ylabel('Quarter length duration', fontsize=ylabel_fontsize)
-    elif notesOrDuration == 'notes':
-        plt.ylim(0, 70)
-        plt.ylabel('Number of notes', fontsize=ylabel_fontsize)
-    plt.xlabel('Sample scores', fontsize=xlabel_fontsize)
-    plt.tight_layout()
-
-    if filename != None:
-        print('\nPlotting...')
-        plt.savefig(filename)
-        print('"' + filename + '" plotted and saved.')
 
-    return results
+
+def finishRendering():
+    '''
+    It waits until all the plots submitted to the render workers are saved,
+    renders the specs waiting in renderQueue, and stops the render workers.
+    An error raised while rendering a plot is raised again here.
+    '''
+
+    global renderWorkers
+
+    if renderQueue != None:
+        for spec in renderQueue:
+            render(spec)
+        del renderQueue[:]
+
+    if renderWorkers == None:
+        return
+
+    try:
+        for future in pendingRenders:
+            mergeProfile(future.result())
+    finally:
+        del pendingRenders[:]
+        renderWorkers.shutdown()
+        renderWorkers = None
+
+
+
+def drawHistogram(figure, spec):
+    # Bar plot of the pitchHistogram and intervalHistogram functions, with the
+    # parameters of the plotting function
+    width = spec['width']
+    ax = figure.add_subplot(111)
+    ax.bar(spec['xPositions'], spec['yValues'], width, linewidth=0, zorder=1,
+           color = spec['col'],
+           hatch = spec['h'])
+    if spec['scaleGuides']:
+        ax.axvline(x=64+width/2, color='red', zorder=0) # Tonic line
+        ax.axvline(x=76+width/2, color='red', ls='--', zorder=0) # 8ve tonic
+        ax.axvline(x=59+width/2, color='gray', ls=':', zorder=0) # Fifth
+        ax.axvline(x=71+width/2, color='gray', ls=':', zorder=0) # Fifth
+        ax.axvline(x=83+width/2, color='gray', ls=':', zorder=0) # Fifth
+    for yValue in spec['yValues']:
+        ax.axhline(y=yValue, color='gray', ls=':', zorder=0)
+    ax.set_xticks(spec['xPositions'] + width/2)
+    ax.set_xticklabels(spec['xLabels'], rotation=90,
+                       fontsize=spec['xticks_fontsize'])
+    for label in ax.get_yticklabels():
+        label.set_fontsize(spec['yticks_fontsize'])
+    if spec['limX'] != None:
+        ax.set_xlim(spec['limX'][0]-(1-width), spec['limX'][1]+1)
+    else:
+        ax.set_xlim(spec['xPositions'][0]-(1-width),
+                    spec['xPositions'][-1]+1)
+    if spec['limY'] != None:
+        ax.set_ylim(spec['limY'][0], spec['limY'][1])
+    if spec['xLabel'] != None:
+        ax.set_xlabel(spec['xLabel'], fontsize=spec['xLabel_fontsize'])
+    if spec['yLabel'] != None:
+        ax.set_ylabel(spec['yLabel'], fontsize=spec['yLabel_fontsize'])
+    if spec['title'] != None:
+        ax.set_title(spec['title'], fontsize=spec['title_fontsize'])
+    figure.tight_layout()
+
+
+
+def drawLineJudouHistograms(figure, spec):
+    # Three horizontal bar plots of the pitchHistogramLineJudou function, one
+    # per line section
+    width = spec['width']
+    limX = spec['limX']
+    for i in range(len(spec['judous'])):
+        jp = spec['judous'][i]
+        ax = figure.add_subplot(131+i)
+        ax.barh(jp['yPositions'], jp['xValues'], width, linewidth=0,
+                zorder=1, color = jp['col'], hatch = jp['h'])
+        ax.axhline(y=64+width/2, color='red', zorder=0) # Tonic line
+        ax.axhline(y=76+width/2, color='red', ls='--', zorder=0) # 8ve
+        ax.axhline(y=59+width/2, color='gray', ls=':', zorder=0) # Fifth
+        ax.axhline(y=71+width/2, color='gray', ls=':', zorder=0) # Fifth
+        ax.axhline(y=83+width/2, color='gray', ls=':', zorder=0) # Fifth
+        for xValue in jp['xValues']:
+            ax.axvline(x=xValue, color='gray', ls=':', zorder=0)
+        if i == 0:
+            ax.set_yticks(spec['yPositions'] + width/2)
+            ax.set_yticklabels(spec['yLabels'],
+                               fontsize=spec['yticks_fontsize'])
+            ax.set_ylabel('Pitch', fontsize=spec['yLabel_fontsize'])
+        else:
+            ax.set_yticks([])
+        if i == 1:
+            ax.set_xlabel(spec['xLabel'], fontsize=spec['xLabel_fontsize'])
+        ax.set_ylim(jp['limY'][0], jp['limY'][1])
+        ax.set_xticks(spec['ticksX'])
+        ax.set_xticklabels(spec['ticksX'], rotation=90,
+                           fontsize=spec['xticks_fontsize'])
+        ax.set_xlim(limX[0], limX[1])
+
+    figure.tight_layout()
+    if spec['title'] != None:
+        figure.suptitle(spec['title'], fontsize=spec['title_fontsize'])
+        figure.subplots_adjust(top=1-spec['title_fontsize']/300)
+
+
+
+def drawCadentialNotes(figure, spec):
+    # Stacked bar plots of the cadentialNotes function, one per line type,
+    # with a legend of the notes sorted by pitch
+    pos = np.arange(len(spec['xLabels']))
+    handles = {}
+    for i in range(len(spec['judous'])):
+        judou = spec['judous'][i]
+        bot = np.array([0, 0, 0])
+        plotNumber = '1' + str(len(spec['judous'])) + str(i+1)
+        ax = figure.add_subplot(int(plotNumber))
+        for l in range(len(judou['values'])):
+            val = judou['values'][l]
+            noteName = judou['noteNames'][l]
+            midi, color, hatch = pitchInfo(noteName)
+            p = ax.bar(pos, val, spec['width'], color=color,
+                       hatch = hatch, bottom=bot, align='center')
+            bot = bot + val
+            handles[noteName] = p[0]
+        if i > 0:
+            ax.set_yticks(np.array([]))
+        ax.set_ylim(0, 100)
+        ax.set_title(judou['title'], fontsize=spec['title_fontsize'])
+        for label in ax.get_yticklabels():
+            label.set_fontsize(spec['yticks_fontsize'])
+        ax.set_xticks(pos)
+        ax.set_xticklabels(spec['xLabels'], fontsize=spec['xticks_fontsize'])
+
+    ax.legend([handles[n] for n in spec['legendNotes']], spec['legendNotes'],
+              bbox_to_anchor=(1, 1), loc=2, fontsize=spec['legend_fontsize'])
+    figure.tight_layout(rect=(0, 0, spec['adjust_right_margin'], 1))
+
+
+
+def drawMelodicDensity(figure, spec):
+    # Boxplots of the melodicDensity function, drawn from the statistics
+    # computed for its results
+    ax = figure.add_subplot(111)
+    ax.bxp(spec['stats'])
+    ax.set_xticks(range(1, len(spec['stats'])+1))
+    ax.set_xticklabels(spec['xLabels'], fontsize=spec['xticks_fontsize'])
+    for label in ax.get_yticklabels():
+        label.set_fontsize(spec['yticks_fontsize'])
+    ax.axvline(x=len(spec['stats'])-0.5, ls='--', color='red')
+    if spec['notesOrDuration'] == 'duration':
+        ax.set_ylim(0, 27)
+        ax.set_ylabel('Quarter length duration',
+                      fontsize=spec['ylabel_fontsize'])
+    elif spec['notesOrDuration'] == 'notes':
+        ax.set_ylim(0, 70)
+        ax.set_ylabel('Number of notes', fontsize=spec['ylabel_fontsize'])
+    ax.set_xlabel('Sample scores', fontsize=spec['xlabel_fontsize'])
+    figure.tight_layout()
+
+
+
+# Draw function of each plot type
+renderFunctions = {'histogram': drawHistogram,
+                   'phlj': drawLineJudouHistograms,
+                   'cn': drawCadentialNotes,
+                   'md': drawMelodicDensity}
 
 
 
@@ -1485,7 +2902,7 @@ def checkInput(value, element):
     system and evaluates if the input instances are correct for being used in
     the pitchHistogram, pitchHistogramLineJudou, intervalHistogram, and
     melodicDensity functions. If a given instance is incorrect, it asks the
-    user for a valid input.
+    user for a valid input, or, in batch mode, it raises an InvalidInputError.
 
     Parameters:
     - value -- a list with the instances for a given element of the jingju
@@ -1522,6 +2939,10 @@ def checkInput(value, element):
         inputs = inputs[:-2] + ' and ' + correct[-1]
         while value[i] not in correct:
             error = True
+            if batchMode:
+                raise InvalidInputError('"' + str(value[i]) + '" is not a '\
+                                        'valid ' + corrects[element][0] +\
+                                        '. Valid inputs are ' + inputs)
             message = '\nACTION REQUIRED: "' + value[i] + '" is not a valid '+\
                       corrects[element][0] + '. Valid inputs are ' + inputs +\
                       '. Please enter a new input, "skip" to ignore '\
@@ -1536,6 +2957,9 @@ def checkInput(value, element):
                 value[i] = ans
 
     if len(to_skip) == len(value):
+        if batchMode:
+            raise InvalidInputError('No input given for ' +\
+                                    corrects[element][0])
         message = '\nERROR: after skipping incorrect values no input for ' +\
                   corrects[element][0] + ' is left. The program will exit.'
         print(message)
@@ -1553,7 +2977,9 @@ def checkInput_cn(hangdang, shengqiang, banshi):
     '''
     It takes a list of instances for role type, shengqiang and banshi, and
     evaluates if they are valid to be used in the cadentialNotes function. If a
-    given instance is incorrect, it asks the user for a valid input.
+    given instance is incorrect, it asks the user for a valid input, or, in
+    batch mode, it raises an InvalidInputError. In batch mode, more than one
+    hangdang are accepted after printing a warning.
 
     Parameters:
     - hangdang -- a list of role type instances
@@ -1574,7 +3000,12 @@ def checkInput_cn(hangdang, shengqiang, banshi):
 
     # Check that the inputted parameters are correct
     ## Check hangdang is only one
-    if len(hangdang) > 1:
+    if len(hangdang) > 1 and batchMode:
+        print('\nWARNING: ' + str(len(hangdang)) + ' hangdang given. The '\
+              'results might not be musically meaningful for more than one '\
+              'hangdang.')
+        hangdang = checkInput(hangdang, 'hd')
+    elif len(hangdang) > 1:
         n = str(len(hangdang))
         message = '\nWARNING: you inputted ' + n + ' hangdang. This function '\
                   'might return not musically meaningful results for more '\
@@ -1593,6 +3024,10 @@ def checkInput_cn(hangdang, shengqiang, banshi):
     ## Check shengqiang is correct
 
     while shengqiang not in [['xipi'], ['erhuang']]:
+        if batchMode:
+            raise InvalidInputError('Invalid shengqiang ' + str(shengqiang) +\
+                                    '. This function only takes either '\
+                                    '["xipi"] or ["erhuang"]')
         message = '\nERROR: Invalid shengqiang. This function only takes '\
                   'either "xipi" or "erhuang". Which shengqiang do you want '\
                   'to analyse? (To quit the program, please type "stop"): '
@@ -1609,69 +3044,623 @@ def checkInput_cn(hangdang, shengqiang, banshi):
 
 
 
-def findVoiceParts(score):
+@profiled('counting')
+def segmentPitches(table, rows, countGraceNotes=True):
     '''
-    It takes a score and searches which of the parts is the one containing
-    lyrics, and therefore, the one containing singing voice.
+    It takes the given rows of a note table and returns the pitch name, midi
+    value and quarterLength duration of the notes among them, ignoring the
+    rests. Grace notes are given the minimum duration of the note table, as
+    stored in its 'minDuration' key.
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - rows -- numpy array of ints, indexes of the rows of the note table, as
+          returned by the segmentRows or the selectRows functions
+    - countGraceNotes -- bool, if True, grace notes are returned with the
+          minimum duration of the note table. If False, grace notes are ignored
+
+    It returns three numpy arrays with the pitch names, midi values and
+    quarterLength durations of the selected notes, in the order of the given
+    rows.
+    '''
+
+    rows = rows[~table['isRest'][rows]]
+    graceNotes = table['isGrace'][rows]
+
+    if not countGraceNotes:
+        rows = rows[~graceNotes]
+        durations = table['quarterLength'][rows]
+    else:
+        durations = np.where(graceNotes, table['minDuration'],
+                             table['quarterLength'][rows])
+
+    return table['name'][rows], table['midi'][rows], durations
+
+
+
+@profiled('counting')
+def countPitches(names, midis, durations):
+    '''
+    It computes the aggregated duration of each pitch for the notes given by
+    their pitch names, midi values and durations, as returned by the
+    segmentPitches function. The pitches are sorted by their midi value, and
+    pitches with the same midi value but different names are sorted by the
+    order in which they first appear.
+
+    Parameters:
+    - names -- [numpy array of str], pitch names of the notes
+    - midis -- [numpy array of ints], midi values of the notes
+    - durations -- [numpy array of floats], durations of the notes
+
+    It returns three values:
+    - [str], the sorted pitch names
+    - numpy array of ints, the midi values of the sorted pitches
+    - numpy array of floats, the aggregated duration of the sorted pitches
+    '''
+
+    if len(names) == 0 or sum([len(n) for n in names]) == 0:
+        return [], np.array([], dtype=int), np.array([], dtype=float)
+
+    names = np.concatenate(names)
+    midis = np.concatenate(midis)
+    durations = np.concatenate(durations)
+
+    # Index every note by its pitch name and count with bincount
+    pitchNames, firstIndex, pitchCodes = np.unique(names, return_index=True,
+                                                   return_inverse=True)
+    pitchCount = np.bincount(pitchCodes.ravel(), weights=durations,
+                             minlength=len(pitchNames))
+
+    pitchMidis = midis[firstIndex]
+    order = np.lexsort((firstIndex, pitchMidis))
+
+    sortedNames = [str(p) for p in pitchNames[order]]
+
+    return sortedNames, pitchMidis[order], pitchCount[order]
+
+
+
+# Semitones of the perfect and major intervals, per number of diatonic steps
+# in an octave
+diatonicSemitones = [0, 2, 4, 5, 7, 9, 11]
+
+# Names of the intervals, per number of diatonic steps and of semitones, as
+# returned by the intervalName function, and semitones of each name
+intervalNameTable = {}
+intervalSemitones = {}
+
+# Intervals already classified by the classifyInterval function, per pair of
+# pitches given as (step, alter, octave) tuples
+intervalClassifications = {}
+
+
+
+@profiled('segments')
+def segmentIntervalPairs(table, segment, silence2ignore=0.25,
+                         ignoreGraceNotes=False, successors=None):
+    '''
+    It finds the pairs of notes of a segment that form the intervals counted
+    by the intervalHistogram function. The last notes of the segment, if they
+    are grace notes, are not taken as first note of an interval.
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - segment -- numpy array of ints, indexes of the rows of the segment, as
+          returned by the segmentRows function
+    - silence2ignore -- float, establishes the quarterLength duration of a rest
+          between two notes to be ignored for the computation of the interval
+          that those two notes form
+    - ignoreGraceNotes -- bool, if True, grace notes are ignored. If False,
+          grace notes are considered for the computation of intervals
+    - successors -- numpy array of ints, as returned by the successorIndex
+          function for the same table, silence2ignore and ignoreGraceNotes. If
+          None, it is computed
+
+    It returns two numpy arrays of ints, with the rows of the note table for
+    the first and the second note of each interval.
+    '''
+
+    if successors is None:
+        successors = successorIndex(table, silence2ignore, ignoreGraceNotes)
+
+    # Rows up to the last note that is not a grace note
+    notGrace = np.nonzero(table['quarterLength'][segment] != 0)[0]
+    if len(notGrace) == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    firsts = segment[:notGrace[-1]]
+
+    # The second note must be in the same segment
+    seconds = successors[firsts]
+    found = (seconds != -1) & (seconds <= segment[-1])
+
+    return firsts[found], seconds[found]
 
-    Parameter:
-    - score -- a music21.strem.Score object
 
-    It returns a list with all the parts that contain lyrics
+
+def successorIndex(table, silence2ignore=0.25, ignoreGraceNotes=False):
+    '''
+    It finds for each row of a note table the note with which it forms an
+    interval, that is, the next note, skipping the rests whose duration is not
+    longer than silence2ignore, and the grace notes if they are ignored.
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - silence2ignore -- float, establishes the quarterLength duration of a rest
+          between two notes to be ignored for the computation of the interval
+          that those two notes form
+    - ignoreGraceNotes -- bool, if True, grace notes are ignored. If False,
+          grace notes are considered for the computation of intervals
+
+    It returns a numpy array of ints with the row of the second note of the
+    interval starting at each row, -1 if the row is a rest or an ignored grace
+    note, if the next row that is not skipped is a rest, or if there is none.
+    '''
+
+    durations = table['quarterLength']
+    rests = table['isRest']
+    graceNotes = ~rests & (durations == 0)
+
+    skipped = rests & (durations <= silence2ignore)
+    if ignoreGraceNotes:
+        skipped |= graceNotes
+
+    # Next row that is not skipped
+    candidates = np.nonzero(~skipped)[0]
+    positions = np.searchsorted(candidates, np.arange(len(durations)),
+                                side='right')
+    successors = np.full(len(durations), -1, dtype=int)
+    found = positions < len(candidates)
+    successors[found] = candidates[positions[found]]
+
+    # Intervals are formed by two notes
+    found[found] = ~rests[successors[found]]
+    found &= ~rests
+    if ignoreGraceNotes:
+        found &= ~graceNotes
+    successors[~found] = -1
+
+    return successors
+
+
+
+def diatonicSteps(table):
+    '''
+    It returns a numpy array of ints with the number of diatonic steps from C0
+    to the note of each row of a note table, computed from its pitch name, so
+    that the generic interval between two notes is the difference of their
+    values. Rests are given 0.
+    '''
+
+    names, inverse = np.unique(table['name'], return_inverse=True)
+
+    steps = []
+    for name in names:
+        if name == '':
+            steps.append(0)
+            continue
+        octave = int(name[len(name.rstrip('0123456789')):])
+        steps.append(octave * 7 + 'CDEFGAB'.index(name[0]))
+
+    return np.array(steps, dtype=int)[inverse]
+
+
+
+def intervalName(generic, semitones):
+    '''
+    It names the interval formed by two notes in the same way as the name and
+    directedName attributes of music21.interval.Interval, from the number of
+    diatonic steps and of semitones from the first to the second note. The
+    names are kept in intervalNameTable, so that each interval is named only
+    once.
+
+    Parameters:
+    - generic -- int, diatonic steps from the first to the second note,
+          negative if descending
+    - semitones -- int, semitones from the first to the second note
+
+    It returns a tuple with the name of the interval, its directed name, and
+    the semitones of each of them as given by music21.interval.Interval, that
+    is, measured upwards for the name, except for unisons.
 
     For example:
-    >>> import music21
-    >>> s = music21.converter.parse('sdxp-WoHeNi-SiLangTanMu.xml')
-    >>> findVoiceParts(s)
-    [<music21.stream.Part Piano>, <music21.stream.Part Piano>]
+    >>> intervalName(-1, -1)
+    ('m2', 'm-2', 1, -1)
     '''
 
-    voiceParts = []
+    key = (generic, semitones)
+    if key in intervalNameTable:
+        return intervalNameTable[key]
 
-    for p in score.parts:
-        if len(p.flat.notes) == 0: continue
-        i = 0
-        n = p.flat.notes[i]
-        while n.quarterLength == 0:
-            i += 1
-            n = p.flat.notes.stream()[i]
-        if n.hasLyrics():
-                if p.hasElementOfClass('Instrument'):
-                    p.remove(p.getInstrument())
-                voiceParts.append(p)
-    return voiceParts
+    steps = abs(generic)
+    if generic < 0:
+        size = -semitones
+    else:
+        size = semitones
+    deviation = size - diatonicSemitones[steps % 7] - 12 * (steps // 7)
+
+    if steps % 7 in [0, 3, 4]:
+        # Perfect intervals
+        if deviation == 0:
+            quality = 'P'
+        elif deviation > 0:
+            quality = 'A' * deviation
+        else:
+            quality = 'd' * -deviation
+    else:
+        # Major and minor intervals
+        if deviation == 0:
+            quality = 'M'
+        elif deviation == -1:
+            quality = 'm'
+        elif deviation > 0:
+            quality = 'A' * deviation
+        else:
+            quality = 'd' * (-deviation - 1)
+
+    name = quality + str(steps + 1)
+    if generic < 0:
+        directedName = quality + '-' + str(steps + 1)
+    else:
+        directedName = name
+
+    intervalNameTable[key] = (name, directedName, size, semitones)
+    intervalSemitones[name] = size
+    intervalSemitones[directedName] = semitones
 
+    return intervalNameTable[key]
 
 
-def floatOrFraction(strValue):
+
+def classifyInterval(pitch1, pitch2):
     '''
-    It takes a string with a numerical value and analyses if it is a float or
-    a fractions.Fraction object.
+    It classifies the interval formed by two pitches, given as (step, alter,
+    octave) tuples, as the step, alter and octave attributes of
+    music21.pitch.Pitch objects. The number of diatonic steps and semitones
+    between them are computed from their spelling, the interval is named by
+    the intervalName function, and the result is kept in
+    intervalClassifications, so that each pair of pitches is classified only
+    once.
 
-    Parameter:
-    - strValue -- str, a numercial value
+    Parameters:
+    - pitch1 -- tuple, (step, alter, octave) of the first pitch
+    - pitch2 -- tuple, (step, alter, octave) of the second pitch
 
-    It returns a flot or a fractions.Fraction object. If the input is an empty
-    string, it returns None
+    It returns a tuple with the name, the directed name and the semitones of
+    the interval, as given by the name, directedName and semitones attributes
+    of music21.interval.Interval.
 
     For example:
-    >>> floatOrFraction('1277/6')
-    Fraction(1277, 6)
-    >>> floatOrFraction('164')
-    164.0
-    >>> floatOrFraction('')
-    >>>
-    '''
-    if '/' in strValue:
-        numerator = int(strValue.split('/')[0])
-        denominator = int(strValue.split('/')[1])
-        value = fractions.Fraction(numerator, denominator)
-    elif len(strValue) == 0:
-        value = None
+    >>> classifyInterval(('E', 0, 4), ('C', 1, 4))
+    ('m3', 'm-3', -3)
+    '''
+
+    key = (pitch1, pitch2)
+    if key in intervalClassifications:
+        return intervalClassifications[key]
+
+    generic = ((pitch2[2] - pitch1[2]) * 7 + 'CDEFGAB'.index(pitch2[0]) -
+               'CDEFGAB'.index(pitch1[0]))
+    semitones = int((pitch2[2] - pitch1[2]) * 12 + stepSemitones[pitch2[0]] +
+                    pitch2[1] - stepSemitones[pitch1[0]] - pitch1[1])
+    name, directedName = intervalName(generic, semitones)[:2]
+
+    intervalClassifications[key] = (name, directedName, semitones)
+
+    return intervalClassifications[key]
+
+
+
+def pitchSpelling(name):
+    '''
+    It returns the (step, alter, octave) tuple of a pitch name as given by
+    the nameWithOctave attribute of music21.pitch.Pitch objects, such as
+    'C#4', for the classifyInterval function.
+    '''
+
+    digits = len(name.rstrip('0123456789'))
+    alter = name[1:digits].count('#') - name[1:digits].count('-')
+
+    return (name[0], alter, int(name[digits:]))
+
+
+
+def pitchInfo(name):
+    '''
+    It returns a tuple with the midi value, and the color and hatch used in
+    the plots of the cadentialNotes function (None if not defined in
+    pitchColors), of a pitch name as given by the nameWithOctave attribute of
+    music21.pitch.Pitch objects, such as 'C#4'. The midi value is computed
+    from the pitch spelling, without creating a music21 object, and the
+    result is kept in pitchTable, so that sorting and labeling pitches are
+    dictionary lookups.
+    '''
+
+    if name not in pitchTable:
+        step, alter, octave = pitchSpelling(name)
+        midi = (octave + 1) * 12 + stepSemitones[step] + alter
+        color, hatch = pitchColors.get(name, [None, None])
+        pitchTable[sys.intern(str(name))] = (midi, color, hatch)
+
+    return pitchTable[name]
+
+
+
+def nameSemitones(name):
+    '''
+    It returns the semitones of an interval from its name or directed name,
+    as the semitones attribute of a music21.interval.Interval created with
+    that name, so that intervals can be sorted by size.
+    '''
+
+    if name in intervalSemitones:
+        return intervalSemitones[name]
+
+    quality = name.rstrip('-0123456789')
+    number = name[len(quality):]
+    steps = abs(int(number)) - 1
+    if steps % 7 in [0, 3, 4]:
+        deviations = {'P': 0}
+    else:
+        deviations = {'M': 0, 'm': -1}
+    if quality in deviations:
+        deviation = deviations[quality]
+    elif quality[0] == 'A':
+        deviation = len(quality)
+    elif steps % 7 in [0, 3, 4]:
+        deviation = -len(quality)
     else:
-        value = float(strValue)
+        deviation = -len(quality) - 1
+    semitones = diatonicSemitones[steps % 7] + 12 * (steps // 7) + deviation
+    if number[0] == '-':
+        semitones = -semitones
 
-    return value
+    intervalSemitones[name] = semitones
+
+    return semitones
+
+
+
+# The intervals of up to three octaves with up to doubly augmented or
+# diminished quality are named in advance
+for generic in range(-21, 22):
+    for deviation in range(-3, 3):
+        size = (diatonicSemitones[abs(generic) % 7] +
+                12 * (abs(generic) // 7) + deviation)
+        if generic < 0:
+            intervalName(generic, -size)
+        else:
+            intervalName(generic, size)
+
+
+
+@profiled('segments')
+def segmentCadence(table, segment, includeGraceNotes=True):
+    '''
+    It finds the cadential note of a segment, that is, its last note.
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - segment -- numpy array of ints, indexes of the rows of the segment, as
+          returned by the segmentRows function
+    - includeGraceNotes -- bool, if True, the last note can be a grace note.
+          If False, grace notes are ignored
+
+    It returns the row of the note table for the cadential note, and the
+    number of grace notes that were ignored after it.
+    '''
+
+    omitted = 0
+
+    i = -1
+    lastNote = segment[i]
+    while table['isRest'][lastNote]:
+        i += -1
+        lastNote = segment[i]
+    if not includeGraceNotes:
+        while table['quarterLength'][lastNote] == 0:
+            omitted += 1
+            i += -1
+            lastNote = segment[i]
+
+    return lastNote, omitted
+
+
+
+@profiled('segments')
+def syllableTable(table, segment, includeGraceNotes=True):
+    '''
+    It segments the notes of a segment into the syllables sung in it. The
+    notes of a padding syllable, written in brackets, belong to the previous
+    syllable, as well as the notes without lyrics. Grace notes belong to the
+    syllable of the following note. The melodic density of each syllable, as
+    number of notes or as aggregated quarterLength duration, is then taken
+    from the returned table (see the syllableValues function).
+
+    Parameters:
+    - table -- dict, a note table as returned by the noteTable function
+    - segment -- numpy array of ints, indexes of the rows of the segment, as
+          returned by the segmentRows function
+    - includeGraceNotes -- bool, if True, grace notes are counted. If False,
+          grace notes are ignored
+
+    It returns a dictionary with the following key/value pairs, with a value
+    for each syllable of the segment in the numpy arrays:
+    - 'start': numpy array of ints -- row of the first note of the syllable
+    - 'end': numpy array of ints -- row after the last note of the syllable
+    - 'notes': numpy array of ints -- number of notes of the syllable
+    - 'duration': numpy array of floats -- aggregated quarterLength duration
+          of the notes of the syllable
+    - 'lyric': numpy array of str -- lyric of the syllable
+    - 'leading': numpy array of ints -- rows of the notes found before the
+          first syllable of the segment, that belong to the last syllable of
+          the previous segment
+    '''
+
+    durations = table['quarterLength']
+    lyrics = table['lyrics']
+    lyricIndexes = table['lyric']
+    opening = table['openParenthesis']
+    closing = table['closeParenthesis']
+
+    leading = []
+    starts = []
+    ends = []
+    notes = []
+    totalDurations = []
+    syllables = []
+
+    openParenthesis = False
+    graceNote = False
+    for i in range(len(segment)):
+        n = segment[i]
+        # The note belongs to the last syllable
+        toLast = False
+        # The note starts a new syllable, with the given lyric
+        newSyllable = None
+        if table['isRest'][n]: continue
+        if durations[n]==0:
+            if not includeGraceNotes: continue
+            j = 1
+            while (i+j<len(segment) and durations[segment[i+j]]==0):
+                j += 1
+            if i+j == len(segment): continue
+            n2 = segment[i+j]
+            if lyricIndexes[n2] != -1:
+                if opening[n2] or closing[n2] or openParenthesis:
+                    toLast = True
+                else:
+                    if graceNote:
+                        toLast = True
+                    else:
+                        newSyllable = lyrics[lyricIndexes[n2]]
+                        graceNote = True
+            else:
+                toLast = True
+        else:
+            if lyricIndexes[n] != -1:
+                # Check if the lyric is a padding syllable
+                if opening[n] and closing[n]:
+                    toLast = True
+                elif opening[n] and not closing[n]:
+                    toLast = True
+                    openParenthesis = True
+                elif not opening[n] and closing[n]:
+                    toLast = True
+                    openParenthesis = False
+                else:
+                    if openParenthesis:
+                        toLast = True
+                    elif graceNote:
+                        toLast = True
+                        graceNote = False
+                    else:
+                        newSyllable = lyrics[lyricIndexes[n]]
+            else:
+                toLast = True
+        if newSyllable != None:
+            starts.append(n)
+            ends.append(n+1)
+            notes.append(1)
+            totalDurations.append(durations[n])
+            syllables.append(newSyllable)
+        elif toLast:
+            if len(starts) == 0:
+                leading.append(n)
+            else:
+                ends[-1] = n+1
+                notes[-1] += 1
+                totalDurations[-1] += durations[n]
+
+    return {'start': np.array(starts, dtype=int),
+            'end': np.array(ends, dtype=int),
+            'notes': np.array(notes, dtype=int),
+            'duration': np.array(totalDurations, dtype=float),
+            'lyric': np.array(syllables, dtype=str),
+            'leading': np.array(leading, dtype=int)}
+
+
+
+def syllableValues(table, syllables, notesOrDuration='notes'):
+    '''
+    It returns the melodic density of the syllables of a syllable table, as
+    number of notes or as aggregated quarterLength duration, in two lists:
+    the values of the notes found before the first syllable, and the melodic
+    density of each syllable.
+
+    Parameters:
+    - table -- dict, the note table from which the syllable table was computed
+    - syllables -- dict, a syllable table as returned by syllableTable
+    - notesOrDuration -- str, 'notes' for counting the number of notes, or
+          'duration' for aggregating their quarterLength duration
+    '''
+
+    if notesOrDuration == 'notes':
+        leading = [1] * len(syllables['leading'])
+        values = syllables['notes'].tolist()
+    else:
+        leading = table['quarterLength'][syllables['leading']].tolist()
+        values = syllables['duration'].tolist()
+
+    return leading, values
+
+
+
+def boxplotStats(data, whis=1.5):
+    '''
+    It computes the statistics of a boxplot for each of the given lists of
+    values with NumPy, without drawing any figure, following the same rules as
+    matplotlib's boxplot: the quartiles are computed with numpy.percentile,
+    the lower whisker is at the lowest value above Q1 - whis * (Q3 - Q1), but
+    not above Q1, the upper whisker at the highest value below
+    Q3 + whis * (Q3 - Q1), but not below Q3, and the values beyond the
+    whiskers are outliers.
+
+    Parameters:
+    - data -- [[float]], a list of lists of values, one for each boxplot
+    - whis -- float, position of the whiskers, in proportion of the
+          interquartile range
+
+    It returns a list with a dictionary for each list of values, with the keys
+    of the statistics used by the bxp method of matplotlib's axes: 'mean',
+    'med', 'q1', 'q3', 'iqr', 'cilo', 'cihi', 'whislo', 'whishi' and
+    'fliers'. If a list is empty, its statistics are nan and it has no
+    outliers.
+    '''
+
+    stats = []
+
+    for values in data:
+        x = np.asarray(values)
+        if len(x) == 0:
+            bp = {k: np.nan for k in ['mean', 'med', 'q1', 'q3', 'iqr',
+                                      'cilo', 'cihi', 'whislo', 'whishi']}
+            bp['fliers'] = np.array([])
+            stats.append(bp)
+            continue
+
+        q1, med, q3 = np.percentile(x, [25, 50, 75])
+        iqr = q3 - q1
+        bp = {'mean': np.mean(x), 'med': med, 'q1': q1, 'q3': q3, 'iqr': iqr,
+              'cilo': med - 1.57 * iqr / np.sqrt(len(x)),
+              'cihi': med + 1.57 * iqr / np.sqrt(len(x))}
+
+        # Whiskers at the most extreme values within the fences
+        upper = x[x <= q3 + whis * iqr]
+        if len(upper) == 0 or np.max(upper) < q3:
+            bp['whishi'] = q3
+        else:
+            bp['whishi'] = np.max(upper)
+        lower = x[x >= q1 - whis * iqr]
+        if len(lower) == 0 or np.min(lower) > q1:
+            bp['whislo'] = q1
+        else:
+            bp['whislo'] = np.min(lower)
+
+        bp['fliers'] = np.concatenate([x[x < bp['whislo']],
+                                       x[x > bp['whishi']]])
+        stats.append(bp)
+
+    return stats
 
 
 
@@ -1780,7 +3769,7 @@ def plotting(filename, xPositions, xLabels, yValues, title=None, limX=None,
              xticks_fontsize=20, yticks_fontsize=18, xLabel_fontsize=26,
              yLabel_fontsize=26):
     '''
-    It takes all the parameters needed to plot a matplotlib.pyplot bar plot.
+    It takes all the parameters needed to plot a matplotlib bar plot.
     This function is used in the pitchHistogram, pitchHistogramLineJudou, and
     intervalHistogram functions.
 
@@ -1808,37 +3797,16 @@ def plotting(filename, xPositions, xLabels, yValues, title=None, limX=None,
     It returns an image file saved in the path input in the filename parameter.
     '''
 
-    plt.figure()
-    plt.bar(xPositions, yValues, width, linewidth=0, zorder=1,
-            color = col,
-            hatch = h)
-    if scaleGuides:
-        plt.axvline(x=64+width/2, color='red', zorder=0) # Tonic line
-        plt.axvline(x=76+width/2, color='red', ls='--', zorder=0) # 8ve tonic
-        plt.axvline(x=59+width/2, color='gray', ls=':', zorder=0) # Fifth
-        plt.axvline(x=71+width/2, color='gray', ls=':', zorder=0) # Fifth
-        plt.axvline(x=83+width/2, color='gray', ls=':', zorder=0) # Fifth
-    for yValue in yValues:
-        plt.axhline(y=yValue, color='gray', ls=':', zorder=0)
-    plt.xticks(xPositions + width/2, xLabels, rotation=90,
-               fontsize=xticks_fontsize)
-    plt.yticks(fontsize=yticks_fontsize)
-    if limX != None:
-        plt.xlim(limX[0]-(1-width), limX[1]+1)
-    else:
-        plt.xlim(xPositions[0]-(1-width), xPositions[-1]+1)
-    if limY != None:
-        plt.ylim(limY[0], limY[1])
-    if xLabel != None:
-        plt.xlabel(xLabel, fontsize=xLabel_fontsize)
-    if yLabel != None:
-        plt.ylabel(yLabel, fontsize=yLabel_fontsize)
-    if title != None:
-        plt.title(title, fontsize=title_fontsize)
-    plt.tight_layout()
-    plt.savefig(filename)
-
-    print('"' + filename + '" plotted and saved.')
+    submitRender({'plotType': 'histogram', 'filename': filename,
+                  'xPositions': xPositions, 'xLabels': xLabels,
+                  'yValues': yValues, 'title': title, 'limX': limX,
+                  'xLabel': xLabel, 'limY': limY, 'yLabel': yLabel,
+                  'col': col, 'h': h, 'scaleGuides': scaleGuides,
+                  'width': width, 'title_fontsize': title_fontsize,
+                  'xticks_fontsize': xticks_fontsize,
+                  'yticks_fontsize': yticks_fontsize,
+                  'xLabel_fontsize': xLabel_fontsize,
+                  'yLabel_fontsize': yLabel_fontsize})
 
 
 
@@ -1860,10 +3828,14 @@ def printingFound(rubric, hd, sq, bs, ju, found_lines):
 
     It prints a message to the console with the number of lines retrieved, and,
     in case, a warning message for the instances for which no lines are
-    retrieved.
+    retrieved. If no line is retrieved, the program exits, or, in batch mode,
+    a NoLinesFoundError is raised.
     '''
 
     if found_lines == 0:
+        if batchMode:
+            raise NoLinesFoundError('No lines found for any combination of '\
+                                    'the elements inputted')
         message = '\nALERT: no lines found for any combination of the '\
                   'elements inputted. The program will exit.'
         print(message)
@@ -1897,7 +3869,8 @@ def printingFound(rubric, hd, sq, bs, ju, found_lines):
 
 
 
-def findCadentialNotes(linesData, hd, sq, bs, ju, includeGraceNotes=True):
+def findCadentialNotes(linesData, hd, sq, bs, ju, includeGraceNotes=True,
+                       lineStats=None):
     '''
     Given the path to the lines_data.csv file, that should be stored in the
     same folder as the MusicXML scores of the Jingju Music Scores Collection,
@@ -1912,6 +3885,11 @@ def findCadentialNotes(linesData, hd, sq, bs, ju, includeGraceNotes=True):
     - ju -- [str], list of line types
     - includeGraceNotes -- bool, if True, grace notes are also computed. If
           False, grace notes are ignored
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, the cadential notes are taken from them
+          instead of processing the scores. Otherwise, the cadential notes of
+          each line are kept in the score store (see lineCadences), so that
+          they are computed only once per session
 
     It returns two lists:
     - [str], a list with the name of all the pitches that appear as cadential
@@ -1945,49 +3923,54 @@ def findCadentialNotes(linesData, hd, sq, bs, ju, includeGraceNotes=True):
     # Find cadential notes
     cadNotCount = [{}, {}, {}]
 
-    print('\nProcessing scores:')
-
-    for score in material[1:]:
-        scorePath = score[0]
-        loadedScore = converter.parse(scorePath)
-        scoreName = scorePath.split('/')[-1]
-        print('\tParsing ' + scoreName)
-        parts = findVoiceParts(loadedScore)
-        # Work with each part
-        for partIndex in range(1, len(score)):
-            if len(score[partIndex]) == 0: continue # Skip part if it's empty
-            # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notesAndRests.stream()
-            # Find segments to analyze in the current part
-            for line in score[partIndex]:
-                for judou in range(len(line)):
-                    if len(line[judou]) == 0: continue
-                    start = line[judou][0]
-                    end = line[judou][1]
-                    segment = notes.getElementsByOffset(start, end)
-                    i = -1
-                    lastNote = segment[i]
-                    while lastNote.isRest:
-                        i += -1
-                        lastNote = segment[i]
-                    if includeGraceNotes:
-                        cadenceNote = lastNote.nameWithOctave
-                    else:
-                        while lastNote.quarterLength == 0:
-                            print('\t(Grace note omitted in ' + scoreName +\
-                                  ', ' + str(partIndex) + ')')
-                            i += -1
-                            lastNote = segment[i]
-                        cadenceNote = lastNote.nameWithOctave
-                    sec = cadNotCount[judou]
-                    sec[cadenceNote] = sec.get(cadenceNote, 0) + 1
+    if lineStats != None:
+        if includeGraceNotes:
+            cadences = lineStats['cadences']
+        else:
+            cadences = lineStats['cadencesNoGrace']
+        for r in statisticsRows(lineStats, material[0], linesData):
+            for judou in range(3):
+                if cadences[r, judou] == '': continue
+                if not includeGraceNotes:
+                    for i in range(lineStats['graceNotesOmitted'][r, judou]):
+                        print('\t(Grace note omitted in ' +
+                              lineStats['scores'][lineStats['score'][r]] +
+                              ', ' + str(lineStats['part'][r]+1) + ')')
+                cadenceNote = str(cadences[r, judou])
+                sec = cadNotCount[judou]
+                sec[cadenceNote] = sec.get(cadenceNote, 0) + 1
+    else:
+        print('\nProcessing scores:')
+
+        for score in material[1:]:
+            scorePath = score[0]
+            scoreName = scorePath.split('/')[-1]
+            print('\tParsing ' + scoreName)
+            # Work with each part
+            for partIndex in range(1, len(score)):
+                # The cadential notes of each line are computed once, and
+                # kept in the score store
+                for line in score[partIndex]:
+                    cadences, cadencesNoGrace, omitted = lineCadences(
+                                                             scorePath,
+                                                             partIndex-1,
+                                                             line)
+                    if not includeGraceNotes:
+                        cadences = cadencesNoGrace
+                    for judou in range(3):
+                        if cadences[judou] == '': continue
+                        if not includeGraceNotes:
+                            for i in range(omitted[judou]):
+                                print('\t(Grace note omitted in ' +
+                                      scoreName + ', ' + str(partIndex) + ')')
+                        sec = cadNotCount[judou]
+                        sec[cadences[judou]] = sec.get(cadences[judou], 0) + 1
 
     noteNames = {}
 
     for secCount in cadNotCount:
         for noteName in secCount.keys():
-            noteNames[pitch.Pitch(noteName).midi] = noteName
+            noteNames[pitchInfo(noteName)[0]] = noteName
 
     sortedNoteNames = [noteNames[j] for j in sorted(noteNames.keys())]
 
@@ -2009,11 +3992,17 @@ def findCadentialNotes(linesData, hd, sq, bs, ju, includeGraceNotes=True):
 
 
 
-def getAmbitus(material):
+def getAmbitus(material, lineStats=None):
     '''
     Given the list returned by the collectLineMaterial function it computes the
     overall ambitus for all the retrieved lines.
 
+    Parameters:
+    - material -- list, the list returned by the collectLineMaterial function
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, the ambitus of each line is taken from them
+          instead of processing the scores
+
     It returns a music21.interval.Interval corresponding to the ambitus.
 
     For example:
@@ -2034,36 +4023,59 @@ def getAmbitus(material):
     <music21.interval.Interval P11>
     '''
 
+    # Lowest and highest notes of each line, as [midi, name] lists
+    lineAmbitus = []
+
+    if lineStats != None:
+        for r in statisticsRows(lineStats, material[0]):
+            if lineStats['ambitus'][r, 0] == -1: continue
+            lineAmbitus.append([[lineStats['ambitus'][r, 0],
+                                 lineStats['ambitusNames'][r, 0]],
+                                [lineStats['ambitus'][r, 1],
+                                 lineStats['ambitusNames'][r, 1]]])
+    else:
+        for score in material[1:]:
+            # Loading the score to get the parts list
+            scorePath = score[0]
+            scoreName = scorePath.split('/')[-1]
+            tables = loadNoteTables(scorePath)
+            print(scoreName, 'parsed')
+            # Work with each part
+            for partIndex in range(1, len(score)):
+                # Skip part if it's empty
+                if len(score[partIndex]) == 0: continue
+                # Get the note table of the current part
+                table = tables[partIndex-1]
+                # Find segments to analyze in the current part
+                for startEnd in score[partIndex]:
+                    start = startEnd[0]
+                    end = startEnd[1]
+                    segment = segmentRows(table, start, end)
+                    segment = segment[~table['isRest'][segment]]
+                    # Lowest and highest notes, the first ones if repeated
+                    midis = table['midi'][segment]
+                    low = segment[np.argmin(midis)]
+                    high = segment[np.argmax(midis)]
+                    lineAmbitus.append([[table['midi'][low],
+                                         table['name'][low]],
+                                        [table['midi'][high],
+                                         table['name'][high]]])
+
     ambitusStart = None
     ambitusEnd = None
 
-    for score in material[1:]:
-        # Loading the score to get the parts list
-        scorePath = score[0]
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print(scoreName, 'parsed')
-        parts = findVoiceParts(loadedScore)
-        # Work with each part
-        for partIndex in range(1, len(score)):
-            if len(score[partIndex]) == 0: continue # Skip part if it's empty
-            # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notes.stream()
-            # Find segments to analyze in the current part
-            for startEnd in score[partIndex]:
-                start = startEnd[0]
-                end = startEnd[1]
-                segment = notes.getElementsByOffset(start, end)
-                segmentAmbitus = segment.analyze('ambitus')
-                if ambitusStart==None and ambitusEnd==None:
-                    ambitusStart = segmentAmbitus.noteStart
-                    ambitusEnd = segmentAmbitus.noteEnd
-                else:
-                    if segmentAmbitus.noteStart.midi < ambitusStart.midi:
-                        ambitusStart = segmentAmbitus.noteStart
-                    if segmentAmbitus.noteEnd.midi > ambitusEnd.midi:
-                        ambitusEnd = segmentAmbitus.noteEnd
+    for noteStart, noteEnd in lineAmbitus:
+        if ambitusStart==None and ambitusEnd==None:
+            ambitusStart = noteStart
+            ambitusEnd = noteEnd
+        else:
+            if noteStart[0] < ambitusStart[0]:
+                ambitusStart = noteStart
+            if noteEnd[0] > ambitusEnd[0]:
+                ambitusEnd = noteEnd
+
+    ambitusStart = pitch.Pitch(str(ambitusStart[1]))
+    ambitusEnd = pitch.Pitch(str(ambitusEnd[1]))
 
     ambitusInterval = interval.Interval(ambitusStart, ambitusEnd)
 
@@ -2074,7 +4086,8 @@ def getAmbitus(material):
 
 
 
-def findScoreByPitchThreshold(material, thresholdPitch, lowHigh):
+def findScoreByPitchThreshold(material, thresholdPitch, lowHigh,
+                              lineStats=None):
     '''
     Given the list returned by the collectLineMaterial function and a threshold
     pitch, it looks for the scores contained in the input list in which the
@@ -2087,6 +4100,9 @@ def findScoreByPitchThreshold(material, thresholdPitch, lowHigh):
     - lowHigh -- str, it takes two values, either 'low' or 'high'. If 'low', it
           searches for pitches lower than the threshold, if 'high', it searches
           for pitches higher than the threshold
+    - lineStats -- dict, line statistics as returned by the lineStatistics
+          function. If given, the ambitus of each line is taken from them
+          instead of processing the scores
 
     It returns a list with the file names of the scores in which pitches that
     go beyond the given threshold are found.
@@ -2111,35 +4127,45 @@ def findScoreByPitchThreshold(material, thresholdPitch, lowHigh):
 
     scores = []
 
-    for score in material[1:]:
-        # Loading the score to get the parts list
-        scorePath = score[0]
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print(scoreName, 'parsed')
-        parts = findVoiceParts(loadedScore)
-        # Work with each part
-        for partIndex in range(1, len(score)):
-            if len(score[partIndex]) == 0: continue # Skip part if it's empty
-            # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notes.stream()
-            # Find segments to analyze in the current part
-            for startEnd in score[partIndex]:
-                start = startEnd[0]
-                end = startEnd[1]
-                segment = notes.getElementsByOffset(start, end)
-                segmentAmbitus = segment.analyze('ambitus')
-                ambitusStart = segmentAmbitus.noteStart.midi
-                ambitusEnd = segmentAmbitus.noteEnd.midi
-                if lowHigh == 'low':
-                    if ambitusStart < pitch.Pitch(thresholdPitch).midi:
-                        if scoreName not in scores:
-                            scores.append(scoreName)
-                if lowHigh == 'high':
-                    if ambitusEnd > pitch.Pitch(thresholdPitch).midi:
-                        if scoreName not in scores:
-                            scores.append(scoreName)
+    # Score name and lowest and highest midi values of each line
+    lineAmbitus = []
+
+    if lineStats != None:
+        for r in statisticsRows(lineStats, material[0]):
+            if lineStats['ambitus'][r, 0] == -1: continue
+            scoreName = str(lineStats['scores'][lineStats['score'][r]])
+            lineAmbitus.append([scoreName, lineStats['ambitus'][r, 0],
+                                lineStats['ambitus'][r, 1]])
+    else:
+        for score in material[1:]:
+            # Loading the score to get the parts list
+            scorePath = score[0]
+            scoreName = scorePath.split('/')[-1]
+            tables = loadNoteTables(scorePath)
+            print(scoreName, 'parsed')
+            # Work with each part
+            for partIndex in range(1, len(score)):
+                # Skip part if it's empty
+                if len(score[partIndex]) == 0: continue
+                # Get the note table of the current part
+                table = tables[partIndex-1]
+                # Find segments to analyze in the current part
+                for startEnd in score[partIndex]:
+                    start = startEnd[0]
+                    end = startEnd[1]
+                    segment = segmentRows(table, start, end)
+                    midis = table['midi'][segment[~table['isRest'][segment]]]
+                    lineAmbitus.append([scoreName, midis.min(), midis.max()])
+
+    for scoreName, ambitusStart, ambitusEnd in lineAmbitus:
+        if lowHigh == 'low':
+            if ambitusStart < pitch.Pitch(thresholdPitch).midi:
+                if scoreName not in scores:
+                    scores.append(scoreName)
+        if lowHigh == 'high':
+            if ambitusEnd > pitch.Pitch(thresholdPitch).midi:
+                if scoreName not in scores:
+                    scores.append(scoreName)
 
     print('Done!')
 
@@ -2194,7 +4220,10 @@ def findScoreByPitch(material, pitchList):
         # Loading the score to get the parts list
         scorePath = score[0]
         scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
+        # The score store only keeps the vocal parts, so the whole score is
+        # parsed for showing it with all its parts
+        with profileStage('converter.parse'):
+            loadedScore = converter.parse(scorePath)
         print(scoreName, 'parsed')
         parts = findVoiceParts(loadedScore)
         # Work with each part
@@ -2202,16 +4231,19 @@ def findScoreByPitch(material, pitchList):
             if len(score[partIndex]) == 0: continue # Skip part if it's empty
             # Get the notes from the current part
             part = parts[partIndex-1]
-            notes = part.flat.notes.stream()
+            notes = part.flat.notesAndRests.stream()
+            table = noteTable(part)
             # Find segments to analyze in the current part
             for startEnd in score[partIndex]:
                 start = startEnd[0]
                 end = startEnd[1]
-                segment = notes.getElementsByOffset(start, end)
-                for n in segment:
-                    noteName = n.nameWithOctave
+                segment = segmentRows(table, start, end)
+                for r in segment:
+                    # Pitch names are taken from the note table, which has
+                    # '' for rests
+                    noteName = str(table['name'][r])
                     if noteName in pitchList:
-                        n.color = 'red'
+                        notes[int(r)].color = 'red'
                         pitchesFound[noteName] = pitchesFound.get(noteName,0)+1
                         showScore = True
                         if scorePath not in scores:
@@ -2281,7 +4313,10 @@ def findScoreByInterval(material, intvlList, directedInterval=False,
         # Loading the score to get the parts list
         scorePath = score[0]
         scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
+        # The score store only keeps the vocal parts, so the whole score is
+        # parsed for showing it with all its parts
+        with profileStage('converter.parse'):
+            loadedScore = converter.parse(scorePath)
         print(scoreName, 'parsed')
         parts = findVoiceParts(loadedScore)
         # Work with each part
@@ -2290,43 +4325,31 @@ def findScoreByInterval(material, intvlList, directedInterval=False,
             # Get the notes from the current part
             part = parts[partIndex-1]
             notes = part.flat.notesAndRests.stream()
+            table = noteTable(part)
+            successors = successorIndex(table, silence2ignore,
+                                        ignoreGraceNotes)
             # Find segments to analyze in the current part
             for startEnd in score[partIndex]:
                 start = startEnd[0]
                 end = startEnd[1]
-                segment = notes.getElementsByOffset(start, end)
+                segment = segmentRows(table, start, end)
                 # Count intervals in the current segment
-                # Find the last note that is not a grace note
-                i = 1
-                lastn = segment[-i]
-                while lastn.quarterLength == 0:
-                    i += 1
-                    lastn = segment[-i]
-
-                for j in range(len(segment)-i):
-                    n1 = segment[j]
-                    if n1.isRest: continue
-                    if ignoreGraceNotes:
-                        if n1.quarterLength == 0: continue
-                    k = 1
-                    while True:
-                        n2 = segment[j+k]
-                        if n2.isRest:
-                            if n2.quarterLength <= silence2ignore:
-                                k += 1
-                            else:
-                                n2 = None
-                                break
-                        elif (n2.quarterLength==0)and(ignoreGraceNotes==True):
-                            j += 1
-                        else:
-                            break
-                    if n2==None: continue
-                    currentIntvl = interval.Interval(n1, n2)
+                firsts, seconds = segmentIntervalPairs(table, segment,
+                                                       silence2ignore,
+                                                       ignoreGraceNotes,
+                                                       successors)
+                for j in range(len(firsts)):
+                    n1 = notes[int(firsts[j])]
+                    n2 = notes[int(seconds[j])]
+                    currentIntvl = classifyInterval(
+                                       (n1.pitch.step, n1.pitch.alter,
+                                        n1.pitch.octave),
+                                       (n2.pitch.step, n2.pitch.alter,
+                                        n2.pitch.octave))
                     if directedInterval:
-                        intvlName = currentIntvl.directedName
+                        intvlName = currentIntvl[1]
                     else:
-                        intvlName = currentIntvl.name
+                        intvlName = currentIntvl[0]
                     if intvlName in intvlList:
                         n1.color = 'red'
                         n2.color = 'red'
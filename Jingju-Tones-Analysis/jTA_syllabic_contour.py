@@ -29,8 +29,11 @@
 
 
 import jingju_tones_analysis as jTA
+# Added to the path by jingju_tones_analysis
+import jingju_scores_collection as jSC
 
 import argparse
+import cProfile
 
 if __name__=='__main__':
     # Default values
@@ -98,9 +101,26 @@ if __name__=='__main__':
                                                        ' criteria, tone and '\
                                                        'contour; for example:'\
                                                        ' 1 A')
+    parser.add_argument('--profile', help='Path to a file where the number '\
+                                           'of calls and the time of each '\
+                                           'stage of the computation are '\
+                                           'saved, as JSON if its extension '\
+                                           'is .json, or as csv otherwise')
+    parser.add_argument('--cprofile', help='Path to a file where the '\
+                                            'statistics of the Python '\
+                                            'profiler (cProfile) are saved, '\
+                                            'which can be read with the '\
+                                            'pstats module')
 
     args = parser.parse_args()
 
+    if args.profile != None:
+        jSC.profiling = True
+
+    if args.cprofile != None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
     path = args.path
     if path[-1] == '/':
         linesData = path + 'lines_data.csv'
@@ -116,3 +136,10 @@ if __name__=='__main__':
                                        ju=args.line)
 
     jTA.syllabicContour(material, filename=args.filename, query=q)
+
+    if args.cprofile != None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+
+    if args.profile != None:
+        jTA.saveProfile(args.profile)
@@ -24,7 +24,19 @@
 
 
 from music21 import *
-import fractions
+import os
+import sys
+import bisect
+
+# The functions for reading the lines_data.csv file, loading the scores and
+# profiling are shared with Jingju Singing Analysis
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'Jingju-Singing-Analysis'))
+from jingju_scores_collection import (profileStage, profiled, saveProfile,
+                                      loadLineCatalogue, selectLines,
+                                      searchInformation, scoresFolder,
+                                      scoreLists, scoreStoreEntry, loadScore,
+                                      findVoiceParts)
 
 
 
@@ -65,50 +77,25 @@ def toneMaterialPerLine(linesData, hd=['laosheng', 'dan'], sq=['erhuang',
 
     # Get the path of the folder shared by the linesData file and the xml
     # scores
-    path = linesData[:linesData.rfind('/')+1]
-
-    with open(linesData, 'r', encoding='utf-8') as f:
-        data = f.readlines()
+    path = scoresFolder(linesData)
 
-    material = []
+    catalogue = loadLineCatalogue(linesData)
+    rows = selectLines(catalogue, hd, sq, bs, ju)
 
     # Search information
-    searchInfo = {'hd':[], 'sq':[], 'bs':[], 'ju':[]}
-    material.append(searchInfo)
+    material = [searchInformation(catalogue, rows)]
 
     # Segments collection
-    for row in data:
-        strInfo = row.strip().split(',')
-        score = strInfo[0]
-        if score != '':
-            material.append([path+score,[]])
-            if 'Part 1' in row: continue
-
-        if (score == '') and ('Part' in row):
-            material[-1].append([])
-            continue
-
-        hd0 = strInfo[1]
-        sq0 = strInfo[2]
-        bs0 = strInfo[3]
-        ju0 = strInfo[4]
-
-        # Get the information to store in material
-        line = strInfo[5]
-        start = floatOrFraction(strInfo[6])
-        end = floatOrFraction(strInfo[7])
-        tones = strInfo[8]
-
-        if (hd0 in hd) and (sq0 in sq) and (bs0 in bs) and (ju0 in ju):
-            material[-1][-1].append([line, start, end, tones, hd0, sq0, bs0])
-            if hd0 not in material[0]['hd']:
-                material[0]['hd'].append(hd0)
-            if sq0 not in material[0]['sq']:
-                material[0]['sq'].append(sq0)
-            if bs0 not in material[0]['bs']:
-                material[0]['bs'].append(bs0)
-            if ju0 not in material[0]['ju']:
-                material[0]['ju'].append(ju0)
+    categories = catalogue['categories']
+    scores = scoreLists(catalogue, path)
+    for r in rows:
+        hd0 = categories['hd'][catalogue['hd'][r]]
+        sq0 = categories['sq'][catalogue['sq'][r]]
+        bs0 = categories['bs'][catalogue['bs'][r]]
+        scores[catalogue['score'][r]][catalogue['part'][r]+1].append(
+            [catalogue['lyrics'][r], catalogue['start'][r],
+             catalogue['end'][r], catalogue['tones'][r], hd0, sq0, bs0])
+    material += scores
 
     # Delete empty lists
     score2remove = []
@@ -160,65 +147,32 @@ def toneMaterialPerJudou(linesData, hd=['laosheng', 'dan'], sq=['erhuang',
 
     # Get the path of the folder shared by the lines_data.csv file and the xml
     # scores
-    path = linesData[:linesData.rfind('/')+1]
-
-    with open(linesData, 'r', encoding='utf-8') as f:
-        data = f.readlines()
+    path = scoresFolder(linesData)
 
-    material = []
+    catalogue = loadLineCatalogue(linesData)
+    rows = selectLines(catalogue, hd, sq, bs, ju)
 
     # Search information
-    searchInfo = {'hd':[], 'sq':[], 'bs':[], 'ju':[]}
-    material.append(searchInfo)
+    material = [searchInformation(catalogue, rows)]
 
     # Segments collection
-    for row in data:
-        strInfo = row.strip().split(',')
-        score = strInfo[0]
-        if score != '':
-            material.append([path+score,[]])
-            if 'Part 1' in row: continue
-
-        if (score == '') and ('Part' in row):
-            material[-1].append([])
-            continue
-
-        hd0 = strInfo[1]
-        sq0 = strInfo[2]
-        bs0 = strInfo[3]
-        ju0 = strInfo[4]
-
-        # Get the information to store in material
-        tones = strInfo[8]
-        jd1 = strInfo[9]
-        jd1tones = tones[0:countCharacters(jd1)]
-        jd1start = floatOrFraction(strInfo[10])
-        jd1end = floatOrFraction(strInfo[11])
-        jd2 = strInfo[12]
-        jd2tones = tones[countCharacters(jd1):
-                         countCharacters(jd1)+countCharacters(jd2)]
-        jd2start = floatOrFraction(strInfo[13])
-        jd2end = floatOrFraction(strInfo[14])
-        jd3 = strInfo[15]
-        jd3tones = tones[countCharacters(jd1)+countCharacters(jd2):]
-        jd3start = floatOrFraction(strInfo[16])
-        jd3end = floatOrFraction(strInfo[17])
-
-        if (hd0 in hd) and (sq0 in sq) and (bs0 in bs) and (ju0 in ju):
-            if len(jd1) > 0:
-                material[-1][-1].append([jd1, jd1start, jd1end, jd1tones])
-            if len(jd2) > 0:
-                material[-1][-1].append([jd2, jd2start, jd2end, jd2tones])
-            if len(jd3) > 0:
-                material[-1][-1].append([jd3, jd3start, jd3end, jd3tones])
-            if hd0 not in material[0]['hd']:
-                material[0]['hd'].append(hd0)
-            if sq0 not in material[0]['sq']:
-                material[0]['sq'].append(sq0)
-            if bs0 not in material[0]['bs']:
-                material[0]['bs'].append(bs0)
-            if ju0 not in material[0]['ju']:
-                material[0]['ju'].append(ju0)
+    scores = scoreLists(catalogue, path)
+    for r in rows:
+        part = scores[catalogue['score'][r]][catalogue['part'][r]+1]
+        tones = catalogue['tones'][r]
+        toneIndex = 0
+        for jd in range(3):
+            # Get the information to store in material
+            jdLyrics = catalogue['judouLyrics'][r, jd]
+            if jd < 2:
+                jdTones = tones[toneIndex:toneIndex+countCharacters(jdLyrics)]
+            else:
+                jdTones = tones[toneIndex:]
+            toneIndex += countCharacters(jdLyrics)
+            if len(jdLyrics) > 0:
+                part.append([jdLyrics, catalogue['judouStart'][r, jd],
+                             catalogue['judouEnd'][r, jd], jdTones])
+    material += scores
 
     # Delete empty lists
     score2remove = []
@@ -274,16 +228,22 @@ def syllabicContour(material, filename=None, query=[]):
         # Loading the score to get the parts list
         syllables.append([])
         scorePath = score[0]
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print(scoreName, 'parsed')
-        parts = findVoiceParts(loadedScore)
+        if len(query) > 0:
+            # The notes of the retrieved lines are colored, so the cached
+            # streams are not used
+            with profileStage('converter.parse'):
+                loadedScore = converter.parse(scorePath)
+            print(scorePath.split('/')[-1], 'parsed')
+            parts = [{'notesAndRests': part.flat.notesAndRests.stream()}
+                     for part in findVoiceParts(loadedScore)]
+        else:
+            parts = loadVoiceParts(scorePath)
         # Work with each part
         for partIndex in range(1, len(score)):
             if len(score[partIndex]) == 0: continue # Skip part if it's empty
             # Get the notes from the current part
-            part = parts[partIndex-1]
-            notes = part.flat.notesAndRests.stream()
+            notes = parts[partIndex-1]['notesAndRests']
+            index = segmentIndex(notes)
 
             for line in score[partIndex]:
                 syllables[-1].append([])
@@ -355,7 +315,7 @@ def syllabicContour(material, filename=None, query=[]):
                 showSegment = False # True if a search has been found in this
                                     # segment
 
-                segment = notes.getElementsByOffset(start, end)
+                segment = getSegment(index, start, end)
 
                 for i in range(len(segment)):
                     n = segment[i]
@@ -368,7 +328,7 @@ def syllabicContour(material, filename=None, query=[]):
                         # the annotations coincide
                         if char != currentChar:
                             print('Problem with', char)
-                            segment.show()
+                            notes.getElementsByOffset(start, end).show()
 
                         if ('（' in char) and ('）' not in char):
                             inBrackets = True
@@ -479,7 +439,7 @@ def syllabicContour(material, filename=None, query=[]):
                     syllables[-1][-1][-1].append(defineContour(syl))
                 syllables[-1][-1][-1].append(syl)
 
-                if showSegment: segment.show()
+                if showSegment: notes.getElementsByOffset(start, end).show()
 
     txt2print = '\tdL\tL\tA\tD\tAD\tDA'
     rels = ['L', 'A', 'D', 'AD', 'DA']
@@ -560,17 +520,14 @@ def pairwiseRelationship(material, relationship=[1, 0], filename=None,
         s = []
         # Loading the score to get the parts list
         scorePath = score[0]
-        scoreName = scorePath.split('/')[-1]
-        loadedScore = converter.parse(scorePath)
-        print(scoreName, 'parsed')
-        parts = findVoiceParts(loadedScore)
+        parts = loadVoiceParts(scorePath)
         # Work with each part
         for partIndex in range(1, len(score)):
             p = []
             if len(score[partIndex]) > 0:
                 # Get the notes from the current part
-                part = parts[partIndex-1]
-                notes = part.flat.notes.stream()
+                notes = parts[partIndex-1]['notes']
+                index = segmentIndex(notes)
 
                 for line in score[partIndex]:
                     lyrics = line[0]
@@ -586,7 +543,7 @@ def pairwiseRelationship(material, relationship=[1, 0], filename=None,
                     inBrackets = False # Flag to check if the lyrics syllabe is
                                        # within a bracket
 
-                    segment = notes.getElementsByOffset(start, end)
+                    segment = getSegment(index, start, end)
 
                     for i in range(len(segment)):
                         n = segment[i]
@@ -598,7 +555,7 @@ def pairwiseRelationship(material, relationship=[1, 0], filename=None,
                             # from the annotations coincide
                             if char != currentChar:
                                 print('Problem with', char, currentChar)
-                                segment.show()
+                                notes.getElementsByOffset(start, end).show()
 
                             if ('（' in char) and ('）' not in char):
                                 toneJump += len(char)
@@ -658,11 +615,8 @@ def pairwiseRelationship(material, relationship=[1, 0], filename=None,
                                 print('\nRetrieving found queries')
                                 queryMessage = False
                             scorePath = material[s+1][0]
-                            loadedScore = converter.parse(scorePath)
-                            print(scorePath.split('/')[-1], 'loaded')
-                            parts = findVoiceParts(loadedScore)
-                            parte = parts[p]
-                            notes = parte.flat.notesAndRests.stream()
+                            parts = loadVoiceParts(scorePath)
+                            notes = parts[p]['notesAndRests']
                             segmentInfo = material[s+1][p+1][d]
                             start = segmentInfo[1]
                             end = segmentInfo[2]
@@ -713,72 +667,97 @@ def pairwiseRelationship(material, relationship=[1, 0], filename=None,
 ## AUXILIARY FUNCTIONS                                                       ##
 ###############################################################################
 
-def findVoiceParts(score):
+def loadVoiceParts(scorePath):
     '''
-    It takes a score and searches which of the parts is the one containing
-    lyrics, and therefore, the one containing singing voice.
+    Given the path to a MusicXML score, it loads it with the loadScore function
+    of jingju_scores_collection.py and flattens each of its vocal parts only
+    once. The flattened parts are kept in the entry of the score in the score
+    store, so that they are dropped with the score when the memory budget
+    given in scoreStore is exceeded, and each score is loaded only once per
+    session, unless it is modified.
 
     Parameter:
-    - score -- a music21.strem.Score object
+    - scorePath -- str, path to the MusicXML score
 
-    It returns a list with all the parts that contain lyrics
+    It returns a list with a dictionary per vocal part, with the following
+    keys:
+    - 'part' -- music21.stream.Part, the vocal part
+    - 'notes' -- music21.stream.Stream, the notes of the flattened part
+    - 'notesAndRests' -- music21.stream.Stream, the notes and rests of the
+          flattened part
 
-    For example:
-    >>> import music21
-    >>> s = music21.converter.parse('sdxp-WoHeNi-SiLangTanMu.xml')
-    >>> findVoiceParts(s)
-    [<music21.stream.Part Piano>, <music21.stream.Part Piano>]
+    The returned streams are shared by all the callers, so they should not be
+    modified.
     '''
 
+    entry = scoreStoreEntry(scorePath)[0]
+
+    if entry['voiceParts'] != None:
+        return entry['voiceParts']
+
+    parts = loadScore(scorePath)[1]
+    print(scorePath.split('/')[-1], 'parsed')
+
     voiceParts = []
+    for part in parts:
+        flat = part.flat
+        voiceParts.append({'part': part, 'notes': flat.notes.stream(),
+                           'notesAndRests': flat.notesAndRests.stream()})
+
+    entry['voiceParts'] = voiceParts
 
-    for p in score.parts:
-        if len(p.flat.notes) == 0: continue
-        i = 0
-        n = p.flat.notes[i]
-        while n.quarterLength == 0:
-            i += 1
-            n = p.flat.notes.stream()[i]
-        if n.hasLyrics():
-                if p.hasElementOfClass('Instrument'):
-                    p.remove(p.getInstrument())
-                voiceParts.append(p)
     return voiceParts
 
 
 
-def floatOrFraction(strValue):
+
+@profiled('segments')
+def segmentIndex(notes):
     '''
-    It takes a string with a numerical value and analyses if it is a float or
-    a fractions.Fraction object.
+    It takes a flat stream of notes and builds an index of their offsets, so
+    that the notes of a segment can be retrieved with a binary search instead
+    of scanning the whole stream as getElementsByOffset does.
 
     Parameter:
-    - strValue -- str, a numercial value
-
-    It returns a flot or a fractions.Fraction object. If the input is an empty
-    string, it returns None
-
-    For example:
-    >>> floatOrFraction('1277/6')
-    Fraction(1277, 6)
-    >>> floatOrFraction('164')
-    164.0
-    >>> floatOrFraction('')
-    >>>
+    - notes -- a flat music21.stream.Stream object, whose elements are sorted
+          by offset, as returned by part.flat.notes or
+          part.flat.notesAndRests
+
+    It returns a tuple with a list of the offsets of the elements of the stream
+    and a list of the elements, in the same order.
     '''
-    if '/' in strValue:
-        numerator = int(strValue.split('/')[0])
-        denominator = int(strValue.split('/')[1])
-        value = fractions.Fraction(numerator, denominator)
-    elif len(strValue) == 0:
-        value = None
-    else:
-        value = float(strValue)
 
-    return value
+    elements = list(notes)
+    offsets = [n.offset for n in elements]
+
+    return offsets, elements
+
+
+
+@profiled('segments')
+def getSegment(index, start, end):
+    '''
+    It returns the elements of an index, as returned by segmentIndex, whose
+    offset is between the given start and end offsets, both included, in the
+    same way as the getElementsByOffset method of music21 streams.
+
+    Parameters:
+    - index -- tuple, as returned by segmentIndex
+    - start -- float or fractions.Fraction, starting offset of the segment
+    - end -- float or fractions.Fraction, ending offset of the segment
+
+    It returns a list of music21 notes and rests.
+    '''
 
+    offsets, elements = index
+    first = bisect.bisect_left(offsets, start)
+    last = bisect.bisect_right(offsets, end)
 
+    return elements[first:last]
 
+
+
+@profiled('defineContour')
 def defineContour(pitches):
     '''
     [int] --> str
@@ -925,71 +904,45 @@ def countLineType(linesData, hd=['laosheng', 'dan'], sq=['erhuang',
 
     # Get the path of the folder shared by the lines_data.csv file and the xml
     # scores
-    path = linesData[:linesData.rfind('/')+1]
-
-    with open(linesData, 'r', encoding='utf-8') as f:
-        data = f.readlines()
+    path = scoresFolder(linesData)
 
-    material = []
+    catalogue = loadLineCatalogue(linesData)
+    rows = selectLines(catalogue, hd, sq, bs, ju)
 
     # Search information
-    searchInfo = {'hd':[], 'sq':[], 'bs':[], 'ju':[]}
-    material.append(searchInfo)
+    material = [searchInformation(catalogue, rows)]
 
     # Count line structure types
     str_types = {}
 
-    # Segments collection
-    for row in data:
-        strInfo = row.strip().split(',')
-        score = strInfo[0]
-        if score != '':
-            material.append([path+score,[]])
-            if 'Part 1' in row: continue
-
-        if (score == '') and ('Part' in row):
-            material[-1].append([])
-            continue
-
-        # Get the information to check the search criteria
-        hd0 = strInfo[1]
-        sq0 = strInfo[2]
-        bs0 = strInfo[3]
-        ju0 = strInfo[4]
-
+    # Line structure of every line
+    structures = []
+    for r in range(len(catalogue['lyrics'])):
         # Get the lyrics from the line and each judou
-        line = strInfo[5]
+        line = catalogue['lyrics'][r]
         ll = countCharacters(line)
-        jd1 = strInfo[9]
+        jd1, jd2, jd3 = catalogue['judouLyrics'][r]
         jd1l = countCharacters(jd1)
-        jd2 = strInfo[12]
         jd2l = countCharacters(jd2)
-        jd3 = strInfo[15]
         jd3l = countCharacters(jd3)
 
         # Define the line type as a string
-        line_structure = str(ll)+':'+str(jd1l)+'+'+str(jd2l)+'+'+str(jd3l)
+        structures.append(str(ll)+':'+str(jd1l)+'+'+str(jd2l)+'+'+str(jd3l))
 
         # Check if the length of the line is equal to the sum of the judou
         if ll != jd1l + jd2l + jd3l:
             print(line, 'is not equal to', jd1, '+', jd2, '+', jd3)
 
-        # Check if the search criteria are met
-        if (hd0 in hd) and (sq0 in sq) and (bs0 in bs) and (ju0 in ju):
-
-            material[-1][-1].append([{'line':line, 'jd1':jd1, 'jd2':jd2,
-                                     'jd3':jd3}, line_structure])
-
-            if hd0 not in material[0]['hd']:
-                material[0]['hd'].append(hd0)
-            if sq0 not in material[0]['sq']:
-                material[0]['sq'].append(sq0)
-            if bs0 not in material[0]['bs']:
-                material[0]['bs'].append(bs0)
-            if ju0 not in material[0]['ju']:
-                material[0]['ju'].append(ju0)
-
-            str_types[line_structure] = str_types.get(line_structure, 0) + 1
+    # Segments collection
+    scores = scoreLists(catalogue, path)
+    for r in rows:
+        line_structure = structures[r]
+        jd1, jd2, jd3 = catalogue['judouLyrics'][r]
+        scores[catalogue['score'][r]][catalogue['part'][r]+1].append(
+            [{'line':catalogue['lyrics'][r], 'jd1':jd1, 'jd2':jd2,
+              'jd3':jd3}, line_structure])
+        str_types[line_structure] = str_types.get(line_structure, 0) + 1
+    material += scores
 
     # Delete empty lists
     score2remove = []
@@ -1035,60 +988,51 @@ def getTones(linesData, hd=['laosheng', 'dan'], sq=['erhuang', 'xipi'],
     it returns a string with the score name and intercalated lyrics and tones
     for the lines found.
     '''
-    with open(linesData, 'r', encoding='utf-8') as f:
-        data = f.readlines()
+    catalogue = loadLineCatalogue(linesData)
+    rows = selectLines(catalogue, hd, sq, bs, ju)
 
     tones = ''
 
     diacritics = ['，', '。', '？', '！', '；', '：', '、']
 
+    lastScore = None
+
     # Line finding
-    for line in data:
-        strInfo = line.strip().split(',')
-        score = strInfo[0]
-        if score != '':
-            scoreName = score
-            scoreInTones = False
-
-        if 'Part' in line: continue
-
-        hd0 = strInfo[1]
-        sq0 = strInfo[2]
-        bs0 = strInfo[3]
-        ju0 = strInfo[4]
-
-        lineLyrics = strInfo[5]
-        lineTones = strInfo[8]
-
-        if (hd0 in hd) and (sq0 in sq) and (bs0 in bs) and (ju0 in ju):
-            # Intercalate lyrics and tones
-            lyricTones = ''
-            jump = 0
-            ignore = False
-            for i in range(len(lineLyrics)):
-                if lineLyrics[i] == '（':
-                    lyricTones += lineLyrics[i]
-                    ignore = True
-                    jump += 1
-                elif lineLyrics[i] == '）':
-                    lyricTones += lineLyrics[i]
-                    ignore = False
-                    jump += 1
-                elif lineLyrics[i] in diacritics:
+    for r in rows:
+        scoreName = catalogue['scores'][catalogue['score'][r]]
+        scoreInTones = catalogue['score'][r] == lastScore
+        lastScore = catalogue['score'][r]
+
+        lineLyrics = catalogue['lyrics'][r]
+        lineTones = catalogue['tones'][r]
+
+        # Intercalate lyrics and tones
+        lyricTones = ''
+        jump = 0
+        ignore = False
+        for i in range(len(lineLyrics)):
+            if lineLyrics[i] == '（':
+                lyricTones += lineLyrics[i]
+                ignore = True
+                jump += 1
+            elif lineLyrics[i] == '）':
+                lyricTones += lineLyrics[i]
+                ignore = False
+                jump += 1
+            elif lineLyrics[i] in diacritics:
+                lyricTones += lineLyrics[i]
+                jump += 1
+            else:
+                if not ignore:
+                    lyricTones += lineLyrics[i] + lineTones[i-jump]
+                else:
                     lyricTones += lineLyrics[i]
                     jump += 1
-                else:
-                    if not ignore:
-                        lyricTones += lineLyrics[i] + lineTones[i-jump]
-                    else:
-                        lyricTones += lineLyrics[i]
-                        jump += 1
-            # Add score and lyricTones to tones
-            if not scoreInTones:
-                tones += '\n' + scoreName+'\n'+lyricTones+'\n'
-                scoreInTones = True
-            else:
-                tones += lyricTones+'\n'
+        # Add score and lyricTones to tones
+        if not scoreInTones:
+            tones += '\n' + scoreName+'\n'+lyricTones+'\n'
+        else:
+            tones += lyricTones+'\n'
 
     print(tones)
 